@@ -0,0 +1,137 @@
+"""
+Compares the approximate mentor indexes against exact search on synthetic
+pools of normalized vectors.
+
+  --mode ivf        recall@k and p50/p99 query latency per nprobe
+  --mode quantized  recall@k, ranking drift and memory for int8 with re-ranking
+
+Usage:
+    python ann_benchmark.py --sizes 10000,100000 --nprobe 1,4,16,64
+    python ann_benchmark.py --mode quantized --sizes 10000
+
+A 1,000,000 x 1536 float32 pool needs about 6 GB for the matrix plus the same
+again while the IVF index regroups it.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from mentor_index import MentorIndex, IVFMentorIndex, QuantizedMentorIndex
+
+
+def synthetic_pool(n, dim, n_topics, rng, chunk_size=50000):
+    """Clustered unit vectors: each row is a topic center plus noise, like real profile embeddings."""
+    centers = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    matrix = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        end = min(n, start + chunk_size)
+        topics = rng.integers(0, n_topics, size=end - start)
+        noise = rng.standard_normal((end - start, dim), dtype=np.float32)
+        block = centers[topics] + 0.9 * noise
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[start:end] = block
+    return matrix
+
+
+def timed_search(index, queries, k, **kwargs):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([mentor_id for mentor_id, _ in index.search(query, k=k, **kwargs)])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000.0
+
+
+def recall_at_k(approx, exact):
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+    total = sum(len(e) for e in exact)
+    return hits / total if total else 1.0
+
+
+def ordered_agreement(approx, exact):
+    """Share of queries whose top-k list matches exact search in the same order."""
+    return sum(a == e for a, e in zip(approx, exact)) / len(exact) if exact else 1.0
+
+
+def synthetic_queries(matrix, n_queries, rng):
+    picks = rng.integers(0, len(matrix), size=n_queries)
+    dim = matrix.shape[1]
+    return matrix[picks] + 0.5 * rng.standard_normal((n_queries, dim), dtype=np.float32) / np.sqrt(dim)
+
+
+def run_quantized(sizes, dim, n_queries, k, seed):
+    rng = np.random.default_rng(seed)
+    for n in sizes:
+        matrix = synthetic_pool(n, dim, n_topics=max(8, n // 500), rng=rng)
+        ids = np.arange(n)
+        queries = synthetic_queries(matrix, n_queries, rng)
+
+        exact_index = MentorIndex(ids, matrix, normalized=True)
+        exact, exact_ms = timed_search(exact_index, queries, k)
+
+        print(f"\npool={n:,} dim={dim} k={k}")
+        print(f"  {'search':<22}{'recall@k':>10}{'same order':>12}{'MB':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        print(f"  {'exact float32':<22}{1.0:>10.3f}{1.0:>12.3f}{matrix.nbytes / 2**20:>10.1f}"
+              f"{np.percentile(exact_ms, 50):>10.2f}{np.percentile(exact_ms, 99):>10.2f}")
+        for quantization in ("int8",):
+            for rerank_factor in (1, 4):
+                index = QuantizedMentorIndex(ids, matrix, normalized=True, quantization=quantization,
+                                             rerank_factor=rerank_factor)
+                approx, approx_ms = timed_search(index, queries, k)
+                label = f"{quantization} rerank x{rerank_factor}"
+                print(f"  {label:<22}{recall_at_k(approx, exact):>10.3f}{ordered_agreement(approx, exact):>12.3f}"
+                      f"{index.nbytes / 2**20:>10.1f}{np.percentile(approx_ms, 50):>10.2f}"
+                      f"{np.percentile(approx_ms, 99):>10.2f}")
+
+
+def run(sizes, dim, n_queries, k, nprobes, seed):
+    rng = np.random.default_rng(seed)
+    for n in sizes:
+        matrix = synthetic_pool(n, dim, n_topics=max(8, n // 500), rng=rng)
+        ids = np.arange(n)
+        queries = synthetic_queries(matrix, n_queries, rng)
+
+        exact_index = MentorIndex(ids, matrix, normalized=True)
+        exact, exact_ms = timed_search(exact_index, queries, k)
+
+        start = time.perf_counter()
+        ivf_index = IVFMentorIndex(ids, matrix, normalized=True)
+        build_s = time.perf_counter() - start
+        del matrix
+
+        print(f"\npool={n:,} dim={dim} k={k} nlist={ivf_index.nlist} (IVF build {build_s:.1f}s)")
+        print(f"  {'search':<14}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        print(f"  {'exact':<14}{1.0:>10.3f}{np.percentile(exact_ms, 50):>10.2f}{np.percentile(exact_ms, 99):>10.2f}")
+        for nprobe in nprobes:
+            if nprobe > ivf_index.nlist:
+                continue
+            approx, approx_ms = timed_search(ivf_index, queries, k, nprobe=nprobe)
+            label = f"ivf nprobe={nprobe}"
+            print(f"  {label:<14}{recall_at_k(approx, exact):>10.3f}"
+                  f"{np.percentile(approx_ms, 50):>10.2f}{np.percentile(approx_ms, 99):>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark approximate mentor search against exact search.")
+    parser.add_argument("--mode", choices=("ivf", "quantized"), default="ivf")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated pool sizes.")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,4,8,16,64", help="Comma-separated nprobe values.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    if args.mode == "quantized":
+        run_quantized(sizes=sizes, dim=args.dim, n_queries=args.queries, k=args.k, seed=args.seed)
+    else:
+        run(
+            sizes=sizes,
+            dim=args.dim,
+            n_queries=args.queries,
+            k=args.k,
+            nprobes=[int(p) for p in args.nprobe.split(",")],
+            seed=args.seed,
+        )
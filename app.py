@@ -1,7 +1,12 @@
 import os
 import openai
+from openai_client import BACKGROUND, SHORT_CALL_DEADLINE, chat_completion
+from response_cache import SEMANTIC_SLOT, cached_chat_completion, json_reply
 import json
-from flask import Flask, request, jsonify
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -12,21 +17,22 @@ from conversation_utils import (
     optimize_conversation_history,
     generate_messages,
     generate_conversation_starters,
-    detect_goal_creation,
-    parse_new_student_info
-)
-from competition_utils import (
-    detect_science_project_request,
-    detect_deca_request,
-    generate_project_guidance,
-    generate_deca_guidance
+    detect_goal_creation
 )
+from intent_classifier import classify_locally
+from intent_router import WORKFLOW_ROUTES, route_message
 from mentor_utils import (
-    should_recommend_mentor,
     recommend_mentor,
     generate_mentor_reason,
-    is_explicit_mentor_request
+    is_explicit_mentor_request,
+    prefetch_mentor_embeddings,
+    explain_mentor_match,
+    recommend_mentors
 )
+from stage_graph import StageGraph
+from student_cache import STUDENT_CACHE
+from student_session import MESSAGES_COLLECTION, STUDENTS_COLLECTION, StudentSession
+from workflow_engine import WorkflowEngine
 
 # -------------------------------
 # CONFIGURATION & INITIALIZATION
@@ -36,7 +42,8 @@ SECRET_KEY = "test"
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
-CORS(app, resources={r"/api/*": {"origins": ["https://open-admit-ai.vercel.app", "http://localhost:5000", "http://localhost:3000", "http://localhost:3001", "http://localhost:5001"]}},
+CORS_ORIGINS = ["https://open-admit-ai.vercel.app", "http://localhost:5000", "http://localhost:3000", "http://localhost:3001", "http://localhost:5001"]
+CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}},
      supports_credentials=True,
      methods=["GET", "POST", "OPTIONS"])
 
@@ -45,25 +52,66 @@ cred = credentials.Certificate("serviceAccountKey.json")
 firebase_admin.initialize_app(cred)
 db = firestore.client()
 
+# The full transcript lives in students/<id>/messages; the student document
+# only keeps this many recent messages (last_conversation) for the prompt.
+RECENT_MESSAGES_WINDOW = 20
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Goal extraction and mentor matching run here after the reply is sent. At
+# most POST_TURN_MAX_PENDING turns may be queued or running; past that a
+# turn skips them (its cooldowns stay at 0, so the next turn tries again).
+POST_TURN_WORKERS = int(os.environ.get("POST_TURN_WORKERS", "4"))
+POST_TURN_MAX_PENDING = int(os.environ.get("POST_TURN_MAX_PENDING", str(POST_TURN_WORKERS * 16)))
+POST_TURN_STREAM_TIMEOUT = 30
+POST_TURN_EXECUTOR = ThreadPoolExecutor(max_workers=POST_TURN_WORKERS, thread_name_prefix="post-turn")
+POST_TURN_SLOTS = threading.BoundedSemaphore(POST_TURN_MAX_PENDING)
+# Independent stages within a turn (see stage_graph.StageGraph).
+TURN_STAGE_WORKERS = 16
+TURN_STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=TURN_STAGE_WORKERS, thread_name_prefix="turn-stage")
+
 # -------------------------------
 # WORKFLOW TEMPLATES (Dynamic Prompt Bases)
 # -------------------------------
+# Each step's "on"/"otherwise" entries are its transitions; workflow_engine
+# compiles them into a lookup table. "@step.field" refers to another step's
+# text and "{choice}" to the classified choice.
 # Research Workflow (Highest priority)
 RESEARCH_WORKFLOW = {
     "step1_intro": {
         "prompt": ("I want to get started in research. Based on your profile, here are some potential fields that may interest you: [X, Y, Z]. "
-                   "Do any of these topics interest you? (Yes/No)")
+                   "Do any of these topics interest you? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step2_types", "generate": "@step2_types.prompt"},
+            "no": {"generate": "Let's revisit the potential research fields. Do any of these topics interest you? (Yes/No)"}
+        },
+        "otherwise": {"reply": "Please respond with Yes or No regarding your interest in the suggested research fields."}
     },
     "step2_types": {
         "prompt": ("Before we start, here are a few general research paths: Working with a Professor, Enrolling in a Research Program, "
-                   "or Independent Research with a University Student. Do any of these paths interest you? (Yes/No)")
+                   "or Independent Research with a University Student. Do any of these paths interest you? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step3_mentor", "generate": "@step3_mentor.prompt"},
+            "no": {"next": "step3_mentor", "prefix": "Alright, let's move forward with your research journey. ", "generate": "@step3_mentor.prompt"}
+        },
+        "otherwise": {"reply": "Please respond with Yes or No regarding your interest in the suggested research paths."}
     },
     "step3_mentor": {
-        "prompt": ("Here’s what past mentors did in similar situations: [Mentor stories]. Did any of these projects excite you? "
-                   "Would you like to speak to a mentor for more details, or would you like to jump straight into your research journey? (Mentor/Jump)")
+        "prompt": ("Here’s what past mentors did in similar situations: {mentor_stories}. Did any of these projects excite you? "
+                   "Would you like to speak to a mentor for more details, or would you like to jump straight into your research journey? (Mentor/Jump)"),
+        "on": {
+            "choice:mentor": {"next": "mentor", "generate": "Connecting you with a research mentor. Here are a few mentors whose experience matches yours:\n{mentor_stories}"},
+            "choice:jump": {"next": "step4_details", "generate": "@step4_details.prompt"}
+        },
+        "otherwise": {"reply": "Please specify if you want to speak to a mentor or jump straight into your research journey. (Mentor/Jump)"}
     },
     "step4_details": {
-        "prompt": ("Based on your choice, here is more detail on the specific research pathway. Let's start by drafting an outreach plan or an application checklist.")
+        "prompt": ("Based on your choice, here is more detail on the specific research pathway. Let's start by drafting an outreach plan or an application checklist."),
+        "otherwise": {"next": "complete", "generate": "Let's finalize your research plan. Please review the details and confirm your next steps."}
+    },
+    "mentor": {
+        "prompt": "Your research mentor will follow up with you directly.",
+        "otherwise": {"next": "step4_details", "generate": "@step4_details.prompt"}
     }
 }
 
@@ -72,22 +120,52 @@ DECA_WORKFLOW = {
     "step1_join": {
         "prompt": "I want to join DECA. Do you have a DECA chapter at your school? (Yes/No)",
         "response_if_yes": "Great! Since you have a DECA chapter at your school, please contact your DECA advisor or attend a meeting to officially join.",
-        "response_if_no": "No worries! You can start a chapter at your school or join an independent DECA chapter. Would you like guidance on how to start one? (Yes/No)"
+        "response_if_no": "No worries! You can start a chapter at your school or join an independent DECA chapter. Would you like guidance on how to start one? (Yes/No)",
+        "on": {
+            "yes": {"next": "step2_event_types", "generate": "@step1_join.response_if_yes"},
+            "no": {"next": "step1_join_no_chapter", "generate": "@step1_join.response_if_no"}
+        },
+        "otherwise": {"reply": "Could you please confirm if you have a DECA chapter at your school? (Yes/No)"}
+    },
+    "step1_join_no_chapter": {
+        "prompt": "Proceeding to event selection.",
+        "otherwise": {"next": "step2_event_types", "prefix": "Proceeding to event selection. ", "generate": "@step2_event_types.prompt"}
     },
     "step2_event_types": {
         "prompt": ("DECA offers multiple event categories including Role-Play & Case Study, Prepared, and Online Simulation events. "
                    "Would you like a detailed explanation of each event type? (Yes/No)"),
         "response_if_yes": "Providing detailed descriptions from DECA’s official guide, please hold on.",
-        "response_if_no": "Proceeding to event selection. Which event type interests you? (Roleplay/Prepared/Online)"
+        "response_if_no": "Proceeding to event selection. Which event type interests you? (Roleplay/Prepared/Online)",
+        "on": {
+            "choice:roleplay": {"next": "step3_roleplay", "generate": "@step3_roleplay.prompt"},
+            "choice:prepared": {"next": "step3_prepared", "generate": "@step3_prepared.prompt"},
+            "choice:online": {"next": "step3_online", "generate": "@step3_online.prompt"},
+            "choice": {"reply": "Please specify whether you're interested in roleplay, prepared, or online events."},
+            "yes": {"next": "step3_choose_event", "generate": "@step2_event_types.response_if_yes"},
+            "no": {"next": "step3_choose_event", "generate": "@step2_event_types.response_if_no"}
+        },
+        "otherwise": {"reply": "Could you clarify your choice for DECA event types?"}
+    },
+    "step3_choose_event": {
+        "prompt": "Which event type interests you? (Roleplay/Prepared/Online)",
+        "on": {
+            "choice:roleplay": {"next": "step3_roleplay", "generate": "@step3_roleplay.prompt"},
+            "choice:prepared": {"next": "step3_prepared", "generate": "@step3_prepared.prompt"},
+            "choice:online": {"next": "step3_online", "generate": "@step3_online.prompt"}
+        },
+        "otherwise": {"reply": "Please specify whether you're interested in roleplay, prepared, or online events."}
     },
     "step3_roleplay": {
-        "prompt": "Great! Role-Play/Case Study events involve a structured exam and case study. Do you prefer an individual event, a team decision-making event, or a personal financial literacy event?"
+        "prompt": "Great! Role-Play/Case Study events involve a structured exam and case study. Do you prefer an individual event, a team decision-making event, or a personal financial literacy event?",
+        "otherwise": {"next": "complete", "generate": "Let's build a preparation plan for the Role-Play/Case Study event you chose."}
     },
     "step3_prepared": {
-        "prompt": "Awesome! Prepared events involve a detailed project and presentation. What aspect interests you most? (e.g., Event Planning, Business Research, Entrepreneurship)"
+        "prompt": "Awesome! Prepared events involve a detailed project and presentation. What aspect interests you most? (e.g., Event Planning, Business Research, Entrepreneurship)",
+        "otherwise": {"next": "complete", "generate": "Let's build a project and presentation plan for the Prepared event you chose."}
     },
     "step3_online": {
-        "prompt": "Online simulation events test your business strategy. Which challenge interests you? (e.g., Stock Market, Personal Finance, Restaurant, Retail, Sports)"
+        "prompt": "Online simulation events test your business strategy. Which challenge interests you? (e.g., Stock Market, Personal Finance, Restaurant, Retail, Sports)",
+        "otherwise": {"next": "complete", "generate": "Let's build a practice strategy for the Online Simulation challenge you chose."}
     }
 }
 
@@ -96,22 +174,48 @@ MUN_WORKFLOW = {
     "step1_join": {
         "prompt": "I want to join MUN. Do you have an MUN club at your school? (Yes/No)",
         "response_if_yes": "Great! Since you have an MUN club, please contact your MUN advisor or attend the club meeting to begin training.",
-        "response_if_no": "No worries! You can start an MUN club or find external conferences. Would you like guidance on how to start one or locate conferences? (Yes/No)"
+        "response_if_no": "No worries! You can start an MUN club or find external conferences. Would you like guidance on how to start one or locate conferences? (Yes/No)",
+        "on": {
+            "yes": {"next": "step2_committees", "generate": "@step1_join.response_if_yes"},
+            "no": {"next": "step1_join_no_club", "generate": "@step1_join.response_if_no"}
+        },
+        "otherwise": {"reply": "Please confirm if you have an MUN club at your school. (Yes/No)"}
+    },
+    "step1_join_no_club": {
+        "prompt": "Proceeding to committee selection.",
+        "otherwise": {"next": "step2_committees", "prefix": "Proceeding to committee selection. ", "generate": "@step2_committees.prompt"}
     },
     "step2_committees": {
         "prompt": ("MUN conferences include committees like General Assemblies, Crisis Committees, Specialized Agencies, and Regional Bodies. "
                    "Would you like a detailed explanation of each type? (Yes/No)"),
         "response_if_yes": "Providing detailed committee descriptions based on MUN guidelines.",
-        "response_if_no": "Alright. Which committee interests you the most?"
+        "response_if_no": "Alright. Which committee interests you the most?",
+        "on": {
+            "choice": {"next": "step3_research", "generate": "Great choice with the {choice} committee. Let's proceed with research and writing."},
+            "yes": {"generate": "@step2_committees.response_if_yes"},
+            "no": {"next": "step3_research", "prefix": "Let's move on to MUN preparation. ", "generate": "@step2_committees.response_if_no"}
+        },
+        "otherwise": {"reply": "Please specify which MUN committee interests you."}
     },
     "step3_research": {
-        "prompt": "Let's move on to preparation. Would you like help with position paper writing, speech writing, or resolution writing? (Please specify)"
+        "prompt": "Let's move on to preparation. Would you like help with position paper writing, speech writing, or resolution writing? (Please specify)",
+        "otherwise": {"next": "step4_parliamentary", "prefix": "Let's work on that. ", "generate": "@step4_parliamentary.prompt"}
     },
     "step4_parliamentary": {
-        "prompt": "Parliamentary procedure structures the debate. Would you like a cheat sheet on the rules? (Yes/No)"
+        "prompt": "Parliamentary procedure structures the debate. Would you like a cheat sheet on the rules? (Yes/No)",
+        "on": {
+            "yes": {"next": "step5_registration", "prefix": "Here's a cheat sheet on the rules of parliamentary procedure. ", "generate": "@step5_registration.prompt"},
+            "no": {"next": "step5_registration", "generate": "@step5_registration.prompt"}
+        },
+        "otherwise": {"reply": "Would you like a cheat sheet on parliamentary procedure? (Yes/No)"}
     },
     "step5_registration": {
-        "prompt": "You're ready to compete! Have you registered for the conference? (Yes/No)"
+        "prompt": "You're ready to compete! Have you registered for the conference? (Yes/No)",
+        "on": {
+            "yes": {"next": "complete", "generate": "Great, you're registered! Here's a final checklist to get ready for the conference."},
+            "no": {"generate": "Let's get you registered. Here's how to find and register for an MUN conference."}
+        },
+        "otherwise": {"reply": "Have you registered for the conference? (Yes/No)"}
     }
 }
 
@@ -121,36 +225,68 @@ PODCAST_WORKFLOW = {
         "prompt": ("So you’re thinking about starting a podcast! What’s the main theme or purpose? "
                    "Are you sharing personal stories, interviewing guests, discussing a hobby, or covering school news? "
                    "Do you have a working concept? (Yes/No)"),
-        "response_if_yes": "Great! Now let's move on to choosing your podcast format."
+        "response_if_yes": "Great! Now let's move on to choosing your podcast format.",
+        "on": {
+            "yes": {"next": "step2_format", "generate": "@step1_concept.response_if_yes"},
+            "no": {"reply": "Let's brainstorm some podcast ideas. What topics do you love talking about?"}
+        },
+        "otherwise": {"reply": "Could you confirm if you have a podcast concept? (Yes/No)"}
     },
     "step2_format": {
         "prompt": ("Now that you have a concept, which format appeals to you? Options include Solo Commentary, Co-Hosted, "
                    "Interview-Based, Narrative/Storytelling, or Hybrid. Please specify your choice or say 'not sure' for guidance."),
-        "response_if_yes": "Excellent choice! Let's talk about equipment and software."
+        "response_if_yes": "Excellent choice! Let's talk about equipment and software.",
+        "on": {
+            "choice": {"next": "step3_equipment", "prefix": "You selected the {choice} format. ", "generate": "@step3_equipment.prompt"},
+            "yes": {"next": "step3_equipment", "generate": "@step2_format.response_if_yes"},
+            "no": {"reply": "Which podcast format do you prefer? (solo, co-hosted, interview, narrative, hybrid)"}
+        },
+        "otherwise": {"reply": "Please clarify your choice of podcast format."},
+        # A named format moves on even when the reply also reads as yes/no.
+        "prefer": "choice"
     },
     "step3_equipment": {
         "prompt": ("Let's be practical: what gear do you have? For example, do you have a USB microphone, headphones, "
-                   "and recording software? If you're not sure, I can suggest budget-friendly options.")
+                   "and recording software? If you're not sure, I can suggest budget-friendly options."),
+        "otherwise": {"next": "step4_branding", "generate": "@step4_branding.prompt"}
     },
     "step4_branding": {
-        "prompt": "Let's work on your podcast branding. What do you want to call your podcast and what vibe are you aiming for?"
+        "prompt": "Let's work on your podcast branding. What do you want to call your podcast and what vibe are you aiming for?",
+        "otherwise": {"next": "step5_episode_planning", "generate": "@step5_episode_planning.prompt"}
     },
     "step5_episode_planning": {
-        "prompt": ("Now let's plan your episodes. Have you thought of potential topics, an episode structure, and a release schedule? (Yes/No)")
+        "prompt": ("Now let's plan your episodes. Have you thought of potential topics, an episode structure, and a release schedule? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step6_recording", "generate": "@step6_recording.prompt"},
+            "no": {"generate": "Let's plan your episodes: brainstorm topics, pick an episode structure, and set a release schedule."}
+        },
+        "otherwise": {"reply": "Have you planned your episode topics, structure, and release schedule? (Yes/No)"}
     },
     "step6_recording": {
-        "prompt": ("It's time to record your first episode! Do you need tips on script preparation, recording techniques, or editing? (Please specify)")
+        "prompt": ("It's time to record your first episode! Do you need tips on script preparation, recording techniques, or editing? (Please specify)"),
+        "otherwise": {"next": "step7_hosting", "generate": "@step7_hosting.prompt"}
     },
     "step7_hosting": {
-        "prompt": ("Where will you host your podcast? Options include Anchor, Buzzsprout, or Podbean. Have you decided on a platform? (Yes/No)")
+        "prompt": ("Where will you host your podcast? Options include Anchor, Buzzsprout, or Podbean. Have you decided on a platform? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step8_marketing", "generate": "@step8_marketing.prompt"},
+            "no": {"generate": "Let's compare hosting platforms like Anchor, Buzzsprout, and Podbean so you can pick one."}
+        },
+        "otherwise": {"reply": "Have you decided on a hosting platform? (Yes/No)"}
     },
     "step8_marketing": {
         "prompt": ("Now that your podcast is live, how do you plan to get listeners? Would you like advice on social media promotion, "
-                   "word-of-mouth strategies, or collaborations? (Please specify)")
+                   "word-of-mouth strategies, or collaborations? (Please specify)"),
+        "otherwise": {"next": "step9_improvement", "generate": "@step9_improvement.prompt"}
     },
     "step9_improvement": {
         "prompt": ("Finally, how will you sustain and improve your podcast? Would you like strategies for collecting feedback, "
-                   "adjusting formats, or exploring monetization options? (Yes/No)")
+                   "adjusting formats, or exploring monetization options? (Yes/No)"),
+        "on": {
+            "yes": {"next": "complete", "generate": "Here are strategies for collecting listener feedback, adjusting your format, and exploring monetization."},
+            "no": {"next": "complete", "generate": "You're all set! Good luck with your podcast."}
+        },
+        "otherwise": {"reply": "Would you like strategies for improving your podcast? (Yes/No)"}
     }
 }
 
@@ -160,28 +296,53 @@ SCI_OLY_WORKFLOW = {
         "prompt": ("I want to compete in Science Olympiad but don’t know which event to choose. "
                    "Events are divided into three categories: Study Events (e.g., Anatomy & Physiology, Astronomy, Disease Detectives), "
                    "Lab-Based Events (e.g., Chem Lab, Experimental Design, Forensics), and "
-                   "Build Events (e.g., Bridge, Flight, Scrambler). Do you want a detailed explanation of each event type? (Yes/No)")
+                   "Build Events (e.g., Bridge, Flight, Scrambler). Do you want a detailed explanation of each event type? (Yes/No)"),
+        "on": {
+            "choice": {"next": "step2_select_event", "prefix": "You selected {choice} events. ", "generate": "@step2_select_event.prompt"},
+            "yes": {"generate": "Please provide a detailed explanation of each Science Olympiad event type based on the official rulebook."},
+            "no": {"next": "step2_select_event", "generate": "@step2_select_event.prompt"}
+        },
+        "otherwise": {"reply": "Could you clarify which Science Olympiad event category interests you? (Study, Lab, or Build) or do you want a detailed explanation? (Yes/No)"}
     },
     "step2_select_event": {
         "prompt": ("How do I choose the best Science Olympiad event for me? Your choice should align with your interests, skills, "
-                   "and team needs. Would you like a personalized recommendation based on your strengths? (Yes/No)")
+                   "and team needs. Would you like a personalized recommendation based on your strengths? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step3_preparation", "prefix": "Based on your interests and strengths, recommend a specific Science Olympiad event. ", "generate": "@step3_preparation.prompt"},
+            "no": {"next": "step3_preparation", "generate": "@step3_preparation.prompt"}
+        },
+        "otherwise": {"reply": "Would you like a personalized event recommendation? (Yes/No)"}
     },
     "step3_preparation": {
         "prompt": ("How do I prepare for my Science Olympiad event? Preparation varies by event type. "
                    "For Study Events, gather official rules, create study guides, and take practice tests. "
                    "For Lab-Based Events, review lab techniques and practice experiments. "
                    "For Build Events, study the rules, prototype, and test your device. "
-                   "Would you like sample tests, lab guides, or design tips? (Yes/No)")
+                   "Would you like sample tests, lab guides, or design tips? (Yes/No)"),
+        "on": {
+            "answer": {"next": "step4_strategies", "generate": "@step4_strategies.prompt"}
+        },
+        "otherwise": {"reply": "Do you need sample tests, lab guides, or design tips for preparation? (Yes/No)"}
     },
     "step4_strategies": {
         "prompt": ("What strategies can I use to perform well in Science Olympiad competitions? "
                    "General strategies include knowing the rules, time management, organization, and practicing under pressure. "
-                   "Would you like event-specific strategies or past competition insights? (Yes/No)")
+                   "Would you like event-specific strategies or past competition insights? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step5_competition_day", "prefix": "Providing event-specific strategies and past competition insights. ", "generate": "@step5_competition_day.prompt"},
+            "no": {"next": "step5_competition_day", "generate": "@step5_competition_day.prompt"}
+        },
+        "otherwise": {"reply": "Would you like event-specific strategies or past competition insights? (Yes/No)"}
     },
     "step5_competition_day": {
         "prompt": ("I'm ready for my Science Olympiad competition. Here’s a checklist for competition day: "
                    "Bring required materials, arrive early, check your equipment, stay calm, and review your work. "
-                   "Do you need further details or tips? (Yes/No)")
+                   "Do you need further details or tips? (Yes/No)"),
+        "on": {
+            "yes": {"next": "complete", "generate": "Here are additional tips and details for competition day."},
+            "no": {"next": "complete", "generate": "Great! You're all set for your Science Olympiad competition."}
+        },
+        "otherwise": {"reply": "Please confirm if you need further details for competition day. (Yes/No)"}
     }
 }
 
@@ -189,12 +350,27 @@ SCI_OLY_WORKFLOW = {
 VOLUNTEERING_WORKFLOW = {
     "step1_interests": {
         "prompt": ("Hey there! So you’re interested in volunteering, right? Can you think of any issue or area that sparks your passion? "
-                   "Maybe tutoring, helping animal shelters, organizing clean-ups, etc.? If you’re unsure, please share a few ideas or say you have none.")
+                   "Maybe tutoring, helping animal shelters, organizing clean-ups, etc.? If you’re unsure, please share a few ideas or say you have none."),
+        "on": {
+            "choice": {"next": "step2_types", "generate": "@step2_types.prompt"},
+            "yes": {"next": "step2_types", "generate": "@step2_types.prompt"},
+            "no": {"reply": "Keep brainstorming causes or share a few ideas that interest you."}
+        },
+        "prefer": "choice",
+        # A reply naming a cause is neither yes/no nor a path; treat it as the answer.
+        "otherwise": {"next": "step2_types", "generate": "@step2_types.prompt"}
     },
     "step2_types": {
         "prompt": ("Now that you've identified a cause, how do you want to get involved? "
                    "Options include joining an existing organization, one-time events, starting a local initiative, or launching an official nonprofit. "
-                   "Which path interests you? (existing, one-time, local, nonprofit)")
+                   "Which path interests you? (existing, one-time, local, nonprofit)"),
+        "on": {
+            "choice:existing": {"next": "step4_existing", "generate": "@step4_existing.prompt"},
+            "choice:one-time": {"next": "step4_existing", "generate": "@step4_existing.prompt"},
+            "choice:local": {"next": "step5_local_initiative", "generate": "@step5_local_initiative.prompt"},
+            "choice:nonprofit": {"next": "step6_nonprofit", "generate": "@step6_nonprofit.prompt"}
+        },
+        "otherwise": {"reply": "Which volunteering path interests you? (existing, one-time, local, nonprofit)"}
     },
     "step3_examples": {
         "prompt": ("Before we jump into tasks, let me share some stories from high school students who volunteered in areas like education, wildlife, or mental health. "
@@ -202,19 +378,39 @@ VOLUNTEERING_WORKFLOW = {
     },
     "step4_existing": {
         "prompt": ("If you decided to join an existing organization or do one-time events, make a list of 3-5 organizations or events aligned with your cause. "
-                   "Do you need help finding them? (Yes/No)")
+                   "Do you need help finding them? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step7_considerations", "prefix": "Here's how to find organizations and events aligned with your cause. ", "generate": "@step7_considerations.prompt"},
+            "no": {"next": "step7_considerations", "generate": "@step7_considerations.prompt"}
+        },
+        "otherwise": {"reply": "Do you need help finding organizations or events? (Yes/No)"}
     },
     "step5_local_initiative": {
         "prompt": ("If you prefer starting a local initiative, think about a need in your community (e.g., tutoring or a reading club). "
-                   "Are you ready to pilot a local project? (Yes/No)")
+                   "Are you ready to pilot a local project? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step7_considerations", "prefix": "Let's plan your pilot project. ", "generate": "@step7_considerations.prompt"},
+            "no": {"generate": "Let's identify a need in your community that a small local project could address."}
+        },
+        "otherwise": {"reply": "Are you ready to pilot a local project? (Yes/No)"}
     },
     "step6_nonprofit": {
         "prompt": ("If you're serious about starting an official nonprofit, you'll need to define your mission, research legal steps, form a board, and set up operations. "
-                   "Would you like guidance on this process? (Yes/No)")
+                   "Would you like guidance on this process? (Yes/No)"),
+        "on": {
+            "yes": {"next": "step7_considerations", "prefix": "Here's a step-by-step guide to starting a nonprofit. ", "generate": "@step7_considerations.prompt"},
+            "no": {"next": "step7_considerations", "generate": "@step7_considerations.prompt"}
+        },
+        "otherwise": {"reply": "Would you like guidance on starting a nonprofit? (Yes/No)"}
     },
     "step7_considerations": {
         "prompt": ("Lastly, consider awards, virtual volunteering, and collaborations with school clubs as ways to boost your profile. "
-                   "Do these options interest you? (Yes/No)")
+                   "Do these options interest you? (Yes/No)"),
+        "on": {
+            "yes": {"next": "complete", "generate": "Here are awards, virtual volunteering options, and school club collaborations to explore."},
+            "no": {"next": "complete", "generate": "Sounds good! Good luck with your volunteering journey."}
+        },
+        "otherwise": {"reply": "Do awards, virtual volunteering, or club collaborations interest you? (Yes/No)"}
     }
 }
 
@@ -229,7 +425,7 @@ def generate_workflow_response(prompt_template, student_info=None, user_message=
     if user_message:
         prompt += f"\nUser said: {user_message}"
     try:
-        response = openai.chat.completions.create(
+        response = chat_completion(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Generate structured, context-aware responses for workflow steps."},
@@ -246,19 +442,28 @@ def generate_workflow_response(prompt_template, student_info=None, user_message=
 # GPT-BASED CLASSIFICATION FUNCTIONS
 # -------------------------------
 def classify_deca_input(current_step, user_message):
+    local = classify_locally("deca", user_message)
+    if local is not None:
+        return local
     prompt = (
-        f"Current DECA step: {current_step}\nUser message: '{user_message}'\n"
+        f"Current DECA step: {current_step}\nUser message: '{SEMANTIC_SLOT}'\n"
         "Return a JSON with key 'answer' (yes or no) or key 'event_type' (roleplay, prepared, online)."
     )
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "classify_deca",
+            semantic_text=user_message,
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Classify user input for the DECA workflow."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=50,
-            temperature=0.0
+            temperature=0.0,
+            deadline=SHORT_CALL_DEADLINE,
+            hedge=True,
+            latency_key="classifier",
+            validate=json_reply
         )
         return json.loads(response.choices[0].message.content.strip())
     except Exception as e:
@@ -266,19 +471,28 @@ def classify_deca_input(current_step, user_message):
         return {}
 
 def classify_mun_input(current_step, user_message):
+    local = classify_locally("mun", user_message)
+    if local is not None:
+        return local
     prompt = (
-        f"Current MUN step: {current_step}\nUser message: '{user_message}'\n"
+        f"Current MUN step: {current_step}\nUser message: '{SEMANTIC_SLOT}'\n"
         "Return a JSON with key 'answer' (yes or no) or key 'committee' (General Assemblies, Crisis Committees, Specialized Agencies, Regional Bodies)."
     )
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "classify_mun",
+            semantic_text=user_message,
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Classify user input for the MUN workflow."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=50,
-            temperature=0.0
+            temperature=0.0,
+            deadline=SHORT_CALL_DEADLINE,
+            hedge=True,
+            latency_key="classifier",
+            validate=json_reply
         )
         return json.loads(response.choices[0].message.content.strip())
     except Exception as e:
@@ -286,19 +500,28 @@ def classify_mun_input(current_step, user_message):
         return {}
 
 def classify_podcast_input(current_step, user_message):
+    local = classify_locally("podcast", user_message)
+    if local is not None:
+        return local
     prompt = (
-        f"Current Podcast step: {current_step}\nUser message: '{user_message}'\n"
+        f"Current Podcast step: {current_step}\nUser message: '{SEMANTIC_SLOT}'\n"
         "Return a JSON with key 'answer' (yes or no) or key 'choice' (solo, co-hosted, interview, narrative, hybrid)."
     )
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "classify_podcast",
+            semantic_text=user_message,
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Classify user input for the Podcast workflow."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=50,
-            temperature=0.0
+            temperature=0.0,
+            deadline=SHORT_CALL_DEADLINE,
+            hedge=True,
+            latency_key="classifier",
+            validate=json_reply
         )
         return json.loads(response.choices[0].message.content.strip())
     except Exception as e:
@@ -306,19 +529,28 @@ def classify_podcast_input(current_step, user_message):
         return {}
 
 def classify_science_olympiad_input(current_step, user_message):
+    local = classify_locally("science_olympiad", user_message)
+    if local is not None:
+        return local
     prompt = (
-        f"Current Science Olympiad step: {current_step}\nUser message: '{user_message}'\n"
+        f"Current Science Olympiad step: {current_step}\nUser message: '{SEMANTIC_SLOT}'\n"
         "Return a JSON with key 'answer' (yes or no) or key 'event_category' (study, lab, build)."
     )
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "classify_science_olympiad",
+            semantic_text=user_message,
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Classify user input for the Science Olympiad workflow."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=50,
-            temperature=0.0
+            temperature=0.0,
+            deadline=SHORT_CALL_DEADLINE,
+            hedge=True,
+            latency_key="classifier",
+            validate=json_reply
         )
         return json.loads(response.choices[0].message.content.strip())
     except Exception as e:
@@ -326,19 +558,28 @@ def classify_science_olympiad_input(current_step, user_message):
         return {}
 
 def classify_volunteering_input(current_step, user_message):
+    local = classify_locally("volunteering", user_message)
+    if local is not None:
+        return local
     prompt = (
-        f"Current Volunteering step: {current_step}\nUser message: '{user_message}'\n"
+        f"Current Volunteering step: {current_step}\nUser message: '{SEMANTIC_SLOT}'\n"
         "Return a JSON with key 'answer' (yes or no) or key 'path' (existing, one-time, local, nonprofit)."
     )
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "classify_volunteering",
+            semantic_text=user_message,
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Classify user input for the Volunteering workflow."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=50,
-            temperature=0.0
+            temperature=0.0,
+            deadline=SHORT_CALL_DEADLINE,
+            hedge=True,
+            latency_key="classifier",
+            validate=json_reply
         )
         return json.loads(response.choices[0].message.content.strip())
     except Exception as e:
@@ -346,48 +587,47 @@ def classify_volunteering_input(current_step, user_message):
         return {}
 
 def classify_research_input(current_step, user_message):
+    local = classify_locally("research", user_message)
+    if local is not None:
+        return local
     prompt = (
-        f"Current Research step: {current_step}\nUser message: '{user_message}'\n"
+        f"Current Research step: {current_step}\nUser message: '{SEMANTIC_SLOT}'\n"
         "For steps 'step1_intro' and 'step2_types', return a JSON with key 'answer' (yes or no). "
         "For 'step3_mentor', return a JSON with key 'option' with value 'mentor' or 'jump'."
     )
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "classify_research",
+            semantic_text=user_message,
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Classify user input for the Research workflow."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=50,
-            temperature=0.0
+            temperature=0.0,
+            deadline=SHORT_CALL_DEADLINE,
+            hedge=True,
+            latency_key="classifier",
+            validate=json_reply
         )
         return json.loads(response.choices[0].message.content.strip())
     except Exception as e:
         print("Error in classify_research_input:", e)
         return {}
 
-def detect_research_request(user_message):
-    return "research" in user_message.lower()
-
-def detect_deca_request(user_message):
-    return "deca" in user_message.lower()
-
-def detect_mun_request(user_message):
-    return "mun" in user_message.lower()
-
-def detect_podcast_request(user_message):
-    return "podcast" in user_message.lower()
-
-def detect_science_olympiad_request(user_message):
-    return "science olympiad" in user_message.lower()
-
-def detect_volunteering_request(user_message):
-    keywords = ["volunteer", "nonprofit", "volunteering"]
-    return any(word in user_message.lower() for word in keywords)
-
 # -------------------------------
 # EXTRACT_GOALS_FROM_TEXT FUNCTION
 # -------------------------------
+def parse_fallback_goals(output):
+    output = output.strip()
+    # Post-process output if necessary
+    if len(output) > 10:
+        output = output[8:]
+    if len(output) > 3:
+        output = output[:len(output)-3]
+    return json.loads(output)
+
 def extract_goals_from_text(text):
     """
     Uses a two-pass approach with GPT to extract actionable goal recommendations from the provided text.
@@ -398,14 +638,17 @@ def extract_goals_from_text(text):
         f"Text: {text}"
     )
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "extract_goals",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an assistant that extracts actionable goals from text."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=100,
-            temperature=0.0
+            temperature=0.0,
+            priority=BACKGROUND,
+            validate=json_reply
         )
         output = response.choices[0].message.content.strip()
         goals = json.loads(output)
@@ -421,22 +664,19 @@ def extract_goals_from_text(text):
         f"Text: {text}"
     )
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "extract_goals_fallback",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an assistant that generates actionable student goals from advice."},
                 {"role": "user", "content": fallback_prompt}
             ],
             max_tokens=150,
-            temperature=0.0
+            temperature=0.0,
+            priority=BACKGROUND,
+            validate=lambda r: isinstance(parse_fallback_goals(r.choices[0].message.content), list)
         )
-        output = response.choices[0].message.content.strip()
-        # Post-process output if necessary
-        if len(output) > 10:
-            output = output[8:]
-        if len(output) > 3:
-            output = output[:len(output)-3]
-        goals = json.loads(output)
+        goals = parse_fallback_goals(response.choices[0].message.content)
         if isinstance(goals, list):
             return goals
     except Exception as e:
@@ -465,241 +705,44 @@ def get_workflow_state(student_id):
 # -------------------------------
 # WORKFLOW PROCESSING FUNCTIONS
 # -------------------------------
-def process_research_workflow(student_info, workflow_state, user_message):
-    current_step = workflow_state.get('research_state', 'none')
-    if current_step == 'none':
-        workflow_state['research_state'] = 'step1_intro'
-        return generate_workflow_response(RESEARCH_WORKFLOW['step1_intro']['prompt'], student_info, user_message)
-    if current_step == 'step1_intro':
-        classification = classify_research_input('step1_intro', user_message)
-        if classification.get('answer') == 'yes':
-            workflow_state['research_state'] = 'step2_types'
-            return generate_workflow_response(RESEARCH_WORKFLOW['step2_types']['prompt'], student_info, user_message)
-        elif classification.get('answer') == 'no':
-            return generate_workflow_response("Let's revisit the potential research fields. Do any of these topics interest you? (Yes/No)", student_info, user_message)
-        else:
-            return "Please respond with Yes or No regarding your interest in the suggested research fields."
-    if current_step == 'step2_types':
-        classification = classify_research_input('step2_types', user_message)
-        if classification.get('answer') == 'yes':
-            workflow_state['research_state'] = 'step3_mentor'
-            return generate_workflow_response(RESEARCH_WORKFLOW['step3_mentor']['prompt'], student_info, user_message)
-        elif classification.get('answer') == 'no':
-            workflow_state['research_state'] = 'step3_mentor'
-            return generate_workflow_response("Alright, let's move forward with your research journey. " + RESEARCH_WORKFLOW['step3_mentor']['prompt'], student_info, user_message)
-        else:
-            return "Please respond with Yes or No regarding your interest in the suggested research paths."
-    if current_step == 'step3_mentor':
-        classification = classify_research_input('step3_mentor', user_message)
-        if classification.get('option') == 'mentor':
-            workflow_state['research_state'] = 'mentor'
-            return generate_workflow_response("Connecting you with a research mentor. Please wait...", student_info, user_message)
-        elif classification.get('option') == 'jump':
-            workflow_state['research_state'] = 'step4_details'
-            return generate_workflow_response(RESEARCH_WORKFLOW['step4_details']['prompt'], student_info, user_message)
-        else:
-            return "Please specify if you want to speak to a mentor or jump straight into your research journey. (Mentor/Jump)"
-    if current_step == 'step4_details':
-        return generate_workflow_response("Let's finalize your research plan. Please review the details and confirm your next steps.", student_info, user_message)
-    return "Research workflow processing complete for now."
-
-def process_deca_workflow(student_info, workflow_state, user_message):
-    current_step = workflow_state.get('deca_stage', 'none')
-    if current_step == 'none':
-        workflow_state['deca_stage'] = 'step1_join'
-        return generate_workflow_response(DECA_WORKFLOW['step1_join']['prompt'], student_info, user_message)
-    if current_step == 'step1_join':
-        classification = classify_deca_input('step1_join', user_message)
-        if classification.get('answer') == 'yes':
-            workflow_state['deca_stage'] = 'step2_event_types'
-            return generate_workflow_response(DECA_WORKFLOW['step1_join']['response_if_yes'], student_info, user_message)
-        elif classification.get('answer') == 'no':
-            workflow_state['deca_stage'] = 'step1_join_no_chapter'
-            return generate_workflow_response(DECA_WORKFLOW['step1_join']['response_if_no'], student_info, user_message)
-        else:
-            return "Could you please confirm if you have a DECA chapter at your school? (Yes/No)"
-    if current_step == 'step1_join_no_chapter':
-        workflow_state['deca_stage'] = 'step2_event_types'
-        prompt = "Proceeding to event selection. " + DECA_WORKFLOW['step2_event_types']['prompt']
-        return generate_workflow_response(prompt, student_info, user_message)
-    if current_step == 'step2_event_types':
-        classification = classify_deca_input('step2_event_types', user_message)
-        if classification.get('answer') == 'yes':
-            return generate_workflow_response(DECA_WORKFLOW['step2_event_types']['response_if_yes'], student_info, user_message)
-        elif classification.get('answer') == 'no':
-            workflow_state['deca_stage'] = 'step3_choose_event'
-            return generate_workflow_response(DECA_WORKFLOW['step2_event_types']['response_if_no'], student_info, user_message)
-        elif classification.get('event_type'):
-            event_type = classification.get('event_type')
-            if event_type == 'roleplay':
-                workflow_state['deca_stage'] = 'step3_roleplay'
-                return generate_workflow_response(DECA_WORKFLOW['step3_roleplay']['prompt'], student_info, user_message)
-            elif event_type == 'prepared':
-                workflow_state['deca_stage'] = 'step3_prepared'
-                return generate_workflow_response(DECA_WORKFLOW['step3_prepared']['prompt'], student_info, user_message)
-            elif event_type == 'online':
-                workflow_state['deca_stage'] = 'step3_online'
-                return generate_workflow_response(DECA_WORKFLOW['step3_online']['prompt'], student_info, user_message)
-            else:
-                return "Please specify whether you're interested in roleplay, prepared, or online events."
-        else:
-            return "Could you clarify your choice for DECA event types?"
-    return "DECA workflow processing complete for now."
-
-def process_mun_workflow(student_info, workflow_state, user_message):
-    current_step = workflow_state.get('mun_stage', 'none')
-    if current_step == 'none':
-        workflow_state['mun_stage'] = 'step1_join'
-        return generate_workflow_response(MUN_WORKFLOW['step1_join']['prompt'], student_info, user_message)
-    if current_step == 'step1_join':
-        classification = classify_mun_input('step1_join', user_message)
-        if classification.get('answer') == 'yes':
-            workflow_state['mun_stage'] = 'step2_committees'
-            return generate_workflow_response(MUN_WORKFLOW['step1_join']['response_if_yes'], student_info, user_message)
-        elif classification.get('answer') == 'no':
-            workflow_state['mun_stage'] = 'step1_join_no_club'
-            return generate_workflow_response(MUN_WORKFLOW['step1_join']['response_if_no'], student_info, user_message)
-        else:
-            return "Please confirm if you have an MUN club at your school. (Yes/No)"
-    if current_step == 'step1_join_no_club':
-        workflow_state['mun_stage'] = 'step2_committees'
-        prompt = "Proceeding to committee selection. " + MUN_WORKFLOW['step2_committees']['prompt']
-        return generate_workflow_response(prompt, student_info, user_message)
-    if current_step == 'step2_committees':
-        classification = classify_mun_input('step2_committees', user_message)
-        if classification.get('answer') == 'yes':
-            return generate_workflow_response(MUN_WORKFLOW['step2_committees']['response_if_yes'], student_info, user_message)
-        elif classification.get('answer') == 'no':
-            workflow_state['mun_stage'] = 'step3_research'
-            prompt = "Let's move on to MUN preparation. " + MUN_WORKFLOW['step2_committees']['response_if_no']
-            return generate_workflow_response(prompt, student_info, user_message)
-        elif classification.get('committee'):
-            workflow_state['mun_stage'] = 'step3_research'
-            committee = classification.get('committee')
-            prompt = f"Great choice with the {committee} committee. Let's proceed with research and writing."
-            return generate_workflow_response(prompt, student_info, user_message)
-        else:
-            return "Please specify which MUN committee interests you."
-    return "MUN workflow processing complete for now."
-
-def process_podcast_workflow(student_info, workflow_state, user_message):
-    current_step = workflow_state.get('podcast_stage', 'none')
-    if current_step == 'none':
-        workflow_state['podcast_stage'] = 'step1_concept'
-        return generate_workflow_response(PODCAST_WORKFLOW['step1_concept']['prompt'], student_info, user_message)
-    if current_step == 'step1_concept':
-        classification = classify_podcast_input('step1_concept', user_message)
-        if classification.get('answer') == 'yes':
-            workflow_state['podcast_stage'] = 'step2_format'
-            return generate_workflow_response(PODCAST_WORKFLOW['step1_concept']['response_if_yes'], student_info, user_message)
-        elif classification.get('answer') == 'no':
-            return "Let's brainstorm some podcast ideas. What topics do you love talking about?"
-        else:
-            return "Could you confirm if you have a podcast concept? (Yes/No)"
-    if current_step == 'step2_format':
-        classification = classify_podcast_input('step2_format', user_message)
-        if classification.get('choice'):
-            choice = classification.get('choice')
-            workflow_state['podcast_stage'] = 'step3_equipment'
-            prompt = f"You selected the {choice} format. " + PODCAST_WORKFLOW['step2_format']['prompt']
-            return generate_workflow_response(prompt, student_info, user_message)
-        elif classification.get('answer') == 'yes':
-            workflow_state['podcast_stage'] = 'step3_equipment'
-            return generate_workflow_response(PODCAST_WORKFLOW['step2_format']['response_if_yes'], student_info, user_message)
-        elif classification.get('answer') == 'no':
-            return "Which podcast format do you prefer? (solo, co-hosted, interview, narrative, hybrid)"
-        else:
-            return "Please clarify your choice of podcast format."
-    return "Podcast workflow processing complete for now."
-
-def process_science_olympiad_workflow(student_info, workflow_state, user_message):
-    current_step = workflow_state.get('science_olympiad_stage', 'none')
-    if current_step == 'none':
-        workflow_state['science_olympiad_stage'] = 'step1_categories'
-        return generate_workflow_response(SCI_OLY_WORKFLOW['step1_categories']['prompt'], student_info, user_message)
-    if current_step == 'step1_categories':
-        classification = classify_science_olympiad_input('step1_categories', user_message)
-        if classification.get('answer') == 'yes':
-            return generate_workflow_response("Please provide a detailed explanation of each Science Olympiad event type based on the official rulebook.", student_info, user_message)
-        elif classification.get('answer') == 'no':
-            workflow_state['science_olympiad_stage'] = 'step2_select_event'
-            return generate_workflow_response(SCI_OLY_WORKFLOW['step2_select_event']['prompt'], student_info, user_message)
-        elif classification.get('event_category'):
-            event_cat = classification.get('event_category')
-            workflow_state['science_olympiad_stage'] = 'step2_select_event'
-            prompt = f"You selected {event_cat} events. " + SCI_OLY_WORKFLOW['step2_select_event']['prompt']
-            return generate_workflow_response(prompt, student_info, user_message)
-        else:
-            return "Could you clarify which Science Olympiad event category interests you? (Study, Lab, or Build) or do you want a detailed explanation? (Yes/No)"
-    if current_step == 'step2_select_event':
-        classification = classify_science_olympiad_input('step2_select_event', user_message)
-        if classification.get('answer') == 'yes':
-            return generate_workflow_response("Based on your interests and strengths, I recommend a specific Science Olympiad event. Could you provide more details about your strengths?", student_info, user_message)
-        elif classification.get('answer') == 'no':
-            workflow_state['science_olympiad_stage'] = 'step3_preparation'
-            return generate_workflow_response(SCI_OLY_WORKFLOW['step3_preparation']['prompt'], student_info, user_message)
-        else:
-            return "Would you like a personalized event recommendation? (Yes/No)"
-    if current_step == 'step3_preparation':
-        classification = classify_science_olympiad_input('step3_preparation', user_message)
-        if classification.get('answer') in ['yes', 'no']:
-            workflow_state['science_olympiad_stage'] = 'step4_strategies'
-            return generate_workflow_response(SCI_OLY_WORKFLOW['step4_strategies']['prompt'], student_info, user_message)
-        else:
-            return "Do you need sample tests, lab guides, or design tips for preparation? (Yes/No)"
-    if current_step == 'step4_strategies':
-        classification = classify_science_olympiad_input('step4_strategies', user_message)
-        if classification.get('answer') == 'yes':
-            return generate_workflow_response("Providing event-specific strategies and past competition insights.", student_info, user_message)
-        elif classification.get('answer') == 'no':
-            workflow_state['science_olympiad_stage'] = 'step5_competition_day'
-            return generate_workflow_response(SCI_OLY_WORKFLOW['step5_competition_day']['prompt'], student_info, user_message)
-        else:
-            return "Would you like event-specific strategies or past competition insights? (Yes/No)"
-    if current_step == 'step5_competition_day':
-        classification = classify_science_olympiad_input('step5_competition_day', user_message)
-        if classification.get('answer') == 'yes':
-            return generate_workflow_response("Here are additional tips and details for competition day.", student_info, user_message)
-        elif classification.get('answer') == 'no':
-            return generate_workflow_response("Great! You're all set for your Science Olympiad competition.", student_info, user_message)
-        else:
-            return "Please confirm if you need further details for competition day. (Yes/No)"
-    return "Science Olympiad workflow processing complete for now."
-
-def process_volunteering_workflow(student_info, workflow_state, user_message):
-    current_step = workflow_state.get('volunteering_stage', 'none')
-    if current_step == 'none':
-        workflow_state['volunteering_stage'] = 'step1_interests'
-        return generate_workflow_response(VOLUNTEERING_WORKFLOW['step1_interests']['prompt'], student_info, user_message)
-    if current_step == 'step1_interests':
-        classification = classify_volunteering_input('step1_interests', user_message)
-        if classification.get('answer') == 'yes' or classification.get('path'):
-            workflow_state['volunteering_stage'] = 'step2_types'
-            return generate_workflow_response(VOLUNTEERING_WORKFLOW['step2_types']['prompt'], student_info, user_message)
-        else:
-            return "Keep brainstorming causes or share a few ideas that interest you."
-    if current_step == 'step2_types':
-        classification = classify_volunteering_input('step2_types', user_message)
-        if classification.get('path') in ['existing', 'one-time']:
-            workflow_state['volunteering_stage'] = 'step4_existing'
-            return generate_workflow_response(VOLUNTEERING_WORKFLOW['step4_existing']['prompt'], student_info, user_message)
-        elif classification.get('path') == 'local':
-            workflow_state['volunteering_stage'] = 'step5_local_initiative'
-            return generate_workflow_response(VOLUNTEERING_WORKFLOW['step5_local_initiative']['prompt'], student_info, user_message)
-        elif classification.get('path') == 'nonprofit':
-            workflow_state['volunteering_stage'] = 'step6_nonprofit'
-            return generate_workflow_response(VOLUNTEERING_WORKFLOW['step6_nonprofit']['prompt'], student_info, user_message)
-        else:
-            return "Which volunteering path interests you? (existing, one-time, local, nonprofit)"
-    if current_step == 'step4_existing':
-        return generate_workflow_response(VOLUNTEERING_WORKFLOW['step4_existing']['prompt'], student_info, user_message)
-    if current_step == 'step5_local_initiative':
-        return generate_workflow_response(VOLUNTEERING_WORKFLOW['step5_local_initiative']['prompt'], student_info, user_message)
-    if current_step == 'step6_nonprofit':
-        return generate_workflow_response(VOLUNTEERING_WORKFLOW['step6_nonprofit']['prompt'], student_info, user_message)
-    if current_step == 'step7_considerations':
-        return generate_workflow_response(VOLUNTEERING_WORKFLOW['step7_considerations']['prompt'], student_info, user_message)
-    return "Volunteering workflow processing complete for now."
+RESEARCH_MENTOR_OPTIONS = 3
+
+def describe_mentor_options(student_info, user_message, k=RESEARCH_MENTOR_OPTIONS):
+    """Top-k diverse mentors with a one-line story each, from a single mentor search."""
+    try:
+        mentors = recommend_mentors(user_message, student_info, k=k, diversity=0.3)
+    except Exception as e:
+        print("Error recommending mentors:", e)
+        return ""
+    stories = []
+    for mentor_id, _ in mentors:
+        story = explain_mentor_match(mentor_id, user_message, student_info)
+        stories.append(f"- {story}" if story else f"- {mentor_id}")
+    return "\n".join(stories)
+
+def mentor_stories(student_info, user_message):
+    return describe_mentor_options(student_info, user_message) or "[Mentor stories]"
+
+def build_workflow_engine(name, steps, start, classifier, done_name):
+    route = WORKFLOW_ROUTES[name]
+    return WorkflowEngine(
+        name, steps, route["stage_key"], start, classifier, route["choice_key"],
+        generate_workflow_response,
+        context_providers={"mentor_stories": mentor_stories},
+        done_message=f"{done_name} workflow processing complete for now."
+    )
+
+WORKFLOW_ENGINES = {
+    "research": build_workflow_engine("research", RESEARCH_WORKFLOW, "step1_intro", classify_research_input, "Research"),
+    "deca": build_workflow_engine("deca", DECA_WORKFLOW, "step1_join", classify_deca_input, "DECA"),
+    "mun": build_workflow_engine("mun", MUN_WORKFLOW, "step1_join", classify_mun_input, "MUN"),
+    "podcast": build_workflow_engine("podcast", PODCAST_WORKFLOW, "step1_concept", classify_podcast_input, "Podcast"),
+    "science_olympiad": build_workflow_engine("science_olympiad", SCI_OLY_WORKFLOW, "step1_categories", classify_science_olympiad_input, "Science Olympiad"),
+    "volunteering": build_workflow_engine("volunteering", VOLUNTEERING_WORKFLOW, "step1_interests", classify_volunteering_input, "Volunteering"),
+}
+
+def workflow_needs_classification(workflow, workflow_state):
+    return WORKFLOW_ENGINES[workflow].needs_classification(workflow_state)
 
 # -------------------------------
 # UTILITY FUNCTIONS (Conversation, Goals, etc.)
@@ -707,7 +750,7 @@ def process_volunteering_workflow(student_info, workflow_state, user_message):
 def _chat_with_athena(student_info, conversation, conversation_summary):
     try:
         messages_for_model = generate_messages(student_info, conversation, conversation_summary)
-        response = openai.chat.completions.create(
+        response = chat_completion(
             model="gpt-4",
             messages=messages_for_model,
             max_tokens=300,
@@ -716,6 +759,27 @@ def _chat_with_athena(student_info, conversation, conversation_summary):
         return response.choices[0].message.content.strip()
     except Exception as e:
         return f"Error in AI response: {str(e)}"
+
+def _stream_athena(student_info, conversation, conversation_summary):
+    """Like _chat_with_athena, but yields the reply text piece by piece as the model produces it."""
+    try:
+        messages_for_model = generate_messages(student_info, conversation, conversation_summary)
+        stream = chat_completion(
+            model="gpt-4",
+            messages=messages_for_model,
+            max_tokens=300,
+            temperature=0.8,
+            stream=True
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except Exception as e:
+        yield f"Error in AI response: {str(e)}"
+
 def parse_onboarding_info(questions):
     """
     Uses GPT to summarize and contextualize a student's onboarding answers into the appropriate student schema fields.
@@ -742,7 +806,7 @@ def parse_onboarding_info(questions):
         "Output a JSON object with keys: intended_major, creativity, service, skill_talent, extracurriculars, leadership."
     )
     try:
-        response = openai.chat.completions.create(
+        response = chat_completion(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "You are an assistant that maps onboarding answers to a student schema."},
@@ -758,18 +822,6 @@ def parse_onboarding_info(questions):
         print("Error in parse_onboarding_info:", e)
         return {}
 
-def update_student_topics(student_id, new_topic_sentence):
-    student_ref = db.collection("students").document(student_id)
-    student = student_ref.get()
-    if student.exists:
-        student_data = student.to_dict()
-        topics = student_data.get("topics", [])
-        topics.insert(0, new_topic_sentence)
-        topics = topics[:50]
-        student_ref.update({"topics": topics})
-        return topics
-    return None
-
 def shorten_topic_sentence(topic, chat_partner):
     return f"Talked to {chat_partner} about: {topic[:50]}..."
 
@@ -778,25 +830,38 @@ def get_student_data(student_id):
     student = student_ref.get()
     return student.to_dict() if student.exists else None
 
+# Field masks for endpoints that only need part of the document.
+GOALS_FIELDS = ("goals",)
+TOPICS_FIELDS = ("topics",)
+POST_TURN_FIELDS = ("post_turn",)
+HISTORY_FIELDS = ("message_count",)
+PROFILE_FIELDS = ("name", "grade", "future_study", "deep_interest", "unique_something",
+                  "current_extracurriculars", "favorite_courses", "competitions", "goals")
+STARTERS_FIELDS = PROFILE_FIELDS + ("last_conversation",)
+
+def get_student_fields(student_id, fields):
+    """Reads only the given fields of the student (a Firestore field mask); None when the student does not exist."""
+    student = db.collection("students").document(student_id).get(field_paths=list(fields))
+    return (student.to_dict() or {}) if student.exists else None
+
+def get_cached_student_data(student_id, fields=None):
+    """
+    get_student_data (or get_student_fields when fields is given) through
+    STUDENT_CACHE, for read-only endpoints; do not modify the result.
+    """
+    if fields is None:
+        return STUDENT_CACHE.read_through(student_id, get_student_data)
+    return STUDENT_CACHE.read_through(student_id, lambda sid: get_student_fields(sid, fields), fields)
+
 def save_student_data(student_id, student_data):
     student_ref = db.collection("students").document(student_id)
     student_ref.set(student_data)
+    STUDENT_CACHE.invalidate(student_id)
 
 def update_student_data(student_id, update_fields):
     student_ref = db.collection("students").document(student_id)
     student_ref.update(update_fields)
-
-def add_goal(student_id, new_goal):
-    student_ref = db.collection("students").document(student_id)
-    student = student_ref.get()
-    if student.exists:
-        student_data = student.to_dict()
-        goals = student_data.get("goals", [])
-        if new_goal not in goals:
-            goals.append(new_goal)
-            student_ref.update({"goals": goals})
-            return True
-    return False
+    STUDENT_CACHE.invalidate(student_id)
 
 # -------------------------------
 # NEW API ENDPOINT TO UPDATE STUDENT SCHEMA (Onboarding with Contextual Mapping)
@@ -858,8 +923,8 @@ def create_or_update_student():
 @app.route('/api/goals/<student_id>', methods=['GET'])
 def get_goals_endpoint(student_id):
     student_id = student_id.strip().lower()
-    student_info = get_student_data(student_id)
-    if not student_info:
+    student_info = get_cached_student_data(student_id, GOALS_FIELDS)
+    if student_info is None:
         return jsonify({"error": "Student not found"}), 404
     goals = student_info.get("goals", [])
     return jsonify({"goals": goals})
@@ -868,8 +933,8 @@ def get_goals_endpoint(student_id):
 def get_conversation_starters_endpoint(student_id):
     try:
         student_id = student_id.strip().lower()
-        student_info = get_student_data(student_id)
-        if not student_info:
+        student_info = get_cached_student_data(student_id, STARTERS_FIELDS)
+        if student_info is None:
             return jsonify({"error": "Student not found"}), 404
         conversation = student_info.get("last_conversation", [])
         starters = generate_conversation_starters(student_info, conversation)
@@ -877,6 +942,283 @@ def get_conversation_starters_endpoint(student_id):
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+def new_student_record():
+    return {
+        'name': '',
+        'grade': '',
+        'future_study': '',
+        'deep_interest': '',
+        'current_extracurriculars': '',
+        'favorite_courses': '',
+        'competitions': [],
+        'notes': [],
+        'goals': [],
+        'conversation_summary': "",
+        'last_conversation': [],
+        'message_count': 0,
+        'topics': [],
+        'workflow_state': {
+            "deca_stage": "none",
+            "mun_stage": "none",
+            "podcast_stage": "none",
+            "science_olympiad_stage": "none",
+            "volunteering_stage": "none",
+            "research_state": "none"
+        }
+    }
+
+def new_chat_turn(student_id, user_message, session):
+    """
+    The turn state shared by the sync (app.py) and async (asgi_app.py) chat
+    routes. session is the turn's StudentSession; the turn saves through it.
+    """
+    student_info = session.data
+    workflow_state = student_info.get("workflow_state", {
+        "deca_stage": "none",
+        "mun_stage": "none",
+        "podcast_stage": "none",
+        "science_olympiad_stage": "none",
+        "volunteering_stage": "none",
+        "research_state": "none"
+    })
+    return {
+        "student_id": student_id,
+        "session": session,
+        "user_message": user_message,
+        "student_info": student_info,
+        "workflow_state": workflow_state,
+        "conversation": student_info.get("last_conversation", []),
+        "conversation_summary": student_info.get("conversation_summary", ""),
+        "workflow_response": None,
+        "stages": None
+    }
+
+def route_chat_turn(turn):
+    """
+    Lets a workflow answer the turn. Returns the fields to save when one did
+    (the reply is in turn["workflow_response"]), otherwise appends the user
+    message for the main completion and returns None.
+    """
+    user_message = turn["user_message"]
+    route = route_message(user_message, turn["workflow_state"], workflow_needs_classification)
+    if route["workflow"]:
+        engine = WORKFLOW_ENGINES[route["workflow"]]
+        turn["workflow_response"] = engine.process(turn["student_info"], turn["workflow_state"], user_message, route["classification"])
+
+    if turn["workflow_response"] is not None:
+        turn["conversation"].append({'role': 'assistant', 'content': turn["workflow_response"]})
+        turn["session"].append_message("user", user_message)
+        turn["session"].append_message("assistant", turn["workflow_response"])
+        turn["session"].set_conversation(turn["conversation"], RECENT_MESSAGES_WINDOW)
+        return {
+            "conversation_summary": turn["conversation_summary"],
+            "workflow_state": turn["workflow_state"]
+        }
+    turn["conversation"].append({'role': 'user', 'content': user_message})
+    return None
+
+def begin_chat_turn(student_id, user_message, reply=None):
+    """
+    Loads the student (a new one is only created by the turn's write),
+    routes the message to a workflow and, when no workflow handles it,
+    prepares the conversation for the main completion. Returns the turn
+    state shared by /api/chat and /api/chat/stream; turn["workflow_response"]
+    is set when a workflow answered and the turn is already saved. Otherwise
+    turn["stages"] is the running plan_chat_turn graph.
+
+    Everything the turn changes is kept in turn["session"] and written once,
+    so a turn costs one document read and one write.
+    """
+    session = StudentSession.load(db, student_id, default=new_student_record)
+    turn = new_chat_turn(student_id, user_message, session)
+    workflow_fields = route_chat_turn(turn)
+    if workflow_fields is not None:
+        session.update(workflow_fields)
+        session.commit()
+        return turn
+
+    session.add_topic(shorten_topic_sentence(user_message, "Athena"))
+    turn["stages"] = plan_chat_turn(turn, reply).start()
+    return turn
+
+def plan_chat_turn(turn, reply=None):
+    """
+    Stage graph for the rest of a non-workflow turn. History trimming and
+    the mentor embedding prefetch are independent and run in parallel; the
+    reply (when given, e.g. _chat_with_athena) only waits for the trimmed
+    history.
+    """
+    student_info = turn["student_info"]
+    user_message = turn["user_message"]
+
+    def trim_history():
+        turn["conversation"], turn["conversation_summary"] = optimize_conversation_history(turn["conversation"], turn["conversation_summary"])
+
+    graph = StageGraph(TURN_STAGE_EXECUTOR)
+    graph.add("history", trim_history)
+    if student_info.get('mentor_cooldown', 0) <= 0:
+        graph.add("mentor_prefetch", lambda: prefetch_mentor_embeddings(user_message))
+    if reply is not None:
+        graph.add("reply", lambda _: reply(student_info, turn["conversation"], turn["conversation_summary"]), after=("history",))
+    return graph
+
+def close_chat_turn(turn, assistant_message):
+    """
+    Appends the assistant reply (to the turn and to its session's
+    transcript and recent window) and advances the cooldowns. Returns the
+    other fields to save for the turn; turn["run_goals"] / turn["run_mentor"] say
+    which post-turn stages to queue. Takes a POST_TURN_SLOTS slot for them,
+    which queue_post_turn hands to the job (or release_post_turn_slot
+    returns when the save fails).
+    """
+    student_info = turn["student_info"]
+    turn["conversation"].append({'role': 'assistant', 'content': assistant_message})
+    turn["assistant_message"] = assistant_message
+    turn["session"].append_message("user", turn["user_message"])
+    turn["session"].append_message("assistant", assistant_message)
+    turn["session"].set_conversation(turn["conversation"], RECENT_MESSAGES_WINDOW)
+
+    turn["run_goals"] = student_info.get('goal_cooldown', 0) == 0
+    if not turn["run_goals"]:
+        student_info['goal_cooldown'] = student_info.get('goal_cooldown', 1) - 1
+    turn["run_mentor"] = student_info.get('mentor_cooldown', 0) <= 0
+    if not turn["run_mentor"]:
+        student_info['mentor_cooldown'] = student_info.get('mentor_cooldown', 1) - 1
+
+    turn["post_turn_id"] = uuid.uuid4().hex
+    queued = turn["run_goals"] or turn["run_mentor"]
+    turn["post_turn_slot"] = queued and POST_TURN_SLOTS.acquire(blocking=False)
+    status = "pending" if queued else "done"
+    if queued and not turn["post_turn_slot"]:
+        print("Post-turn queue full; skipping goals and mentor matching for", turn["student_id"])
+        turn["run_goals"] = turn["run_mentor"] = False
+        status = "skipped"
+    return {
+        "conversation_summary": turn["conversation_summary"],
+        "workflow_state": turn["workflow_state"],
+        "goal_cooldown": student_info.get('goal_cooldown', 0),
+        "mentor_cooldown": student_info.get('mentor_cooldown', 0),
+        "post_turn": {"turn_id": turn["post_turn_id"], "status": status, "goals": [], "mentor": None}
+    }
+
+def release_post_turn_slot(turn):
+    if turn.pop("post_turn_slot", False):
+        POST_TURN_SLOTS.release()
+
+def queue_post_turn(turn):
+    """
+    Submits run_post_turn for a closed and saved turn; None when goals and
+    mentors are both on cooldown or the queue was full.
+    """
+    if not turn.get("post_turn_slot"):
+        return None
+    try:
+        future = POST_TURN_EXECUTOR.submit(
+            run_post_turn, turn["student_id"], turn["post_turn_id"], turn["student_info"], turn["user_message"],
+            turn["assistant_message"], turn["run_goals"], turn["run_mentor"]
+        )
+    except Exception:
+        release_post_turn_slot(turn)
+        raise
+    turn["post_turn_slot"] = False
+    future.add_done_callback(lambda _: POST_TURN_SLOTS.release())
+    return future
+
+def finish_chat_turn(turn, assistant_message):
+    """
+    Saves the turn with the assistant reply in the turn's single write
+    (topics, conversation, summary, workflow state, cooldowns and the
+    post_turn record together), then queues goal extraction and
+    mentor matching on the post-turn pool so the response does not wait for
+    them. Returns the future of run_post_turn, or None when both are on
+    cooldown; turn["post_turn_id"] identifies the record
+    GET /api/chat/post_turn/<student_id> reports.
+    """
+    if turn["stages"] is not None:
+        turn["stages"].wait()
+        print("Chat turn stages:", turn["stages"].summary())
+    session = turn["session"]
+    session.update(close_chat_turn(turn, assistant_message))
+    try:
+        session.commit()
+    except Exception:
+        release_post_turn_slot(turn)
+        raise
+    return queue_post_turn(turn)
+
+def run_post_turn(student_id, turn_id, student_info, user_message, assistant_message, run_goals, run_mentor):
+    """
+    Background half of a chat turn: finds new goals and a mentor match, then
+    writes them, their chat messages and the cooldowns back to the student
+    with one read and one write. Returns the post_turn record.
+    """
+    record = {"turn_id": turn_id, "status": "done", "goals": [], "mentor": None}
+
+    def is_latest_turn(data):
+        # A newer turn has its own pending record; this one must not overwrite it.
+        return (data.get("post_turn") or {}).get("turn_id") == turn_id
+
+    def find_goals():
+        candidate_goals = set()
+        simple_goal = detect_goal_creation(assistant_message)
+        if simple_goal:
+            candidate_goals.add(simple_goal)
+        for goal in extract_goals_from_text(assistant_message):
+            if goal.strip():
+                candidate_goals.add(goal.strip())
+        return candidate_goals
+
+    def find_mentor():
+        if "mentor" in user_message.lower() or is_explicit_mentor_request(user_message):
+            best_mentor, best_score = recommend_mentor(user_message, student_info)
+            if best_mentor:
+                reason = explain_mentor_match(best_mentor, user_message, student_info) or generate_mentor_reason(best_mentor, user_message)
+                return {"mentor_id": best_mentor, "score": best_score, "reason": reason}
+        return None
+
+    try:
+        # The two halves share nothing until the write, so they run side by side.
+        graph = StageGraph(TURN_STAGE_EXECUTOR)
+        if run_goals:
+            graph.add("goals", find_goals)
+        if run_mentor:
+            graph.add("mentor", find_mentor)
+        results = graph.start().wait()
+        print("Post-turn stages:", graph.summary())
+        candidate_goals = results.get("goals", set())
+        record["mentor"] = results.get("mentor")
+
+        # Re-read so the messages land after anything saved since the reply.
+        session = StudentSession.load(db, student_id)
+        if not session.exists:
+            raise LookupError(f"Student {student_id} not found")
+        conversation = session.get("last_conversation", [])
+        record["goals"] = [goal for goal in candidate_goals if session.add_goal(goal)]
+        messages = [f"✅ I’ve officially added **'{goal}'** to your goals!" for goal in record["goals"]]
+        if record["goals"]:
+            session.set("goal_cooldown", 5)
+        if record["mentor"]:
+            mentor = record["mentor"]
+            messages.append(f"Mentor Recommendation: **{mentor['mentor_id']}** (Score: {mentor['score']:.2f})\n\n{mentor['reason']}")
+            session.set("mentor_cooldown", 3)
+        for content in messages:
+            conversation.append({'role': 'assistant', 'content': content})
+            session.append_message("assistant", content)
+        session.set_conversation(conversation, RECENT_MESSAGES_WINDOW)
+        session.set_if("post_turn", record, is_latest_turn)
+        session.commit()
+    except Exception as e:
+        print("Error in post-turn pipeline:", e)
+        record = {"turn_id": turn_id, "status": "error", "goals": [], "mentor": None}
+        try:
+            session = StudentSession.load(db, student_id)
+            if session.exists and is_latest_turn(session.data):
+                session.set_if("post_turn", record, is_latest_turn)
+                session.commit()
+        except Exception as write_error:
+            print("Error saving post-turn status:", write_error)
+    return record
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
@@ -888,124 +1230,151 @@ def chat():
         if not user_message:
             return jsonify({"error": "message is required"}), 400
 
-        student_info = get_student_data(student_id)
-        if not student_info:
-            student_info = {
-                'name': '',
-                'grade': '',
-                'future_study': '',
-                'deep_interest': '',
-                'current_extracurriculars': '',
-                'favorite_courses': '',
-                'competitions': [],
-                'notes': [],
-                'goals': [],
-                'conversation_summary': "",
-                'last_conversation': [],
-                'topics': [],
-                'workflow_state': {
-                    "deca_stage": "none",
-                    "mun_stage": "none",
-                    "podcast_stage": "none",
-                    "science_olympiad_stage": "none",
-                    "volunteering_stage": "none",
-                    "research_state": "none"
-                }
-            }
-            save_student_data(student_id, student_info)
+        turn = begin_chat_turn(student_id, user_message, reply=_chat_with_athena)
+        if turn["workflow_response"] is not None:
+            return jsonify({"conversation": turn["conversation"], "last_response": turn["workflow_response"], "mentor_id": None})
 
-        workflow_state = student_info.get("workflow_state", {
-            "deca_stage": "none",
-            "mun_stage": "none",
-            "podcast_stage": "none",
-            "science_olympiad_stage": "none",
-            "volunteering_stage": "none",
-            "research_state": "none"
-        })
-
-        conversation = student_info.get("last_conversation", [])
-        conversation_summary = student_info.get("conversation_summary", "")
-
-        workflow_response = None
-        if detect_research_request(user_message):
-            workflow_response = process_research_workflow(student_info, workflow_state, user_message)
-        elif detect_deca_request(user_message):
-            workflow_response = process_deca_workflow(student_info, workflow_state, user_message)
-        elif detect_mun_request(user_message):
-            workflow_response = process_mun_workflow(student_info, workflow_state, user_message)
-        elif detect_podcast_request(user_message):
-            workflow_response = process_podcast_workflow(student_info, workflow_state, user_message)
-        elif detect_science_olympiad_request(user_message):
-            workflow_response = process_science_olympiad_workflow(student_info, workflow_state, user_message)
-        elif detect_volunteering_request(user_message):
-            workflow_response = process_volunteering_workflow(student_info, workflow_state, user_message)
-        else:
-            workflow_response = None
-
-        if workflow_response is not None:
-            conversation.append({'role': 'assistant', 'content': workflow_response})
-            update_student_data(student_id, {
-                "last_conversation": conversation,
-                "conversation_summary": conversation_summary,
-                "workflow_state": workflow_state
-            })
-            return jsonify({"conversation": conversation, "last_response": workflow_response, "mentor_id": None})
-
-        conversation.append({'role': 'user', 'content': user_message})
-        conversation, conversation_summary = optimize_conversation_history(conversation, conversation_summary)
-        short_topic = shorten_topic_sentence(user_message, "Athena")
-        updated_topics = update_student_topics(student_id, short_topic)
-        if updated_topics is not None:
-            student_info["topics"] = updated_topics
-
-        assistant_message = _chat_with_athena(student_info, conversation, conversation_summary)
-        conversation.append({'role': 'assistant', 'content': assistant_message})
-
-        if student_info.get('goal_cooldown', 0) == 0:
-            simple_goal = detect_goal_creation(assistant_message)
-            nlp_goals = extract_goals_from_text(assistant_message)
-            all_goals = set()
-            if simple_goal:
-                all_goals.add(simple_goal)
-            for goal in nlp_goals:
-                if goal.strip():
-                    all_goals.add(goal.strip())
-            existing_goals = set(student_info.get("goals", []))
-            new_goals = [goal for goal in all_goals if goal not in existing_goals]
-            for goal in new_goals:
-                if add_goal(student_id, goal):
-                    conversation.append({'role': 'assistant', 'content': f"✅ I’ve officially added **'{goal}'** to your goals!"})
-            if new_goals:
-                student_info['goal_cooldown'] = 5
-        else:
-            student_info['goal_cooldown'] = student_info.get('goal_cooldown', 1) - 1
-
-        if student_info.get('mentor_cooldown', 0) > 0:
-            student_info['mentor_cooldown'] = student_info.get('mentor_cooldown', 1) - 1
-        else:
-            if is_explicit_mentor_request(user_message) or "mentor" in user_message.lower():
-                best_mentor, best_score = recommend_mentor(user_message, student_info)
-                if best_mentor:
-                    conversation.append({'role': 'assistant', 'content': f"Mentor Recommendation: **{best_mentor}** (Score: {best_score:.2f})\n\n{generate_mentor_reason(best_mentor, user_message)}"})
-                    student_info['mentor_cooldown'] = 3
-
-        update_student_data(student_id, {
-            "last_conversation": conversation,
-            "conversation_summary": conversation_summary,
-            "workflow_state": workflow_state,
-            "goal_cooldown": student_info.get('goal_cooldown', 0),
-            "mentor_cooldown": student_info.get('mentor_cooldown', 0)
-        })
-        return jsonify({"conversation": conversation, "last_response": conversation[-1]['content'], "mentor_id": None})
+        assistant_message = turn["stages"].result("reply")
+        finish_chat_turn(turn, assistant_message)
+        return jsonify({"conversation": turn["conversation"], "last_response": assistant_message, "mentor_id": None,
+                        "post_turn_id": turn["post_turn_id"]})
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Same turn as /api/chat, sent as Server-Sent Events: "token" events with
+    each {"delta"} of the reply as the model produces it, then "goals" and
+    "mentor" events from post-processing, then "done" with the saved
+    conversation. Failures arrive as an "error" event.
+    """
+    data = request.get_json() or {}
+    student_id = data.get('student_id', '').strip().lower()
+    user_message = data.get('message', '').strip()
+    if not student_id:
+        return jsonify({"error": "student_id is required"}), 400
+    if not user_message:
+        return jsonify({"error": "message is required"}), 400
+
+    def generate():
+        try:
+            turn = begin_chat_turn(student_id, user_message)
+            if turn["workflow_response"] is not None:
+                yield sse_event("token", {"delta": turn["workflow_response"]})
+                yield sse_event("done", {"conversation": turn["conversation"], "last_response": turn["workflow_response"], "mentor_id": None})
+                return
+
+            turn["stages"].result("history")
+            parts = []
+            for delta in _stream_athena(turn["student_info"], turn["conversation"], turn["conversation_summary"]):
+                parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+            assistant_message = "".join(parts).strip()
+            post_turn = finish_chat_turn(turn, assistant_message)
+            if post_turn is not None:
+                # The reply is saved already; the stream just stays open for the trailing events.
+                try:
+                    result = post_turn.result(timeout=POST_TURN_STREAM_TIMEOUT)
+                except FutureTimeoutError:
+                    # Still running: the client polls /api/chat/post_turn with post_turn_id instead.
+                    result = {"goals": [], "mentor": None}
+                if result["goals"]:
+                    yield sse_event("goals", {"goals": result["goals"]})
+                if result["mentor"]:
+                    yield sse_event("mentor", result["mentor"])
+            yield sse_event("done", {"conversation": turn["conversation"], "last_response": assistant_message, "mentor_id": None,
+                                     "post_turn_id": turn["post_turn_id"]})
+        except Exception as e:
+            yield sse_event("error", {"error": f"Internal server error: {str(e)}"})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/api/chat/post_turn/<student_id>', methods=['GET'])
+def get_post_turn_endpoint(student_id):
+    """Status of the latest turn's goal extraction and mentor matching: pending, done, skipped or error."""
+    student_id = student_id.strip().lower()
+    student_info = get_student_fields(student_id, POST_TURN_FIELDS)
+    if student_info is None:
+        return jsonify({"error": "Student not found"}), 404
+    post_turn = student_info.get("post_turn")
+    if not post_turn:
+        return jsonify({"error": "No post-turn results yet"}), 404
+    return jsonify(post_turn)
+
+def clear_message_history(student_ref, batch_size=400):
+    """Deletes the student's messages subcollection, batch_size documents per batched write."""
+    messages = student_ref.collection(MESSAGES_COLLECTION)
+    while True:
+        docs = list(messages.limit(batch_size).stream())
+        if not docs:
+            return
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+
+def parse_history_args(args):
+    """(limit, before) from ?limit=&before= query args; raises ValueError on bad values."""
+    limit = min(int(args.get("limit", HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+    before = args.get("before")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return limit, int(before) if before is not None else None
+
+def history_query(student_ref, limit, before=None):
+    """Newest-first query for one page of messages older than seq `before`."""
+    query = student_ref.collection(MESSAGES_COLLECTION)
+    if before is not None:
+        query = query.where("seq", "<", before)
+    return query.order_by("seq", direction=firestore.Query.DESCENDING).limit(limit)
+
+def history_page(docs, limit):
+    """The page oldest-first, with the cursor for the next (older) page or None at the start."""
+    messages = [doc.to_dict() for doc in reversed(docs)]
+    for message in messages:
+        if isinstance(message.get("created_at"), datetime):
+            message["created_at"] = message["created_at"].isoformat()
+    next_before = messages[0]["seq"] if len(messages) == limit and messages[0]["seq"] > 1 else None
+    return {"messages": messages, "next_before": next_before}
+
+@app.route('/api/chat/history/<student_id>', methods=['GET'])
+def get_history_endpoint(student_id):
+    """
+    Pages through the full chat transcript, newest page first:
+    ?limit=50 for the latest messages, then ?before=<next_before> for older ones.
+    404 for an unknown student; the student document is only read when the page is empty.
+    """
+    try:
+        limit, before = parse_history_args(request.args)
+    except ValueError:
+        return jsonify({"error": "limit and before must be integers"}), 400
+    student_id = student_id.strip().lower()
+    docs = list(history_query(db.collection(STUDENTS_COLLECTION).document(student_id), limit, before).stream())
+    if not docs and get_student_fields(student_id, HISTORY_FIELDS) is None:
+        return jsonify({"error": "Student not found"}), 404
+    return jsonify(history_page(docs, limit))
+
 @app.route('/api/student_bio/<student_id>', methods=['GET'])
 def generate_student_bio(student_id):
     student_id = student_id.strip().lower()
-    student_info = get_student_data(student_id)
-    if not student_info:
+    student_info = get_cached_student_data(student_id, PROFILE_FIELDS)
+    if student_info is None:
         return jsonify({"error": "Student not found"}), 404
+    try:
+        response = chat_completion(**student_bio_request(student_info))
+        student_bio = response.choices[0].message.content.strip()
+        return jsonify({"bio": student_bio})
+    except Exception as e:
+        print(f"Error generating student bio: {e}")
+        return jsonify({"error": "Failed to generate student bio"}), 500
+
+def student_bio_request(student_info):
+    """chat_completion arguments for /api/student_bio, shared with asgi_app.py."""
     structured_info = {
         "name": student_info.get("name", "Unknown"),
         "grade": student_info.get("grade", "Not specified"),
@@ -1028,27 +1397,21 @@ def generate_student_bio(student_id):
         f"Goals: {', '.join(structured_info['goals']) if structured_info['goals'] else 'None'}\n\n"
         "Ensure the summary is natural, engaging, and informative."
     )
-    try:
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an AI assistant that creates concise and engaging student bios."},
-                {"role": "user", "content": bio_prompt}
-            ],
-            max_tokens=200,
-            temperature=0.7,
-        )
-        student_bio = response.choices[0].message.content.strip()
-        return jsonify({"bio": student_bio})
-    except Exception as e:
-        print(f"Error generating student bio: {e}")
-        return jsonify({"error": "Failed to generate student bio"}), 500
+    return {
+        "model": "gpt-4",
+        "messages": [
+            {"role": "system", "content": "You are an AI assistant that creates concise and engaging student bios."},
+            {"role": "user", "content": bio_prompt}
+        ],
+        "max_tokens": 200,
+        "temperature": 0.7,
+    }
 
 @app.route('/api/topics/<student_id>', methods=['GET'])
 def get_topics_endpoint(student_id):
     student_id = student_id.strip().lower()
-    student_info = get_student_data(student_id)
-    if not student_info:
+    student_info = get_cached_student_data(student_id, TOPICS_FIELDS)
+    if student_info is None:
         return jsonify({"error": "Student not found"}), 404
     topics = student_info.get("topics", [])
     return jsonify({"topics": topics})
@@ -1075,6 +1438,8 @@ def update_student_schema():
     This endpoint uses GPT to contextualize and summarize the onboarding answers into the student schema fields:
       - intended_major, creativity, service, skill_talent, extracurriculars, leadership.
     Leadership is left unchanged if not provided.
+    Like the rest of the conversation state, the message history
+    (the messages subcollection and message_count) is cleared.
     """
     try:
         data = request.get_json()
@@ -1104,6 +1469,7 @@ def update_student_schema():
             "goals": [],
             "conversation_summary": "",
             "last_conversation": [],
+            "message_count": 0,
             "topics": [],
             "workflow_state": {
                 "deca_stage": "none",
@@ -1114,6 +1480,7 @@ def update_student_schema():
                 "research_state": "none"
             }
         }
+        clear_message_history(db.collection(STUDENTS_COLLECTION).document(student_id))
         update_student_data(student_id, new_schema)
         return jsonify({"message": "Student schema updated successfully", "student_id": student_id})
     except Exception as e:
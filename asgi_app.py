@@ -0,0 +1,298 @@
+"""
+Async deployment mode. The chat routes and the read-mostly student
+endpoints (goals, topics, starters, bio) run natively on asyncio with the
+shared AsyncOpenAI client (openai_client.py) and Firestore's AsyncClient,
+so one process holds many concurrent conversations instead of one per
+worker thread. The remaining write routes (student, update_student_schema)
+are rare and stay on the Flask app in app.py; both modes share the turn
+logic there (new_chat_turn, route_chat_turn, close_chat_turn, ...).
+
+    uvicorn asgi_app:asgi --host 0.0.0.0 --port 5000
+
+Workflow routing and the post-turn pipeline still run their sync helpers,
+on a thread and on app.POST_TURN_EXECUTOR respectively.
+"""
+import asyncio
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from firebase_admin import firestore_async
+from quart import Quart, Response, jsonify, request
+from quart_cors import cors
+
+import app as sync_app
+from app import (
+    new_student_record,
+    new_chat_turn,
+    route_chat_turn,
+    close_chat_turn,
+    queue_post_turn,
+    release_post_turn_slot,
+    shorten_topic_sentence,
+    sse_event,
+    parse_history_args,
+    history_query,
+    history_page,
+    student_bio_request,
+    GOALS_FIELDS,
+    TOPICS_FIELDS,
+    PROFILE_FIELDS,
+    STARTERS_FIELDS,
+    POST_TURN_FIELDS,
+    HISTORY_FIELDS,
+    POST_TURN_STREAM_TIMEOUT,
+)
+from conversation_utils import (
+    generate_messages,
+    generate_conversation_starters_async,
+    optimize_conversation_history_async,
+)
+from intent_router import detect_workflow
+from mentor_utils import prefetch_mentor_embeddings
+from openai_client import achat_completion
+from student_cache import STUDENT_CACHE
+from student_session import STUDENTS_COLLECTION, StudentSession
+
+# Requests under these prefixes are served here; the rest go to the Flask app.
+ASYNC_PATH_PREFIXES = ("/api/chat", "/api/goals/", "/api/topics/", "/api/starters/", "/api/student_bio/")
+
+adb = firestore_async.client()
+
+quart_app = cors(Quart(__name__), allow_origin=sync_app.CORS_ORIGINS, allow_credentials=True,
+                 allow_methods=["GET", "POST", "OPTIONS"])
+flask_asgi = WsgiToAsgi(sync_app.app)
+
+
+async def asgi(scope, receive, send):
+    if scope["type"] != "http" or scope["path"].startswith(ASYNC_PATH_PREFIXES):
+        await quart_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
+
+
+# -------------------------------
+# ASYNC FIRESTORE HELPERS
+# -------------------------------
+async def get_student_fields_async(student_id, fields):
+    student = await adb.collection("students").document(student_id).get(field_paths=list(fields))
+    return (student.to_dict() or {}) if student.exists else None
+
+async def get_cached_student_data_async(student_id, fields):
+    return await STUDENT_CACHE.read_through_async(student_id, lambda sid: get_student_fields_async(sid, fields), fields)
+
+
+# -------------------------------
+# ASYNC CHAT TURN
+# -------------------------------
+async def _chat_with_athena_async(student_info, conversation, conversation_summary):
+    try:
+        response = await achat_completion(
+            model="gpt-4",
+            messages=generate_messages(student_info, conversation, conversation_summary),
+            max_tokens=300,
+            temperature=0.8
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        return f"Error in AI response: {str(e)}"
+
+async def _stream_athena_async(student_info, conversation, conversation_summary):
+    try:
+        stream = await achat_completion(
+            model="gpt-4",
+            messages=generate_messages(student_info, conversation, conversation_summary),
+            max_tokens=300,
+            temperature=0.8,
+            stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except Exception as e:
+        yield f"Error in AI response: {str(e)}"
+
+async def _timed(timings, name, awaitable):
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = round(time.perf_counter() - started, 4)
+
+async def begin_chat_turn_async(student_id, user_message):
+    """
+    Async counterpart of app.begin_chat_turn, with the same single read and
+    single write. When no workflow answers, the mentor prefetch is left
+    running in turn["side_tasks"] while the reply is generated; only the
+    trimmed history is awaited.
+    """
+    session = await StudentSession.load_async(adb, student_id, default=new_student_record)
+    student_info = session.data
+    turn = new_chat_turn(student_id, user_message, session)
+    turn["timings"] = {}
+    # Routing only calls out (classifier, workflow reply) when a workflow matches.
+    if detect_workflow(user_message):
+        workflow_fields = await asyncio.to_thread(route_chat_turn, turn)
+    else:
+        workflow_fields = route_chat_turn(turn)
+    if workflow_fields is not None:
+        session.update(workflow_fields)
+        await session.commit_async()
+        return turn
+
+    session.add_topic(shorten_topic_sentence(user_message, "Athena"))
+    timings = turn["timings"]
+    turn["side_tasks"] = []
+    if student_info.get('mentor_cooldown', 0) <= 0:
+        turn["side_tasks"].append(asyncio.ensure_future(_timed(
+            timings, "mentor_prefetch", asyncio.to_thread(prefetch_mentor_embeddings, user_message))))
+    turn["conversation"], turn["conversation_summary"] = await _timed(
+        timings, "history", optimize_conversation_history_async(turn["conversation"], turn["conversation_summary"]))
+    return turn
+
+async def finish_chat_turn_async(turn, assistant_message):
+    await asyncio.gather(*turn["side_tasks"])
+    print("Chat turn stages (async):", " ".join(f"{name}={seconds:.3f}s" for name, seconds in turn["timings"].items()))
+    session = turn["session"]
+    session.update(close_chat_turn(turn, assistant_message))
+    try:
+        await session.commit_async()
+    except Exception:
+        release_post_turn_slot(turn)
+        raise
+    return queue_post_turn(turn)
+
+def _read_chat_request(data):
+    data = data or {}
+    return data.get('student_id', '').strip().lower(), data.get('message', '').strip()
+
+
+# -------------------------------
+# ASYNC API ENDPOINTS
+# -------------------------------
+@quart_app.route('/api/chat', methods=['POST'])
+async def chat():
+    try:
+        student_id, user_message = _read_chat_request(await request.get_json())
+        if not student_id:
+            return jsonify({"error": "student_id is required"}), 400
+        if not user_message:
+            return jsonify({"error": "message is required"}), 400
+
+        turn = await begin_chat_turn_async(student_id, user_message)
+        if turn["workflow_response"] is not None:
+            return jsonify({"conversation": turn["conversation"], "last_response": turn["workflow_response"], "mentor_id": None})
+
+        assistant_message = await _timed(turn["timings"], "reply", _chat_with_athena_async(
+            turn["student_info"], turn["conversation"], turn["conversation_summary"]))
+        await finish_chat_turn_async(turn, assistant_message)
+        return jsonify({"conversation": turn["conversation"], "last_response": assistant_message, "mentor_id": None,
+                        "post_turn_id": turn["post_turn_id"]})
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+@quart_app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Same events as the Flask /api/chat/stream."""
+    student_id, user_message = _read_chat_request(await request.get_json())
+    if not student_id:
+        return jsonify({"error": "student_id is required"}), 400
+    if not user_message:
+        return jsonify({"error": "message is required"}), 400
+
+    async def generate():
+        try:
+            turn = await begin_chat_turn_async(student_id, user_message)
+            if turn["workflow_response"] is not None:
+                yield sse_event("token", {"delta": turn["workflow_response"]})
+                yield sse_event("done", {"conversation": turn["conversation"], "last_response": turn["workflow_response"], "mentor_id": None})
+                return
+
+            parts = []
+            async for delta in _stream_athena_async(turn["student_info"], turn["conversation"], turn["conversation_summary"]):
+                parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+            assistant_message = "".join(parts).strip()
+            post_turn = await finish_chat_turn_async(turn, assistant_message)
+            if post_turn is not None:
+                try:
+                    # shield: timing out must not cancel the post-turn work itself.
+                    result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(post_turn)), POST_TURN_STREAM_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # Still running: the client polls /api/chat/post_turn with post_turn_id instead.
+                    result = {"goals": [], "mentor": None}
+                if result["goals"]:
+                    yield sse_event("goals", {"goals": result["goals"]})
+                if result["mentor"]:
+                    yield sse_event("mentor", result["mentor"])
+            yield sse_event("done", {"conversation": turn["conversation"], "last_response": assistant_message, "mentor_id": None,
+                                     "post_turn_id": turn["post_turn_id"]})
+        except Exception as e:
+            yield sse_event("error", {"error": f"Internal server error: {str(e)}"})
+
+    response = Response(generate(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.timeout = None
+    return response
+
+@quart_app.route('/api/chat/post_turn/<student_id>', methods=['GET'])
+async def get_post_turn_endpoint(student_id):
+    student_info = await get_student_fields_async(student_id.strip().lower(), POST_TURN_FIELDS)
+    if student_info is None:
+        return jsonify({"error": "Student not found"}), 404
+    post_turn = student_info.get("post_turn")
+    if not post_turn:
+        return jsonify({"error": "No post-turn results yet"}), 404
+    return jsonify(post_turn)
+
+@quart_app.route('/api/chat/history/<student_id>', methods=['GET'])
+async def get_history_endpoint(student_id):
+    """Same paging as the Flask /api/chat/history."""
+    try:
+        limit, before = parse_history_args(request.args)
+    except ValueError:
+        return jsonify({"error": "limit and before must be integers"}), 400
+    student_id = student_id.strip().lower()
+    docs = [doc async for doc in history_query(adb.collection(STUDENTS_COLLECTION).document(student_id), limit, before).stream()]
+    if not docs and await get_student_fields_async(student_id, HISTORY_FIELDS) is None:
+        return jsonify({"error": "Student not found"}), 404
+    return jsonify(history_page(docs, limit))
+
+@quart_app.route('/api/goals/<student_id>', methods=['GET'])
+async def get_goals_endpoint(student_id):
+    student_info = await get_cached_student_data_async(student_id.strip().lower(), GOALS_FIELDS)
+    if student_info is None:
+        return jsonify({"error": "Student not found"}), 404
+    return jsonify({"goals": student_info.get("goals", [])})
+
+@quart_app.route('/api/topics/<student_id>', methods=['GET'])
+async def get_topics_endpoint(student_id):
+    student_info = await get_cached_student_data_async(student_id.strip().lower(), TOPICS_FIELDS)
+    if student_info is None:
+        return jsonify({"error": "Student not found"}), 404
+    return jsonify({"topics": student_info.get("topics", [])})
+
+@quart_app.route('/api/starters/<student_id>', methods=['GET'])
+async def get_conversation_starters_endpoint(student_id):
+    try:
+        student_info = await get_cached_student_data_async(student_id.strip().lower(), STARTERS_FIELDS)
+        if student_info is None:
+            return jsonify({"error": "Student not found"}), 404
+        starters = await generate_conversation_starters_async(student_info, student_info.get("last_conversation", []))
+        return jsonify({"starters": starters})
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+@quart_app.route('/api/student_bio/<student_id>', methods=['GET'])
+async def generate_student_bio(student_id):
+    student_info = await get_cached_student_data_async(student_id.strip().lower(), PROFILE_FIELDS)
+    if student_info is None:
+        return jsonify({"error": "Student not found"}), 404
+    try:
+        response = await achat_completion(**student_bio_request(student_info))
+        return jsonify({"bio": response.choices[0].message.content.strip()})
+    except Exception as e:
+        print(f"Error generating student bio: {e}")
+        return jsonify({"error": "Failed to generate student bio"}), 500
@@ -0,0 +1,119 @@
+"""
+Builds the binary mentor embedding store from data/mentors.json.
+
+Each mentor is chunked into activities and essay paragraphs, the chunks are
+embedded in batches, and the mentor's row is the normalized mean of its chunk
+vectors. A manifest records the hash of every mentor record, so later runs
+only re-embed mentors that are new or changed.
+
+Rows are written grouped by IVF list, with the trained centroids and the
+rows' int8 codes next to the store, so the serving workers memory-map the IVF
+index and the quantized copy instead of building them at startup.
+
+Usage:
+    python build_mentor_embeddings.py [--full] [--dry-run]
+"""
+import argparse
+
+import numpy as np
+
+from db_utils import (
+    load_mentors_data,
+    load_embedding_store,
+    load_mentor_embeddings_manifest,
+    save_mentor_embeddings_manifest,
+    save_mentor_embedding_matrix,
+    save_mentor_ivf_layout,
+    save_mentor_quantized_codes,
+    MENTOR_EMBEDDINGS_NPY_PATH,
+    MENTOR_EMBEDDINGS_IDS_PATH
+)
+from embedding_utils import EMBEDDING_MODEL, embed_texts
+from mentor_corpus import mentor_id, mentor_record_hash, chunk_mentor
+from mentor_index import ivf_layout, quantize_int8
+
+
+def plan_build(mentors, manifest, existing_ids, full=False):
+    """Splits mentors into (reused, changed) lists of ids."""
+    previous = manifest.get("mentors", {}) if manifest.get("model") == EMBEDDING_MODEL else {}
+    reusable = set(existing_ids)
+    reused, changed = [], []
+    for mentor in mentors:
+        m_id = mentor_id(mentor)
+        if not full and m_id in reusable and previous.get(m_id) == mentor_record_hash(mentor):
+            reused.append(m_id)
+        else:
+            changed.append(m_id)
+    return reused, changed
+
+
+def embed_mentors(mentors):
+    """Embeds all chunks of the given mentors in one batched pass; returns {mentor_id: vector}."""
+    chunked = [(mentor_id(mentor), chunk_mentor(mentor)) for mentor in mentors]
+    all_chunks = [chunk for _, chunks in chunked for chunk in chunks]
+    vectors = embed_texts(all_chunks) if all_chunks else []
+
+    result = {}
+    offset = 0
+    for m_id, chunks in chunked:
+        if not chunks:
+            print(f"Skipping mentor with no text: {m_id}")
+            continue
+        block = np.array(vectors[offset:offset + len(chunks)], dtype=np.float32)
+        offset += len(chunks)
+        block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+        result[m_id] = block.mean(axis=0)
+    return result
+
+
+def build_mentor_embeddings(full=False, dry_run=False):
+    mentors = load_mentors_data()
+    store = load_embedding_store(MENTOR_EMBEDDINGS_NPY_PATH, MENTOR_EMBEDDINGS_IDS_PATH)
+    existing_ids, existing_matrix = (store[0], store[1]) if store is not None else ([], None)
+    manifest = load_mentor_embeddings_manifest()
+
+    reused, changed = plan_build(mentors, manifest, existing_ids, full=full)
+    removed = set(existing_ids) - {mentor_id(mentor) for mentor in mentors}
+    print(f"{len(reused)} unchanged, {len(changed)} to embed, {len(removed)} removed")
+    if dry_run:
+        for m_id in changed:
+            print(f"  embed: {m_id}")
+        return
+
+    changed_set = set(changed)
+    new_vectors = embed_mentors([mentor for mentor in mentors if mentor_id(mentor) in changed_set])
+    row_of = {m_id: row for row, m_id in enumerate(existing_ids)}
+
+    ids, rows, hashes = [], [], {}
+    for mentor in mentors:
+        m_id = mentor_id(mentor)
+        if m_id in new_vectors:
+            rows.append(new_vectors[m_id])
+        elif m_id in row_of and m_id not in changed_set:
+            rows.append(np.array(existing_matrix[row_of[m_id]], dtype=np.float32))
+        else:
+            continue
+        ids.append(m_id)
+        hashes[m_id] = mentor_record_hash(mentor)
+
+    if not rows:
+        save_mentor_embedding_matrix(ids, np.empty((0, 0), dtype=np.float32))
+    else:
+        matrix = np.vstack(rows)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        order, centroids, list_offsets = ivf_layout(matrix)
+        ids = [ids[row] for row in order]
+        matrix = matrix[order]
+        save_mentor_embedding_matrix(ids, matrix)
+        save_mentor_ivf_layout(ids, centroids, list_offsets)
+        save_mentor_quantized_codes(ids, *quantize_int8(matrix))
+    save_mentor_embeddings_manifest({"model": EMBEDDING_MODEL, "mentors": hashes})
+    print(f"Wrote {len(ids)} mentor embeddings to {MENTOR_EMBEDDINGS_NPY_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the mentor embedding store from data/mentors.json.")
+    parser.add_argument("--full", action="store_true", help="Re-embed every mentor, ignoring the manifest.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which mentors would be embedded.")
+    args = parser.parse_args()
+    build_mentor_embeddings(full=args.full, dry_run=args.dry_run)
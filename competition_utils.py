@@ -1,40 +1,15 @@
-import openai
+from openai_client import chat_completion
+from intent_router import matches_intent
 
 FINE_TUNED_SCIENCE_MODEL = "ft:gpt-4o-2024-08-06:personal::AROi5FqX"
 FINE_TUNED_DECA_MODEL = "gpt-4o"
 
 def detect_science_project_request(user_message):
-    prompt = (
-        "You are an AI assistant that determines if a student's message is a request "
-        "for help with a science project idea. "
-        "The response should be exactly 'Yes' or 'No'.\n\n"
-        f"Message: \"{user_message}\"\n\nIs this a request for help with a science project idea?"
-    )
-
-    response = openai.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "system", "content": prompt}],
-        max_tokens=1,
-        temperature=0
-    )
-    answer = response.choices[0].message.content.strip().lower()
-    return answer == 'yes'
+    # Routed locally by intent_router instead of a GPT-4 yes/no call.
+    return matches_intent("science_project", user_message)
 
 def detect_deca_request(user_message):
-    prompt = (
-        "You are an AI assistant that determines if a student's message is a request "
-        "for DECA competition advice. The response should be exactly 'Yes' or 'No'.\n\n"
-        f"Message: \"{user_message}\"\n\nIs this a request for DECA competition advice?"
-    )
-
-    response = openai.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "system", "content": prompt}],
-        max_tokens=1,
-        temperature=0
-    )
-    answer = response.choices[0].message.content.strip().lower()
-    return answer == 'yes'
+    return matches_intent("deca", user_message)
 
 def generate_project_guidance(student_info, conversation):
     system_prompt = (
@@ -62,7 +37,7 @@ def generate_project_guidance(student_info, conversation):
     ]
     messages.extend(conversation)
 
-    response = openai.chat.completions.create(
+    response = chat_completion(
         model=FINE_TUNED_SCIENCE_MODEL,
         messages=messages,
         max_tokens=600,
@@ -95,7 +70,7 @@ def generate_deca_guidance(student_info, conversation):
     ]
     messages.extend(conversation)
 
-    response = openai.chat.completions.create(
+    response = chat_completion(
         model=FINE_TUNED_DECA_MODEL,
         messages=messages,
         max_tokens=600,
@@ -1,4 +1,5 @@
-import openai
+from openai_client import achat_completion, chat_completion
+from response_cache import cached_chat_completion
 import bleach
 import markdown2
 import json
@@ -35,7 +36,7 @@ def summarize_conversation(conversation):
         "focusing on key points and the student's interests or questions."
     )
 
-    response = openai.chat.completions.create(
+    response = chat_completion(
         model=SUMMARIZER_MODEL,
         messages=[
             {"role": "system", "content": system_msg},
@@ -48,21 +49,24 @@ def summarize_conversation(conversation):
     return summary
 
 
+def _history_summary_messages(conversation):
+    # Concatenate the conversation messages into one text
+    convo_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation])
+    prompt = (
+        "Summarize the following conversation concisely, capturing key topics, decisions, and important details:\n"
+        + convo_text
+    )
+    return [
+        {"role": "system", "content": "You are a conversation summarizer."},
+        {"role": "user", "content": prompt}
+    ]
+
 def optimize_conversation_history(conversation, current_summary, threshold=5):
     if len(conversation) >= threshold:
-        # Concatenate the conversation messages into one text
-        convo_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation])
-        prompt = (
-            "Summarize the following conversation concisely, capturing key topics, decisions, and important details:\n"
-            + convo_text
-        )
         try:
-            response = openai.chat.completions.create(
+            response = chat_completion(
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a conversation summarizer."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=_history_summary_messages(conversation),
                 max_tokens=150,
                 temperature=0.5
             )
@@ -76,6 +80,25 @@ def optimize_conversation_history(conversation, current_summary, threshold=5):
             return conversation, current_summary
     return conversation, current_summary
 
+async def optimize_conversation_history_async(conversation, current_summary, threshold=5):
+    """optimize_conversation_history on the shared AsyncOpenAI client."""
+    if len(conversation) >= threshold:
+        try:
+            response = await achat_completion(
+                model="gpt-4o",
+                messages=_history_summary_messages(conversation),
+                max_tokens=150,
+                temperature=0.5
+            )
+            new_summary = response.choices[0].message.content.strip()
+            print("New conversation summary generated:", new_summary)
+            conversation = [{"role": "system", "content": "Conversation summary: " + new_summary}]
+            return conversation, new_summary
+        except Exception as e:
+            print(f"Error generating conversation summary: {e}")
+            return conversation, current_summary
+    return conversation, current_summary
+
 def generate_messages(student_info, conversation, conversation_summary):
     system_prompt = (
         "You are Athena, a friendly and supportive college counselor. "
@@ -97,7 +120,7 @@ def generate_messages(student_info, conversation, conversation_summary):
     messages.extend(conversation)
     return messages
 
-def generate_conversation_starters(student_info, conversation):
+def _conversation_starters_messages(student_info, conversation):
     system_prompt = (
         "You are Athena, a friendly and supportive college counselor. Generate 3 PERSONALIZED (using student info) conversation starters "
         "the student might ask next to advance their college goals AND CONTINUE THE CONVERSATION!. Focus on the student's profile "
@@ -123,19 +146,12 @@ def generate_conversation_starters(student_info, conversation):
 
     assistant_prompt = profile_part + "\nRecent Conversation:\n" + recent_convo_text
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "assistant", "content": assistant_prompt}
     ]
 
-    response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        max_tokens=300,
-        temperature=0.7,
-        n=1
-    )
-    text = response.choices[0].message.content.strip()
+def _parse_conversation_starters(text):
     starters = []
     for line in text.split('\n'):
         line_stripped = line.strip().strip('"')
@@ -144,6 +160,27 @@ def generate_conversation_starters(student_info, conversation):
             starters.append(question)
     return starters[:3]
 
+def generate_conversation_starters(student_info, conversation):
+    response = chat_completion(
+        model="gpt-4o",
+        messages=_conversation_starters_messages(student_info, conversation),
+        max_tokens=300,
+        temperature=0.7,
+        n=1
+    )
+    return _parse_conversation_starters(response.choices[0].message.content.strip())
+
+async def generate_conversation_starters_async(student_info, conversation):
+    """generate_conversation_starters on the shared AsyncOpenAI client."""
+    response = await achat_completion(
+        model="gpt-4o",
+        messages=_conversation_starters_messages(student_info, conversation),
+        max_tokens=300,
+        temperature=0.7,
+        n=1
+    )
+    return _parse_conversation_starters(response.choices[0].message.content.strip())
+
 def render_markdown(content):
     html_content = markdown2.markdown(content)
     clean_html = bleach.clean(
@@ -154,6 +191,13 @@ def render_markdown(content):
     )
     return clean_html
 
+def parse_student_info_reply(content):
+    """The JSON inside parse_new_student_info's ```json fenced reply."""
+    raw_json = content.strip()
+    raw_json = raw_json[8:]
+    raw_json = raw_json[:len(raw_json) - 3]
+    return json.loads(raw_json)
+
 def parse_new_student_info(
     user_message: str,
     current_student_data: dict,
@@ -204,20 +248,19 @@ Follow the system prompt. Output valid JSON only.
 """
 
     try:
-        response = openai.chat.completions.create(
+        response = cached_chat_completion(
+            "parse_new_student_info",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             max_tokens=300,
-            temperature=0.0
+            temperature=0.0,
+            validate=lambda r: isinstance(parse_student_info_reply(r.choices[0].message.content), dict)
         )
 
-        raw_json = response.choices[0].message.content.strip()
-        raw_json = raw_json[8:]
-        raw_json = raw_json[:len(raw_json) - 3]
-        parsed_data = json.loads(raw_json)  # parse GPT's JSON
+        parsed_data = parse_student_info_reply(response.choices[0].message.content)  # parse GPT's JSON
 
         # Must at least have "updates" and "disclaimers" keys
         if not isinstance(parsed_data, dict):
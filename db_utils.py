@@ -1,8 +1,28 @@
+import hashlib
 import json
 import os
+import numpy as np
 
 STUDENTS_JSON_PATH = os.path.join("data", "students.json")
+MENTORS_JSON_PATH = os.path.join("data", "mentors.json")
 MENTOR_EMBEDDINGS_JSON_PATH = os.path.join("data", "mentor_embeddings.json")
+# Binary store: a row-normalized float32 .npy matrix plus a JSON sidecar with the row ids.
+MENTOR_EMBEDDINGS_NPY_PATH = os.path.join("data", "mentor_embeddings.npy")
+MENTOR_EMBEDDINGS_IDS_PATH = os.path.join("data", "mentor_embeddings_ids.json")
+# Record hashes of the mentors that produced each row of the binary store.
+MENTOR_EMBEDDINGS_MANIFEST_PATH = os.path.join("data", "mentor_embeddings_manifest.json")
+# IVF layout of the binary store, written by build_mentor_embeddings.py: the
+# store's rows are grouped by inverted list, the centroids are their own .npy
+# and the list offsets sit in a JSON sidecar with a digest of the row ids.
+MENTOR_EMBEDDINGS_CENTROIDS_PATH = os.path.join("data", "mentor_embeddings_centroids.npy")
+MENTOR_EMBEDDINGS_IVF_PATH = os.path.join("data", "mentor_embeddings_ivf.json")
+# int8 codes of the binary store (same row order) and their per-row scales,
+# written by build_mentor_embeddings.py and memory-mapped by every worker.
+MENTOR_EMBEDDINGS_CODES_PATH = os.path.join("data", "mentor_embeddings_int8.npy")
+MENTOR_EMBEDDINGS_SCALES_PATH = os.path.join("data", "mentor_embeddings_int8_scales.npy")
+MENTOR_EMBEDDINGS_CODES_IDS_PATH = os.path.join("data", "mentor_embeddings_int8.json")
+MENTOR_REQUEST_EXAMPLES_NPY_PATH = os.path.join("data", "mentor_request_examples.npy")
+MENTOR_REQUEST_EXAMPLES_IDS_PATH = os.path.join("data", "mentor_request_examples_ids.json")
 
 def load_students_data():
     try:
@@ -18,9 +38,167 @@ def save_students_data(data):
     with open(STUDENTS_JSON_PATH, "w") as f:
         json.dump(data, f, indent=2)
 
+def load_mentors_data():
+    try:
+        with open(MENTORS_JSON_PATH, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
 def load_mentor_embeddings():
     try:
         with open(MENTOR_EMBEDDINGS_JSON_PATH, "r") as f:
             return json.load(f)
     except FileNotFoundError:
         return {}
+
+def load_embedding_store(npy_path, ids_path):
+    """
+    Returns (ids, matrix, normalized) for a binary store, with the matrix
+    memory-mapped read-only so every worker shares the same page-cache copy.
+    Returns None if the store is missing or inconsistent.
+    """
+    try:
+        with open(ids_path, "r") as f:
+            sidecar = json.load(f)
+        matrix = np.load(npy_path, mmap_mode="r")
+        ids = sidecar.get("ids", [])
+        if matrix.ndim == 2 and matrix.dtype == np.float32 and matrix.shape[0] == len(ids):
+            return ids, matrix, bool(sidecar.get("normalized", False))
+        print(f"Embedding store {npy_path} is inconsistent.")
+    except (OSError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Error reading embedding store {npy_path}: {e}")
+    return None
+
+def save_embedding_store(npy_path, ids_path, ids, matrix):
+    """
+    Writes a binary store. Rows are L2-normalized before saving. Files are
+    written to a temp path and renamed so running workers keep a valid mapping.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = np.ascontiguousarray(matrix / norms)
+
+    tmp_npy_path = npy_path + ".tmp"
+    with open(tmp_npy_path, "wb") as f:
+        np.save(f, matrix)
+    tmp_ids_path = ids_path + ".tmp"
+    with open(tmp_ids_path, "w") as f:
+        json.dump({"ids": list(ids), "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0, "normalized": True}, f, indent=2)
+    os.replace(tmp_npy_path, npy_path)
+    os.replace(tmp_ids_path, ids_path)
+
+def load_mentor_embedding_matrix():
+    """
+    Returns (mentor_ids, matrix, normalized) from the binary store, falling back
+    to parsing the JSON file when the store is missing or inconsistent.
+    """
+    store = load_embedding_store(MENTOR_EMBEDDINGS_NPY_PATH, MENTOR_EMBEDDINGS_IDS_PATH)
+    if store is not None:
+        return store
+
+    embeddings = load_mentor_embeddings()
+    mentor_ids = list(embeddings.keys())
+    if not mentor_ids:
+        return [], np.empty((0, 0), dtype=np.float32), True
+    matrix = np.array([embeddings[mentor_id] for mentor_id in mentor_ids], dtype=np.float32)
+    return mentor_ids, matrix, False
+
+def save_mentor_embedding_matrix(mentor_ids, matrix):
+    save_embedding_store(MENTOR_EMBEDDINGS_NPY_PATH, MENTOR_EMBEDDINGS_IDS_PATH, mentor_ids, matrix)
+
+def _ids_digest(ids):
+    return hashlib.sha256(json.dumps(list(ids)).encode("utf-8")).hexdigest()
+
+def load_mentor_ivf_layout(mentor_ids):
+    """
+    Returns (centroids, list_offsets) for the store's current row order, with
+    the centroids memory-mapped, or None if there is no layout for these rows.
+    """
+    try:
+        with open(MENTOR_EMBEDDINGS_IVF_PATH, "r") as f:
+            sidecar = json.load(f)
+        if sidecar.get("ids_digest") != _ids_digest(mentor_ids):
+            print(f"IVF layout {MENTOR_EMBEDDINGS_IVF_PATH} does not match the mentor store.")
+            return None
+        centroids = np.load(MENTOR_EMBEDDINGS_CENTROIDS_PATH, mmap_mode="r")
+        return centroids, np.asarray(sidecar["list_offsets"], dtype=np.int64)
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Error reading IVF layout {MENTOR_EMBEDDINGS_IVF_PATH}: {e}")
+    return None
+
+def save_mentor_ivf_layout(mentor_ids, centroids, list_offsets):
+    tmp_npy_path = MENTOR_EMBEDDINGS_CENTROIDS_PATH + ".tmp"
+    with open(tmp_npy_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(centroids, dtype=np.float32))
+    tmp_path = MENTOR_EMBEDDINGS_IVF_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"ids_digest": _ids_digest(mentor_ids), "list_offsets": [int(o) for o in list_offsets]}, f)
+    os.replace(tmp_npy_path, MENTOR_EMBEDDINGS_CENTROIDS_PATH)
+    os.replace(tmp_path, MENTOR_EMBEDDINGS_IVF_PATH)
+
+def load_mentor_quantized_codes(mentor_ids):
+    """
+    Returns (codes, scales), both memory-mapped, for the store's current rows,
+    or None if the build has not saved codes for these rows.
+    """
+    try:
+        with open(MENTOR_EMBEDDINGS_CODES_IDS_PATH, "r") as f:
+            sidecar = json.load(f)
+        if sidecar.get("ids_digest") != _ids_digest(mentor_ids):
+            print(f"Quantized codes {MENTOR_EMBEDDINGS_CODES_PATH} do not match the mentor store.")
+            return None
+        codes = np.load(MENTOR_EMBEDDINGS_CODES_PATH, mmap_mode="r")
+        scales = np.load(MENTOR_EMBEDDINGS_SCALES_PATH, mmap_mode="r")
+        if codes.dtype == np.int8 and codes.ndim == 2 and len(codes) == len(mentor_ids) == len(scales):
+            return codes, scales
+        print(f"Quantized codes {MENTOR_EMBEDDINGS_CODES_PATH} are inconsistent.")
+    except (OSError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Error reading quantized codes {MENTOR_EMBEDDINGS_CODES_PATH}: {e}")
+    return None
+
+def save_mentor_quantized_codes(mentor_ids, codes, scales):
+    for path, array in ((MENTOR_EMBEDDINGS_CODES_PATH, codes), (MENTOR_EMBEDDINGS_SCALES_PATH, scales)):
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+    tmp_path = MENTOR_EMBEDDINGS_CODES_IDS_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"ids_digest": _ids_digest(mentor_ids)}, f)
+    os.replace(MENTOR_EMBEDDINGS_CODES_PATH + ".tmp", MENTOR_EMBEDDINGS_CODES_PATH)
+    os.replace(MENTOR_EMBEDDINGS_SCALES_PATH + ".tmp", MENTOR_EMBEDDINGS_SCALES_PATH)
+    os.replace(tmp_path, MENTOR_EMBEDDINGS_CODES_IDS_PATH)
+
+def load_mentor_embeddings_manifest():
+    try:
+        with open(MENTOR_EMBEDDINGS_MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_mentor_embeddings_manifest(manifest):
+    tmp_path = MENTOR_EMBEDDINGS_MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MENTOR_EMBEDDINGS_MANIFEST_PATH)
+
+def load_mentor_request_example_embeddings():
+    return load_embedding_store(MENTOR_REQUEST_EXAMPLES_NPY_PATH, MENTOR_REQUEST_EXAMPLES_IDS_PATH)
+
+def save_mentor_request_example_embeddings(examples, matrix):
+    save_embedding_store(MENTOR_REQUEST_EXAMPLES_NPY_PATH, MENTOR_REQUEST_EXAMPLES_IDS_PATH, examples, matrix)
+
+def convert_mentor_embeddings_json():
+    """Converts data/mentor_embeddings.json into the binary .npy store."""
+    embeddings = load_mentor_embeddings()
+    mentor_ids = list(embeddings.keys())
+    matrix = np.array([embeddings[mentor_id] for mentor_id in mentor_ids], dtype=np.float32)
+    save_mentor_embedding_matrix(mentor_ids, matrix)
+    return len(mentor_ids)
+
+if __name__ == "__main__":
+    count = convert_mentor_embeddings_json()
+    print(f"Wrote {count} mentor embeddings to {MENTOR_EMBEDDINGS_NPY_PATH}")
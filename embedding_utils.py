@@ -0,0 +1,269 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+from openai_client import create_embeddings
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_CACHE_MAX_ENTRIES = 4096
+# Set to None to keep the cache in memory only.
+EMBEDDING_CACHE_DB_PATH = os.path.join("data", "embedding_cache.sqlite3")
+# Upper bound on inputs per embeddings.create call.
+EMBEDDING_BATCH_MAX_INPUTS = 512
+# When enabled, cache misses from concurrent threads are coalesced into one
+# embeddings.create call if they arrive within the window.
+EMBEDDING_MICROBATCH_ENABLED = False
+EMBEDDING_MICROBATCH_WINDOW_MS = 5
+# Longest a caller waits on the micro-batcher before giving up on a result.
+EMBEDDING_RESULT_TIMEOUT = 60.0
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model, sha256(text)).
+    A bounded in-memory LRU sits in front of an optional SQLite tier that
+    survives restarts and is shared by every worker on the host. Each
+    process opens its own connection on first use, so workers forked after
+    import never share one, and SQLite is only touched outside the LRU lock.
+    """
+
+    def __init__(self, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, db_path=None):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._db_lock = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        """(connection, lock) for this process; the connection is None without a usable database."""
+        pid = os.getpid()
+        if self._db_pid != pid:
+            with self._lock:
+                if self._db_pid != pid:
+                    self._db = self._open_db(self.db_path) if self.db_path else None
+                    self._db_lock = threading.Lock()
+                    self._db_pid = pid
+        return self._db, self._db_lock
+
+    @staticmethod
+    def _open_db(db_path):
+        try:
+            db = sqlite3.connect(db_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, digest TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, digest))"
+            )
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            print(f"Error opening embedding cache database: {e}")
+            return None
+
+    @staticmethod
+    def make_key(model, text):
+        return model, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, model, text):
+        key = self.make_key(model, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+        vector = self._read_db(key)
+        with self._lock:
+            if vector is not None:
+                self._remember(key, vector)
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        return vector
+
+    def put(self, model, text, vector):
+        return self.put_many(model, [(text, vector)])[0]
+
+    def put_many(self, model, items):
+        """Caches (text, vector) pairs with one SQLite write; returns the stored read-only vectors."""
+        rows = []
+        for text, vector in items:
+            vector = np.array(vector, dtype=np.float32)
+            vector.setflags(write=False)
+            rows.append((self.make_key(model, text), vector))
+        with self._lock:
+            for key, vector in rows:
+                self._remember(key, vector)
+        self._write_db(rows)
+        return [vector for _, vector in rows]
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_db(self, key):
+        db, db_lock = self._connection()
+        if db is None:
+            return None
+        try:
+            with db_lock:
+                row = db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND digest = ?", key
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading embedding cache: {e}")
+            return None
+        if row is None:
+            return None
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        vector.setflags(write=False)
+        return vector
+
+    def _write_db(self, rows):
+        db, db_lock = self._connection()
+        if db is None or not rows:
+            return
+        try:
+            with db_lock:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, digest, vector) VALUES (?, ?, ?)",
+                    [(key[0], key[1], vector.tobytes()) for key, vector in rows]
+                )
+                db.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing embedding cache: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+
+EMBEDDING_CACHE = EmbeddingCache(db_path=EMBEDDING_CACHE_DB_PATH)
+
+
+def _create_embeddings(texts, model):
+    """One embeddings.create call per EMBEDDING_BATCH_MAX_INPUTS texts; results are cached."""
+    vectors = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_MAX_INPUTS):
+        chunk = texts[start:start + EMBEDDING_BATCH_MAX_INPUTS]
+        response = create_embeddings(model=model, input=chunk, hedge=True)
+        if len(response.data) != len(chunk):
+            raise ValueError(f"embeddings.create returned {len(response.data)} vectors for {len(chunk)} inputs")
+        items = [(chunk[item.index], item.embedding) for item in sorted(response.data, key=lambda d: d.index)]
+        vectors.extend(EMBEDDING_CACHE.put_many(model, items))
+    return vectors
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests from concurrent threads. The first request
+    opens a window of EMBEDDING_MICROBATCH_WINDOW_MS; everything submitted
+    before it closes goes out in the same embeddings.create call.
+    """
+
+    def __init__(self, model, window_ms=EMBEDDING_MICROBATCH_WINDOW_MS, max_batch=EMBEDDING_BATCH_MAX_INPUTS):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"embedding-batcher-{self.model}", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                texts = list(dict.fromkeys(text for text, _ in batch))
+                vectors = dict(zip(texts, _create_embeddings(texts, self.model)))
+                for text, future in batch:
+                    future.set_result(vectors[text])
+            except Exception as e:
+                # Every waiter gets an answer, and the worker lives on for the next batch.
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+def get_embedding_batcher(model=EMBEDDING_MODEL):
+    with _batchers_lock:
+        batcher = _batchers.get(model)
+        if batcher is None:
+            batcher = _batchers[model] = EmbeddingBatcher(model)
+        return batcher
+
+
+def embed_texts(texts, model=EMBEDDING_MODEL):
+    """
+    Returns embeddings for every text, in order. Cache hits are served locally
+    and all misses go out together in one embeddings.create call (or through
+    the micro-batcher when EMBEDDING_MICROBATCH_ENABLED is set).
+    """
+    results = [EMBEDDING_CACHE.get(model, text) for text in texts]
+    misses = list(dict.fromkeys(text for text, vector in zip(texts, results) if vector is None))
+    if not misses:
+        return results
+
+    if EMBEDDING_MICROBATCH_ENABLED:
+        batcher = get_embedding_batcher(model)
+        futures = [batcher.submit(text) for text in misses]
+        fetched = dict(zip(misses, (future.result(timeout=EMBEDDING_RESULT_TIMEOUT) for future in futures)))
+    else:
+        fetched = dict(zip(misses, _create_embeddings(misses, model)))
+    return [vector if vector is not None else fetched[text] for text, vector in zip(texts, results)]
+
+
+def embed_text(text, model=EMBEDDING_MODEL):
+    """Returns the embedding for text as a read-only float32 array, using the shared cache."""
+    return embed_texts([text], model=model)[0]
@@ -0,0 +1,59 @@
+"""
+Runs the local intent classifier over the labelled set in data/intent_labels.json
+and reports the share of turns it resolves without an LLM call, its accuracy on
+those turns, and the classification latency saved.
+
+Usage:
+    python intent_benchmark.py [--threshold 0.75] [--llm-latency-ms 900]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from intent_classifier import LOCAL_CONFIDENCE_THRESHOLD, score_locally
+
+INTENT_LABELS_PATH = os.path.join("data", "intent_labels.json")
+
+
+def run(threshold, llm_latency_ms, verbose):
+    with open(INTENT_LABELS_PATH, "r") as f:
+        examples = json.load(f)
+
+    resolved = correct = 0
+    local_us = []
+    mistakes = []
+    for example in examples:
+        start = time.perf_counter()
+        classification, confidence = score_locally(example["workflow"], example["message"])
+        local_us.append((time.perf_counter() - start) * 1e6)
+        if confidence < threshold:
+            continue
+        resolved += 1
+        if classification == example["expected"]:
+            correct += 1
+        else:
+            mistakes.append((example, classification, confidence))
+
+    total = len(examples)
+    print(f"labelled turns:          {total}")
+    print(f"resolved locally:        {resolved} ({resolved / total:.0%})")
+    print(f"accuracy when local:     {correct / resolved:.0%}" if resolved else "accuracy when local:     n/a")
+    print(f"local p50 / p99:         {np.percentile(local_us, 50):.0f} / {np.percentile(local_us, 99):.0f} us")
+    print(f"LLM latency saved:       {resolved * llm_latency_ms / 1000:.1f} s total, "
+          f"{resolved * llm_latency_ms / total:.0f} ms per turn on average "
+          f"(assuming {llm_latency_ms:.0f} ms per classify call)")
+    if verbose:
+        for example, classification, confidence in mistakes:
+            print(f"  wrong: {example['message']!r} -> {classification} ({confidence:.2f}), expected {example['expected']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local intent classifier.")
+    parser.add_argument("--threshold", type=float, default=LOCAL_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--llm-latency-ms", type=float, default=900.0)
+    parser.add_argument("-v", "--verbose", action="store_true", help="List local misclassifications.")
+    args = parser.parse_args()
+    run(args.threshold, args.llm_latency_ms, args.verbose)
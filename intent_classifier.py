@@ -0,0 +1,133 @@
+import re
+import threading
+
+# Local answers at or above this confidence skip the LLM classifier.
+LOCAL_CONFIDENCE_THRESHOLD = 0.75
+# Replies longer than this (in words) are left to the LLM; they rarely are plain answers.
+MAX_LOCAL_WORDS = 12
+
+# "absolutely not", "of course not": an affirmative word followed by a negation is not a yes.
+_NOT_NEGATED = r"(?!\s*,?\s*(not|no|never)\b)"
+_YES_PATTERNS = [
+    r"^(yes|yeah|yea|yep|yup|ya|y|sure|ok|okay|definitely|absolutely|of course|certainly|totally|please)\b" + _NOT_NEGATED,
+    r"^(i|we) (do|did|have|would)\b" + _NOT_NEGATED,
+    # "I am" is only an answer on its own; "I am in 10th grade" is a statement.
+    r"^(i|we) (am|are)$",
+    r"^(sounds good|that works|let'?s do it|let'?s go|go ahead|for sure)\b" + _NOT_NEGATED,
+]
+_NO_PATTERNS = [
+    r"^(no|nope|nah|n|not really|not yet|not now|never|no thanks|none)\b",
+    r"^(i|we) (don'?t|do not|didn'?t|haven'?t|have not|wouldn'?t)\b",
+    r"^((i|we) (am not|are not|aren'?t)|i'?m not|we'?re not)$",
+    r"^(skip|pass)\b",
+]
+
+# Choice synonyms per workflow: canonical value -> patterns.
+CHOICE_LEXICON = {
+    "research": ("option", {
+        "mentor": [r"\bmentor", r"\bspeak to\b", r"\btalk to\b"],
+        "jump": [r"\bjump\b", r"\bstraight\b", r"\bget started\b", r"\bdive in\b"],
+    }),
+    "deca": ("event_type", {
+        "roleplay": [r"\brole[- ]?play", r"\bcase stud"],
+        "prepared": [r"\bprepared\b", r"\bwritten\b", r"\bproject\b"],
+        "online": [r"\bonline\b", r"\bsimulation\b"],
+    }),
+    "mun": ("committee", {
+        "General Assemblies": [r"\bgeneral assembl", r"\bga\b"],
+        "Crisis Committees": [r"\bcrisis\b"],
+        "Specialized Agencies": [r"\bspeciali[sz]ed\b", r"\bagenc"],
+        "Regional Bodies": [r"\bregional\b"],
+    }),
+    "podcast": ("choice", {
+        "solo": [r"\bsolo\b", r"\bjust me\b", r"\bby myself\b"],
+        "co-hosted": [r"\bco[- ]?host", r"\bwith a friend\b"],
+        "interview": [r"\binterview"],
+        "narrative": [r"\bnarrative\b", r"\bstorytelling\b", r"\bstories\b"],
+        "hybrid": [r"\bhybrid\b", r"\bmix\b"],
+    }),
+    "science_olympiad": ("event_category", {
+        "study": [r"\bstudy\b"],
+        "lab": [r"\blab\b", r"\blab[- ]based\b"],
+        "build": [r"\bbuild"],
+    }),
+    "volunteering": ("path", {
+        "existing": [r"\bexisting\b", r"\bjoin an? (existing )?org"],
+        "one-time": [r"\bone[- ]time\b", r"\bsingle event"],
+        "local": [r"\blocal\b", r"\bmy own (project|initiative)\b"],
+        "nonprofit": [r"\bnon[- ]?profit\b", r"\b501"],
+    }),
+}
+
+# A negation anywhere in a yes or a choice reply ("yes, no wait", "not roleplay") makes it ambiguous.
+_NEGATION = re.compile(r"\b(not|no|never|don'?t|nope|nah|wait)\b", re.IGNORECASE)
+
+_COMPILED_YES = [re.compile(p, re.IGNORECASE) for p in _YES_PATTERNS]
+_COMPILED_NO = [re.compile(p, re.IGNORECASE) for p in _NO_PATTERNS]
+_COMPILED_CHOICES = {
+    workflow: (key, {value: [re.compile(p, re.IGNORECASE) for p in patterns] for value, patterns in choices.items()})
+    for workflow, (key, choices) in CHOICE_LEXICON.items()
+}
+
+_stats_lock = threading.Lock()
+_stats = {"local": 0, "fallback": 0}
+
+
+def _normalize(message):
+    return re.sub(r"\s+", " ", message.strip().lower().strip(".!?,"))
+
+
+def score_locally(workflow, user_message):
+    """
+    Returns (classification, confidence) from the lexicon alone, in the same
+    shape as the classify_*_input helpers, e.g. ({"answer": "yes"}, 0.95).
+    """
+    text = _normalize(user_message)
+    if not text:
+        return {}, 0.0
+    words = len(text.split())
+
+    yes = any(p.search(text) for p in _COMPILED_YES)
+    no = any(p.search(text) for p in _COMPILED_NO)
+    choice_key, choices = _COMPILED_CHOICES.get(workflow, (None, {}))
+    matched_choices = [value for value, patterns in choices.items() if any(p.search(text) for p in patterns)]
+
+    if (yes and no) or len(matched_choices) > 1:
+        return {}, 0.3
+    if (yes or matched_choices) and _NEGATION.search(text):
+        return {}, 0.3
+    classification = {}
+    if yes or no:
+        classification["answer"] = "yes" if yes else "no"
+    if matched_choices:
+        classification[choice_key] = matched_choices[0]
+    if not classification:
+        return {}, 0.0
+
+    # Short, unambiguous replies are near-certain; longer ones may hedge ("yes but...").
+    if words <= 3:
+        confidence = 0.95
+    elif words <= MAX_LOCAL_WORDS:
+        confidence = 0.8
+    else:
+        confidence = 0.5
+    if re.search(r"\b(but|maybe|not sure|unsure|idk|depends)\b", text):
+        confidence = min(confidence, 0.4)
+    return classification, confidence
+
+
+def classify_locally(workflow, user_message, threshold=LOCAL_CONFIDENCE_THRESHOLD):
+    """The local classification if it is confident enough, otherwise None (caller falls back to the LLM)."""
+    classification, confidence = score_locally(workflow, user_message)
+    with _stats_lock:
+        if confidence >= threshold:
+            _stats["local"] += 1
+            return classification
+        _stats["fallback"] += 1
+    return None
+
+
+def local_classifier_stats():
+    with _stats_lock:
+        total = _stats["local"] + _stats["fallback"]
+        return dict(_stats, local_share=_stats["local"] / total if total else 0.0)
@@ -0,0 +1,152 @@
+import json
+import re
+
+from openai_client import SHORT_CALL_DEADLINE
+from response_cache import SEMANTIC_SLOT, cached_chat_completion, json_reply
+
+from intent_classifier import classify_locally
+
+ROUTER_MODEL = "gpt-4o"
+
+# Workflows in priority order. Which steps need the student's answer classified
+# is decided by the caller (see WorkflowEngine.needs_classification).
+WORKFLOW_ROUTES = {
+    "research": {
+        "stage_key": "research_state",
+        "keywords": [r"research"],
+        "choice_key": "option",
+        "choices": ["mentor", "jump"],
+    },
+    "deca": {
+        "stage_key": "deca_stage",
+        "keywords": [r"\bdeca\b"],
+        "choice_key": "event_type",
+        "choices": ["roleplay", "prepared", "online"],
+    },
+    "mun": {
+        "stage_key": "mun_stage",
+        "keywords": [r"\bmun\b", r"model un\b", r"model united nations"],
+        "choice_key": "committee",
+        "choices": ["General Assemblies", "Crisis Committees", "Specialized Agencies", "Regional Bodies"],
+    },
+    "podcast": {
+        "stage_key": "podcast_stage",
+        "keywords": [r"podcast"],
+        "choice_key": "choice",
+        "choices": ["solo", "co-hosted", "interview", "narrative", "hybrid"],
+    },
+    "science_olympiad": {
+        "stage_key": "science_olympiad_stage",
+        "keywords": [r"science olympiad", r"\bscioly\b", r"\bsci oly\b"],
+        "choice_key": "event_category",
+        "choices": ["study", "lab", "build"],
+    },
+    "volunteering": {
+        "stage_key": "volunteering_stage",
+        "keywords": [r"volunteer", r"nonprofit", r"non-profit"],
+        "choice_key": "path",
+        "choices": ["existing", "one-time", "local", "nonprofit"],
+    },
+}
+
+# Requests that are not workflows but were previously detected with their own GPT-4 call.
+INTENT_KEYWORDS = {
+    "science_project": [r"science (fair|project)", r"\bisef\b", r"project idea"],
+}
+
+_COMPILED_KEYWORDS = {
+    name: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    for name, patterns in {**{n: r["keywords"] for n, r in WORKFLOW_ROUTES.items()}, **INTENT_KEYWORDS}.items()
+}
+
+
+def matches_intent(name, user_message):
+    return any(pattern.search(user_message) for pattern in _COMPILED_KEYWORDS[name])
+
+
+def detect_workflow(user_message):
+    """First workflow, in priority order, whose keywords appear in the message."""
+    for name in WORKFLOW_ROUTES:
+        if matches_intent(name, user_message):
+            return name
+    return None
+
+
+def needs_classification(workflow, workflow_state):
+    """Default when the caller has no transition table: classify any step after the first prompt."""
+    return workflow_state.get(WORKFLOW_ROUTES[workflow]["stage_key"], "none") != "none"
+
+
+def route_message(user_message, workflow_state, step_needs_classification=needs_classification):
+    """
+    Decides the target workflow for a chat turn and, when the workflow's
+    current step needs it, the step answer: from the local
+    classifier when it is confident, otherwise in one structured-output
+    call. Returns:
+        {"workflow": name or None, "classification": dict or None}
+    classification is None when the step needs none or the call failed, in
+    which case the workflow engine falls back to its own classifier.
+    """
+    workflow = detect_workflow(user_message)
+    if workflow is None or not step_needs_classification(workflow, workflow_state):
+        return {"workflow": workflow, "classification": None}
+
+    local = classify_locally(workflow, user_message)
+    if local is not None:
+        return {"workflow": workflow, "classification": local}
+
+    routed = classify_turn(workflow, workflow_state, user_message)
+    if routed is None:
+        return {"workflow": workflow, "classification": None}
+    return routed
+
+
+def classify_turn(workflow, workflow_state, user_message):
+    route = WORKFLOW_ROUTES[workflow]
+    current_step = workflow_state.get(route["stage_key"], "none")
+    choice_key = route["choice_key"]
+    prompt = (
+        f"Keyword routing suggests the '{workflow}' workflow, currently at step '{current_step}'.\n"
+        f"User message: '{SEMANTIC_SLOT}'\n"
+        "Return a JSON object with keys:\n"
+        f"- workflow: '{workflow}', or null if the message is not actually about it\n"
+        "- answer: 'yes', 'no', or null if the message is not a yes/no reply\n"
+        f"- {choice_key}: one of {json.dumps(route['choices'])}, or null"
+    )
+    try:
+        response = cached_chat_completion(
+            "classify_turn",
+            semantic_text=user_message,
+            model=ROUTER_MODEL,
+            messages=[
+                {"role": "system", "content": "Route and classify a student's message for a college counseling assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=60,
+            temperature=0.0,
+            deadline=SHORT_CALL_DEADLINE,
+            hedge=True,
+            latency_key="router",
+            validate=json_reply
+        )
+        parsed = json.loads(response.choices[0].message.content)
+    except Exception as e:
+        print("Error in classify_turn:", e)
+        return None
+
+    # The model may echo the workflow in another case, or leave the key out;
+    # only an explicit different value overrides the keyword routing.
+    routed_workflow = parsed.get("workflow", workflow)
+    classification = {}
+    answer = parsed.get("answer")
+    if isinstance(answer, str) and answer.lower() in ("yes", "no"):
+        classification["answer"] = answer.lower()
+    choice = parsed.get(choice_key)
+    if isinstance(choice, str) and choice:
+        canonical = {c.lower(): c for c in route["choices"]}
+        classification[choice_key] = canonical.get(choice.lower(), choice)
+    return {
+        "workflow": workflow if isinstance(routed_workflow, str) and routed_workflow.strip().lower() == workflow else None,
+        "classification": classification,
+    }
@@ -0,0 +1,113 @@
+"""
+Load test for /api/chat: throughput and latency per server process, to
+compare the sync Flask mode with the async mode in asgi_app.py.
+
+    # sync, one process
+    python app.py
+    # async, one process
+    uvicorn asgi_app:asgi --port 5001 --workers 1
+
+    python load_test.py --url http://localhost:5000 --url http://localhost:5001 \
+        --concurrency 10 50 200 --requests 400
+
+Each request comes from its own synthetic student (load-test-<n>) so turns
+do not contend on one Firestore document. With --stream the script hits
+/api/chat/stream and also reports time to first token.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_MESSAGE = "What are some ways I can explore my interest in biology this summer?"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def one_request(client, url, n, message, stream):
+    payload = {"student_id": f"load-test-{n}", "message": message}
+    started = time.perf_counter()
+    first_token = None
+    if stream:
+        async with client.stream("POST", f"{url}/api/chat/stream", json=payload) as response:
+            async for line in response.aiter_lines():
+                if first_token is None and line.startswith("event: token"):
+                    first_token = time.perf_counter() - started
+                if line.startswith("event: error"):
+                    raise RuntimeError("error event")
+            response.raise_for_status()
+    else:
+        response = await client.post(f"{url}/api/chat", json=payload)
+        response.raise_for_status()
+    return time.perf_counter() - started, first_token
+
+
+async def run_load(url, concurrency, total, message, stream, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, first_tokens, errors = [], [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def worker(n):
+            nonlocal errors
+            async with semaphore:
+                try:
+                    latency, first_token = await one_request(client, url, n, message, stream)
+                    latencies.append(latency)
+                    if first_token is not None:
+                        first_tokens.append(first_token)
+                except Exception as e:
+                    errors += 1
+                    if errors <= 3:
+                        print(f"  request {n} failed: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "mean": statistics.mean(latencies) if latencies else 0.0,
+        "ttft_p50": percentile(first_tokens, 50) if first_tokens else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput/latency load test for /api/chat.")
+    parser.add_argument("--url", action="append", required=True, help="Server base URL; repeat to compare modes.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per (url, concurrency) run.")
+    parser.add_argument("--message", default=DEFAULT_MESSAGE)
+    parser.add_argument("--stream", action="store_true", help="Use /api/chat/stream and report time to first token.")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    header = f"{'url':<28} {'conc':>5} {'ok':>5} {'err':>4} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'mean s':>7}"
+    if args.stream:
+        header += f" {'ttft p50':>9}"
+    print(header)
+    for url in args.url:
+        for concurrency in args.concurrency:
+            r = asyncio.run(run_load(url.rstrip("/"), concurrency, args.requests, args.message, args.stream, args.timeout))
+            line = (f"{r['url']:<28} {r['concurrency']:>5} {r['ok']:>5} {r['errors']:>4} {r['rps']:>8.2f} "
+                    f"{r['p50']:>7.2f} {r['p95']:>7.2f} {r['mean']:>7.2f}")
+            if args.stream:
+                line += f" {r['ttft_p50'] or 0.0:>9.2f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from mentor_corpus import mentor_id, activity_text
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "for", "from", "have",
+    "how", "i", "in", "into", "is", "it", "its", "me", "my", "of", "on", "or", "our", "so", "that",
+    "the", "their", "them", "they", "this", "to", "up", "was", "we", "were", "what", "who", "will",
+    "with", "you", "your", "want", "like", "would", "should", "help", "get", "need", "about",
+))
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS and len(token) > 1]
+
+
+def _parse_grades(grades):
+    """Grades are stored either as a list of ints or as a string like "9, 10, 11"."""
+    if isinstance(grades, str):
+        return {int(g) for g in re.findall(r"\d+", grades)}
+    return {int(g) for g in grades if str(g).strip().isdigit()}
+
+
+class MentorBM25Index:
+    """
+    In-process inverted index (BM25) over mentor activities and essays, with
+    per-field filters on activity category and grades.
+    """
+
+    def __init__(self, mentors):
+        self.ids = [mentor_id(mentor) for mentor in mentors]
+        self._activities = [mentor.get("activities", []) for mentor in mentors]
+        self._categories = [
+            {activity.get("category", "").lower() for activity in activities} for activities in self._activities
+        ]
+        self._grades = [
+            {grade for activity in activities for grade in _parse_grades(activity.get("grades", []))}
+            for activities in self._activities
+        ]
+
+        self._postings = defaultdict(list)  # term -> [(doc, tf)]
+        self._doc_lengths = []
+        for doc, mentor in enumerate(mentors):
+            fields = [activity_text(activity) for activity in self._activities[doc]]
+            fields.extend(essay.get("content", "") for essay in mentor.get("essays", []))
+            counts = Counter(tokenize(" ".join(fields)))
+            self._doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((doc, tf))
+        self._avg_length = (sum(self._doc_lengths) / len(self._doc_lengths)) if self._doc_lengths else 0.0
+        self._position = {m_id: doc for doc, m_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def matches_filters(self, doc, filters):
+        if not filters:
+            return True
+        category = filters.get("category")
+        if category and category.lower() not in self._categories[doc]:
+            return False
+        grade = filters.get("grades")
+        if grade is not None:
+            wanted = set(grade) if isinstance(grade, (list, tuple, set)) else {grade}
+            if not {int(g) for g in wanted} & self._grades[doc]:
+                return False
+        return True
+
+    def filter_ids(self, filters):
+        """Mentor ids passing the field filters, e.g. {"category": "Athletics", "grades": 11}."""
+        return [m_id for doc, m_id in enumerate(self.ids) if self.matches_filters(doc, filters)]
+
+    def scores(self, query, filters=None):
+        """Returns {mentor_id: bm25_score} for mentors matching at least one query term."""
+        n_docs = len(self.ids)
+        totals = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                length_norm = 1 - BM25_B + BM25_B * self._doc_lengths[doc] / self._avg_length
+                totals[doc] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+        return {
+            self.ids[doc]: score for doc, score in totals.items() if self.matches_filters(doc, filters)
+        }
+
+    def explain(self, m_id, query):
+        """One-sentence reason naming the mentor activity that best overlaps the query, or None."""
+        doc = self._position.get(m_id)
+        if doc is None:
+            return None
+        query_terms = set(tokenize(query))
+        best_activity, best_terms = None, set()
+        for activity in self._activities[doc]:
+            terms = query_terms & set(tokenize(activity_text(activity)))
+            if len(terms) > len(best_terms):
+                best_activity, best_terms = activity, terms
+        if best_activity is None:
+            return None
+        role = best_activity.get("role") or best_activity.get("category", "an activity")
+        organization = best_activity.get("organization")
+        where = f" at {organization}" if organization else ""
+        matched = ", ".join(sorted(best_terms)[:4])
+        return (
+            f"{m_id} has experience as {role}{where}: {best_activity.get('description', '').rstrip('.')}. "
+            f"That lines up with what you mentioned ({matched})."
+        )
@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+# Essays are split on paragraph boundaries into chunks of at most this many characters.
+MAX_CHUNK_CHARS = 2000
+
+
+def mentor_id(mentor):
+    return mentor.get("student", "")
+
+
+def mentor_record_hash(mentor):
+    """Stable hash of a mentor record; any edit to activities or essays changes it."""
+    canonical = json.dumps(mentor, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def activity_text(activity):
+    header = " | ".join(
+        part for part in (
+            activity.get("category", ""),
+            activity.get("role", ""),
+            activity.get("organization", ""),
+        ) if part
+    )
+    description = activity.get("description", "")
+    return f"{header}: {description}" if header else description
+
+
+def split_paragraphs(text, max_chars=MAX_CHUNK_CHARS):
+    chunks = []
+    current = ""
+    for paragraph in (p.strip() for p in text.split("\n")):
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        while len(paragraph) > max_chars:
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_mentor(mentor):
+    """Returns the texts embedded for a mentor: one per activity plus essay paragraphs."""
+    chunks = [activity_text(activity) for activity in mentor.get("activities", [])]
+    for essay in mentor.get("essays", []):
+        chunks.extend(split_paragraphs(essay.get("content", "")))
+    return [chunk for chunk in chunks if chunk.strip()]
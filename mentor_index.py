@@ -0,0 +1,293 @@
+import numpy as np
+
+# int8 codes are scored a block at a time through a float32 buffer this size,
+# small enough to stay in L2 so the scan reads 1 byte per dimension from memory.
+QUANTIZED_BLOCK_BYTES = 256 * 1024
+
+
+class MentorIndex:
+    """
+    Holds every mentor embedding in one contiguous, L2-normalized float32 matrix
+    with a parallel array of mentor ids, so a query is a single matrix-vector product.
+    """
+
+    def __init__(self, mentor_ids, matrix, normalized=False):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(mentor_ids):
+            raise ValueError("matrix must be 2-D with one row per mentor id")
+        if not normalized:
+            matrix = _normalize_rows(matrix)
+        self.ids = np.asarray(mentor_ids, dtype=object)
+        self.matrix = matrix
+
+    @classmethod
+    def from_embeddings(cls, embeddings):
+        """Builds an index from a {mentor_id: [floats]} mapping."""
+        if not embeddings:
+            return cls([], np.empty((0, 0), dtype=np.float32), normalized=True)
+        mentor_ids = list(embeddings.keys())
+        matrix = np.array([embeddings[mentor_id] for mentor_id in mentor_ids], dtype=np.float32)
+        return cls(mentor_ids, matrix)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def scores(self, query_vector):
+        """Cosine similarity of the query against every mentor."""
+        query = _normalize_query(query_vector)
+        return self.matrix @ query
+
+    def search(self, query_vector, k=1):
+        """Returns up to k (mentor_id, score) pairs, best first."""
+        if len(self) == 0 or k <= 0:
+            return []
+        scores = self.scores(query_vector)
+        top = _top_k(scores, k)
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def _rows_for(self, mentor_ids):
+        if not hasattr(self, "_positions"):
+            self._positions = {m_id: row for row, m_id in enumerate(self.ids)}
+        return [self._positions[m_id] for m_id in mentor_ids if m_id in self._positions]
+
+    def vectors_for(self, mentor_ids):
+        """Normalized float32 rows for the given mentors, in the given order."""
+        return np.asarray(self.matrix[np.array(self._rows_for(mentor_ids), dtype=np.int64)], dtype=np.float32)
+
+    def score_ids(self, query_vector, mentor_ids):
+        """Exact cosine scores for just the given mentors, as {mentor_id: score}."""
+        rows = np.array(sorted(self._rows_for(mentor_ids)), dtype=np.int64)
+        if len(rows) == 0:
+            return {}
+        scores = self.matrix[rows] @ _normalize_query(query_vector)
+        return {self.ids[row]: float(score) for row, score in zip(rows, scores)}
+
+
+class IVFMentorIndex(MentorIndex):
+    """
+    Approximate index for large mentor pools (inverted file with k-means
+    coarse quantization). Rows are clustered around nlist centroids and
+    stored grouped by cluster; a query scans only the nprobe clusters whose
+    centroids are closest. nprobe is the recall/latency knob: nprobe == nlist
+    is an exact scan.
+
+    Pass centroids and list_offsets from ivf_layout() (saved offline by
+    build_mentor_embeddings.py) when the matrix is already grouped by list:
+    nothing is trained or copied, so a memory-mapped matrix stays mapped.
+
+    With quantization="int8" the probed lists are scanned on a
+    quantized copy and the best k * rerank_factor candidates are re-ranked
+    exactly, as in QuantizedMentorIndex (pass codes and scales saved by the
+    build, in the same row order, to share them instead of quantizing here).
+    """
+
+    def __init__(self, mentor_ids, matrix, normalized=False, nlist=None, nprobe=8,
+                 train_size=None, n_iter=10, seed=0, quantization=None, rerank_factor=4,
+                 centroids=None, list_offsets=None, codes=None, scales=None):
+        super().__init__(mentor_ids, matrix, normalized=normalized)
+        n = len(self)
+        self.nlist = max(1, min(n, nlist or int(np.sqrt(n)))) if n else 0
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.codes, self.scales = None, None
+        if n == 0:
+            self.centroids = np.empty((0, 0), dtype=np.float32)
+            self.list_offsets = np.zeros(1, dtype=np.int64)
+            return
+
+        if centroids is None:
+            order, centroids, list_offsets = ivf_layout(self.matrix, self.nlist, train_size, n_iter, seed)
+            self.matrix = np.ascontiguousarray(self.matrix[order])
+            self.ids = self.ids[order]
+            if codes is not None:
+                codes, scales = codes[order], scales[order]
+        elif len(list_offsets) != len(centroids) + 1 or list_offsets[-1] != n:
+            raise ValueError("list_offsets must have one entry per centroid plus one, ending at the row count")
+        self.centroids = centroids
+        self.nlist = len(centroids)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        if quantization:
+            self.codes, self.scales = _quantization_for(self.matrix, quantization, codes, scales)
+
+    def _list_scores(self, start, end, query):
+        if self.codes is None:
+            return self.matrix[start:end] @ query
+        return _quantized_scores(self.codes[start:end], self.scales[start:end], query)
+
+    def search(self, query_vector, k=1, nprobe=None):
+        if len(self) == 0 or k <= 0:
+            return []
+        query = _normalize_query(query_vector)
+        nprobe = min(self.nlist, nprobe or self.nprobe)
+        lists = _top_k(self.centroids @ query, nprobe)
+
+        candidate_rows = []
+        candidate_scores = []
+        for lst in lists:
+            start, end = self.list_offsets[lst], self.list_offsets[lst + 1]
+            if start == end:
+                continue
+            candidate_rows.append(np.arange(start, end))
+            candidate_scores.append(self._list_scores(start, end, query))
+        if not candidate_rows:
+            return []
+        rows = np.concatenate(candidate_rows)
+        scores = np.concatenate(candidate_scores)
+        if self.codes is None:
+            top = _top_k(scores, k)
+            return [(self.ids[rows[i]], float(scores[i])) for i in top]
+        candidates = np.sort(rows[_top_k(scores, k * self.rerank_factor)])
+        exact = self.matrix[candidates] @ query
+        top = _top_k(exact, k)
+        return [(self.ids[candidates[i]], float(exact[i])) for i in top]
+
+
+class QuantizedMentorIndex(MentorIndex):
+    """
+    Scans a quantized copy of the mentor matrix (per-row int8 with a float32
+    scale) for the candidate search, then re-ranks the best
+    k * rerank_factor candidates exactly against the float32 rows.
+
+    Memory: quantizing here gives every worker a private copy of n * dim
+    bytes on top of the shared page cache of the float32 store, so with more
+    than a few workers it costs more than it saves. Pass the codes and scales
+    build_mentor_embeddings.py saves (memory-mapped, shared by all workers)
+    instead: queries then read n * dim bytes of codes, a quarter of the
+    float32 store, plus only the re-ranked float32 rows.
+    """
+
+    def __init__(self, mentor_ids, matrix, normalized=False, quantization="int8",
+                 rerank_factor=4, chunk_size=8192, codes=None, scales=None):
+        super().__init__(mentor_ids, matrix, normalized=normalized)
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.chunk_size = chunk_size
+        self.codes, self.scales = _quantization_for(self.matrix, quantization, codes, scales, chunk_size)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def approximate_scores(self, query_vector):
+        return _quantized_scores(self.codes, self.scales, _normalize_query(query_vector))
+
+    def search(self, query_vector, k=1):
+        if len(self) == 0 or k <= 0:
+            return []
+        query = _normalize_query(query_vector)
+        candidates = _top_k(self.approximate_scores(query), k * self.rerank_factor)
+        candidates = np.sort(candidates)  # ascending rows keep memmap reads sequential
+        exact = self.matrix[candidates] @ query
+        top = _top_k(exact, k)
+        return [(self.ids[candidates[i]], float(exact[i])) for i in top]
+
+
+def ivf_layout(matrix, nlist=None, train_size=None, n_iter=10, seed=0):
+    """
+    Trains the IVF coarse quantizer on normalized rows. Returns (order,
+    centroids, list_offsets): matrix[order] groups the rows by inverted list,
+    and list l is rows list_offsets[l]:list_offsets[l + 1] of that regrouped matrix.
+    """
+    n = len(matrix)
+    nlist = max(1, min(n, nlist or int(np.sqrt(n))))
+    rng = np.random.default_rng(seed)
+    train_size = min(n, train_size or nlist * 64)
+    sample = np.asarray(matrix[np.sort(rng.choice(n, size=train_size, replace=False))], dtype=np.float32)
+    centroids = _spherical_kmeans(sample, nlist, n_iter, rng)
+    assignments = _assign(matrix, centroids)
+    order = np.argsort(assignments, kind="stable")
+    counts = np.bincount(assignments, minlength=nlist)
+    return order, centroids, np.concatenate(([0], np.cumsum(counts)))
+
+
+def _quantization_for(matrix, quantization, codes, scales, chunk_size=8192):
+    # float16 is not offered: numpy has no fast float16 matmul, so it scans slower than float32.
+    if quantization != "int8":
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    if codes is None:
+        return quantize_int8(matrix, chunk_size)
+    if codes.shape != matrix.shape or len(scales) != len(matrix):
+        raise ValueError("codes and scales must match the matrix rows")
+    return codes, scales
+
+
+def quantize_int8(matrix, chunk_size=8192):
+    """Per-row symmetric int8 codes and float32 scales: row ~= codes * scale."""
+    codes = np.empty(matrix.shape, dtype=np.int8)
+    scales = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), chunk_size):
+        block = np.asarray(matrix[start:start + chunk_size], dtype=np.float32)
+        block_scales = np.abs(block).max(axis=1) / 127.0
+        block_scales[block_scales == 0] = 1.0
+        codes[start:start + len(block)] = np.round(block / block_scales[:, None])
+        scales[start:start + len(block)] = block_scales
+    return codes, scales
+
+
+def _quantized_scores(codes, scales, query):
+    """Approximate scores of int8 codes: each block is widened into one reused float32 buffer for the matmul."""
+    scores = np.empty(len(codes), dtype=np.float32)
+    if len(codes) == 0:
+        return scores
+    rows = max(1, QUANTIZED_BLOCK_BYTES // (codes.shape[1] * 4))
+    buffer = np.empty((min(rows, len(codes)), codes.shape[1]), dtype=np.float32)
+    for start in range(0, len(codes), rows):
+        block = codes[start:start + rows]
+        widened = buffer[:len(block)]
+        np.copyto(widened, block, casting="unsafe")
+        np.dot(widened, query, out=scores[start:start + len(block)])
+    scores *= scales
+    return scores
+
+
+def _assign(matrix, centroids, chunk_size=65536):
+    """Nearest centroid (by cosine) for every row, computed in chunks to bound memory."""
+    assignments = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), chunk_size):
+        block = matrix[start:start + chunk_size]
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _spherical_kmeans(sample, n_clusters, n_iter, rng):
+    centroids = sample[rng.choice(len(sample), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(sample, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_clusters)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _normalize_query(query_vector):
+    query = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return query
+    return query / norm
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores, sorted descending, via argpartition."""
+    k = min(k, len(scores))
+    if k == len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
@@ -1,15 +1,69 @@
-import openai
+from openai_client import BACKGROUND, chat_completion
 import numpy as np
-from db_utils import load_mentor_embeddings
+import threading
+from db_utils import (
+    load_mentors_data,
+    load_mentor_embedding_matrix,
+    load_mentor_ivf_layout,
+    load_mentor_quantized_codes,
+    load_mentor_request_example_embeddings,
+    save_mentor_request_example_embeddings
+)
+from embedding_utils import EMBEDDING_MODEL, embed_text, embed_texts
+from mentor_index import MentorIndex, IVFMentorIndex, QuantizedMentorIndex
+from mentor_bm25 import MentorBM25Index
 import re
 
-MENTOR_EMBEDDINGS = load_mentor_embeddings()
+# Pools at least this large use the approximate IVF index instead of an exact scan.
+MENTOR_ANN_MIN_POOL = 20000
+# Clusters scanned per query by the IVF index; higher means better recall and slower queries.
+MENTOR_ANN_NPROBE = 8
+# "int8" scans the int8 codes saved by build_mentor_embeddings.py (the whole
+# pool, or the probed IVF lists) and re-ranks the top candidates against the
+# memory-mapped float32 rows. The codes are memory-mapped too, so workers
+# share one copy a quarter the size of the float32 store. Without saved codes
+# the float32 rows are scanned directly: quantizing at startup would give
+# every worker a private copy. None always scans float32.
+MENTOR_QUANTIZATION = "int8"
+MENTOR_RERANK_FACTOR = 4
 
+def build_mentor_index(mentor_ids, matrix, normalized=False, layout=None, codes=None):
+    """
+    layout is (centroids, list_offsets) from load_mentor_ivf_layout, for the
+    IVF index; codes is (codes, scales) from load_mentor_quantized_codes.
+    """
+    quantization = MENTOR_QUANTIZATION if codes is not None else None
+    codes, scales = codes or (None, None)
+    if len(mentor_ids) >= MENTOR_ANN_MIN_POOL:
+        if layout is None:
+            print("No IVF layout for the mentor store; clustering at startup. Run build_mentor_embeddings.py.")
+        centroids, list_offsets = layout or (None, None)
+        return IVFMentorIndex(mentor_ids, matrix, normalized=normalized, nprobe=MENTOR_ANN_NPROBE,
+                              quantization=quantization, rerank_factor=MENTOR_RERANK_FACTOR,
+                              centroids=centroids, list_offsets=list_offsets, codes=codes, scales=scales)
+    if quantization:
+        return QuantizedMentorIndex(mentor_ids, matrix, normalized=normalized, quantization=quantization,
+                                    rerank_factor=MENTOR_RERANK_FACTOR, codes=codes, scales=scales)
+    return MentorIndex(mentor_ids, matrix, normalized=normalized)
+
+def load_mentor_index():
+    mentor_ids, matrix, normalized = load_mentor_embedding_matrix()
+    layout = load_mentor_ivf_layout(mentor_ids) if len(mentor_ids) >= MENTOR_ANN_MIN_POOL else None
+    codes = load_mentor_quantized_codes(mentor_ids) if MENTOR_QUANTIZATION and normalized else None
+    return build_mentor_index(mentor_ids, matrix, normalized, layout, codes)
+
+MENTOR_INDEX = load_mentor_index()
+MENTOR_LEXICAL_INDEX = MentorBM25Index(load_mentors_data())
+
+# Minimum cosine similarity (vector_score, not the hybrid score) for a recommendation.
 MENTOR_RECOMMENDATION_THRESHOLD = 0.3
+# Weight of the vector score in the hybrid score; the rest goes to normalized BM25.
+MENTOR_HYBRID_ALPHA = 0.7
+# Without filters, the hybrid stage fuses this many top candidates from each side.
+MENTOR_HYBRID_CANDIDATES = 20
 
-def generate_embedding(text, model="text-embedding-ada-002"):
-    response = openai.embeddings.create(model=model, input=text)
-    return response.data[0].embedding
+def generate_embedding(text, model=EMBEDDING_MODEL):
+    return embed_text(text, model=model)
 
 def cosine_similarity(vec1, vec2):
     vec1 = np.array(vec1)
@@ -20,28 +74,106 @@ def should_recommend_mentor(user_message):
     # maybe add NLP later :-(
     return True
 
-def recommend_mentor(user_message, student_info):
-    profile_text = (
+def build_mentor_profile_text(user_message, student_info):
+    return (
         f"Name: {student_info.get('name','')}\n"
         f"Grade: {student_info.get('grade','')}\n"
         f"Interests: {student_info.get('hobbies','')}, {student_info.get('favorite_subjects','')}, "
         f"{student_info.get('coursework','')}, {student_info.get('care_about','')}\n"
         f"User Query: {user_message}\n"
     )
-    user_vector = generate_embedding(profile_text)
 
-    best_mentor = None
-    best_score = 0.0
+def prefetch_mentor_embeddings(user_message):
+    """
+    Embeds the user message ahead of is_explicit_mentor_request. The profile
+    text is only embedded by recommend_mentor, on the turns that recommend one.
+    """
+    try:
+        embed_text(user_message)
+    except Exception as e:
+        print(f"Error prefetching mentor embeddings: {e}")
+
+def build_mentor_lexical_query(user_message, student_info):
+    interest_fields = (
+        'future_study', 'deep_interest', 'current_extracurriculars', 'favorite_courses',
+        'hobbies', 'favorite_subjects', 'coursework', 'care_about'
+    )
+    interests = " ".join(str(student_info.get(field, '')) for field in interest_fields)
+    return f"{user_message} {interests}"
+
+def hybrid_search_mentors(user_message, student_info, k=1, filters=None, alpha=MENTOR_HYBRID_ALPHA):
+    """
+    Fuses the vector score with BM25 over mentor activities and essays.
+    filters (e.g. {"category": "Athletics", "grades": 11}) are applied lexically
+    before the vector stage, which then only scores the mentors that passed.
+    Returns [{"mentor_id", "score", "vector_score", "lexical_score"}], best first.
+    """
+    lexical_query = build_mentor_lexical_query(user_message, student_info)
+    lexical_scores = MENTOR_LEXICAL_INDEX.scores(lexical_query, filters=filters)
+    user_vector = generate_embedding(build_mentor_profile_text(user_message, student_info))
+
+    if filters:
+        candidates = MENTOR_LEXICAL_INDEX.filter_ids(filters)
+    else:
+        top_lexical = sorted(lexical_scores, key=lexical_scores.get, reverse=True)[:MENTOR_HYBRID_CANDIDATES]
+        top_vector = [m_id for m_id, _ in MENTOR_INDEX.search(user_vector, k=MENTOR_HYBRID_CANDIDATES)]
+        candidates = list(dict.fromkeys(top_vector + top_lexical))
+    vector_scores = MENTOR_INDEX.score_ids(user_vector, candidates)
+
+    max_lexical = max(lexical_scores.values(), default=0.0) or 1.0
+    results = []
+    for m_id, vector_score in vector_scores.items():
+        lexical_score = lexical_scores.get(m_id, 0.0) / max_lexical
+        results.append({
+            "mentor_id": m_id,
+            "score": alpha * vector_score + (1 - alpha) * lexical_score,
+            "vector_score": vector_score,
+            "lexical_score": lexical_score,
+        })
+    results.sort(key=lambda result: result["score"], reverse=True)
+    return results[:k]
+
+def explain_mentor_match(mentor_id, user_message, student_info):
+    """Lexical explanation for a recommended mentor, or None if nothing overlaps."""
+    return MENTOR_LEXICAL_INDEX.explain(mentor_id, build_mentor_lexical_query(user_message, student_info))
 
-    for mentor_id, mentor_vec in MENTOR_EMBEDDINGS.items():
-        sim = cosine_similarity(user_vector, mentor_vec)
-        if sim > best_score:
-            best_score = sim
-            best_mentor = mentor_id
+def recommend_mentors(user_message, student_info, k=3, threshold=MENTOR_RECOMMENDATION_THRESHOLD,
+                      diversity=0.0, filters=None):
+    """
+    Returns up to k (mentor_id, score) pairs, best hybrid score first, whose
+    cosine similarity (vector_score) is at or above threshold.
+    With diversity > 0 the list is re-ranked by maximal marginal relevance, trading
+    relevance for mentors that are less similar to the ones already picked.
+    """
+    pool_size = k if diversity <= 0 else max(k * 4, MENTOR_HYBRID_CANDIDATES)
+    matches = [m for m in hybrid_search_mentors(user_message, student_info, k=pool_size, filters=filters)
+               if m["vector_score"] >= threshold]
+    if diversity > 0 and len(matches) > k:
+        matches = _mmr_rerank(matches, k, diversity)
+    return [(m["mentor_id"], m["score"]) for m in matches[:k]]
 
-    if best_score >= MENTOR_RECOMMENDATION_THRESHOLD:
-        return best_mentor, best_score
-    return None, best_score
+def _mmr_rerank(matches, k, diversity):
+    vectors = MENTOR_INDEX.vectors_for([m["mentor_id"] for m in matches])
+    similarity = vectors @ vectors.T
+    relevance = np.array([m["score"] for m in matches], dtype=np.float32)
+
+    selected = [0]
+    remaining = list(range(1, len(matches)))
+    while remaining and len(selected) < k:
+        redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        mmr = (1 - diversity) * relevance[remaining] - diversity * redundancy
+        selected.append(remaining.pop(int(np.argmax(mmr))))
+    return [matches[i] for i in selected]
+
+def recommend_mentor(user_message, student_info, filters=None):
+    matches = hybrid_search_mentors(user_message, student_info, k=1, filters=filters)
+    if not matches:
+        return None, 0.0
+    best = matches[0]
+
+    if best["vector_score"] >= MENTOR_RECOMMENDATION_THRESHOLD:
+        return best["mentor_id"], best["score"]
+    return None, best["score"]
 
 def generate_mentor_reason(mentor_id, user_message):
     prompt = (
@@ -51,11 +183,12 @@ def generate_mentor_reason(mentor_id, user_message):
         "If you lack details, be generic. Be friendly."
     )
 
-    response = openai.chat.completions.create(
+    response = chat_completion(
         model="gpt-3.5-turbo",  # or "gpt-4"
         messages=[{"role": "system", "content": prompt}],
         max_tokens=50,
-        temperature=0.7
+        temperature=0.7,
+        priority=BACKGROUND
     )
     return response.choices[0].message.content.strip()
 
@@ -73,28 +206,55 @@ MENTOR_REQUEST_EXAMPLES = [
 def get_text_embedding(text):
     """Get OpenAI embedding vector for a given text."""
     try:
-        response = openai.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        return np.array(response.data[0].embedding)
+        return embed_text(text)
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return None
 
+MENTOR_REQUEST_THRESHOLD = 0.85
+
+_mentor_request_index = None
+_mentor_request_lock = threading.Lock()
+
+def get_mentor_request_index():
+    """
+    Returns the MENTOR_REQUEST_EXAMPLES embeddings as one normalized matrix.
+    They are loaded from the binary store next to the mentor embeddings, or
+    embedded in a single call and persisted if the examples changed.
+    """
+    global _mentor_request_index
+    if _mentor_request_index is not None:
+        return _mentor_request_index
+    with _mentor_request_lock:
+        if _mentor_request_index is not None:
+            return _mentor_request_index
+        store = load_mentor_request_example_embeddings()
+        if store is not None and store[0] == MENTOR_REQUEST_EXAMPLES:
+            _mentor_request_index = MentorIndex(*store)
+            return _mentor_request_index
+        try:
+            matrix = np.array(embed_texts(MENTOR_REQUEST_EXAMPLES), dtype=np.float32)
+        except Exception as e:
+            print(f"Error embedding mentor request examples: {e}")
+            return None
+        try:
+            save_mentor_request_example_embeddings(MENTOR_REQUEST_EXAMPLES, matrix)
+        except OSError as e:
+            print(f"Error saving mentor request example embeddings: {e}")
+        _mentor_request_index = MentorIndex(MENTOR_REQUEST_EXAMPLES, matrix)
+        return _mentor_request_index
+
 def is_explicit_mentor_request(user_message):
     """Compares user input to predefined mentor request examples using embeddings."""
+    if "mentor" in user_message.lower():
+        return True  # Literal keyword, no embedding needed
+
+    example_index = get_mentor_request_index()
+    if example_index is None or len(example_index) == 0:
+        return False
+
     user_embedding = get_text_embedding(user_message)
     if user_embedding is None:
         return False  # If embedding fails, fall back to default
 
-    threshold = 0.85  # Define similarity threshold
-
-    for example in MENTOR_REQUEST_EXAMPLES:
-        example_embedding = get_text_embedding(example)
-        if example_embedding is not None:
-            similarity = np.dot(user_embedding, example_embedding) / (np.linalg.norm(user_embedding) * np.linalg.norm(example_embedding))
-            if similarity >= threshold:
-                return True  # User message is likely a mentor request
-
-    return False  # Default to False if no match
+    return float(example_index.scores(user_embedding).max()) >= MENTOR_REQUEST_THRESHOLD
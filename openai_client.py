@@ -0,0 +1,301 @@
+"""
+One pooled OpenAI client per process, with per-call deadlines, retries
+with exponential backoff and full jitter on 429/5xx/timeouts, and optional
+hedging. A hedged call fires a duplicate request when the first has not
+answered within the p95 latency observed for that model and latency_key
+(the call class: short classifiers and full replies are tracked apart),
+and takes whichever finishes first; the duplicate shares the original
+deadline. Every attempt first takes capacity from the
+per-model token buckets in rate_limiter.py; pass priority=BACKGROUND for
+calls the student is not waiting on.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+import openai
+
+from rate_limiter import BACKGROUND, INTERACTIVE, RATE_LIMITER, estimate_tokens
+
+OPENAI_DEADLINE = 30.0           # default per-call budget in seconds, across retries
+SHORT_CALL_DEADLINE = 10.0       # classifiers, routers and other small JSON calls
+OPENAI_CONNECT_TIMEOUT = 5.0
+OPENAI_MAX_RETRIES = 3
+OPENAI_BACKOFF_BASE = 0.5
+OPENAI_BACKOFF_CAP = 8.0
+OPENAI_MAX_CONNECTIONS = 100
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 20
+OPENAI_KEEPALIVE_EXPIRY = 30.0
+RETRYABLE_STATUS_CODES = frozenset((408, 409, 429, 500, 502, 503, 504))
+
+OPENAI_HEDGING = True            # kill switch for every hedge=True call site
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_DELAY = 2.0        # used until HEDGE_MIN_SAMPLES latencies are recorded
+HEDGE_WINDOW = 200
+
+_client_lock = threading.Lock()
+_client = None
+_async_client = None
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="openai-hedge")
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout():
+    return httpx.Timeout(OPENAI_DEADLINE, connect=OPENAI_CONNECT_TIMEOUT)
+
+
+def get_client():
+    """The process-wide openai.OpenAI client (retries are done here, not by the SDK)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = openai.OpenAI(
+                    api_key=openai.api_key,
+                    max_retries=0,
+                    timeout=_timeout(),
+                    http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+                )
+    return _client
+
+
+def get_async_client():
+    """The process-wide openai.AsyncOpenAI client, for asgi_app.py."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = openai.AsyncOpenAI(
+                    api_key=openai.api_key,
+                    max_retries=0,
+                    timeout=_timeout(),
+                    http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+                )
+    return _async_client
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per key (e.g. "chat:gpt-4o")."""
+
+    def __init__(self, window=HEDGE_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key, pct):
+        with self._lock:
+            samples = sorted(self._samples[key])
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(pct * len(samples)))]
+
+    def hedge_delay(self, key):
+        with self._lock:
+            enough = len(self._samples[key]) >= HEDGE_MIN_SAMPLES
+        return self.percentile(key, HEDGE_PERCENTILE) if enough else HEDGE_DEFAULT_DELAY
+
+    def stats(self):
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            key: {"p50": self.percentile(key, 0.5), "p95": self.percentile(key, 0.95), "samples": len(self._samples[key])}
+            for key in keys
+        }
+
+
+LATENCY = LatencyTracker()
+
+
+def is_retryable(error):
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def backoff_delay(attempt, error=None):
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(OPENAI_BACKOFF_CAP, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(OPENAI_BACKOFF_CAP, OPENAI_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _settle(kwargs, estimated, result):
+    """Gives back the part of the token estimate the response did not use."""
+    usage = getattr(result, "usage", None)
+    used = getattr(usage, "total_tokens", None)
+    if isinstance(used, int):
+        RATE_LIMITER.refund(kwargs.get("model"), estimated - used)
+
+
+def _call_with_retries(create, kwargs, deadline_at, key, priority=INTERACTIVE):
+    estimated = estimate_tokens(kwargs)
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        RATE_LIMITER.acquire(kwargs.get("model"), estimated, priority, deadline_at)
+        started = time.monotonic()
+        try:
+            result = create(timeout=max(0.1, deadline_at - started), **kwargs)
+        except Exception as e:
+            if not is_retryable(e) or attempt == OPENAI_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, e)
+            if time.monotonic() + delay >= deadline_at:
+                raise
+            print(f"OpenAI {key} failed ({e.__class__.__name__}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        if kwargs.get("stream"):
+            return _settled_stream(result, kwargs, estimated, key, started)
+        LATENCY.record(key, time.monotonic() - started)
+        _settle(kwargs, estimated, result)
+        return result
+
+
+def _settled_stream(stream, kwargs, estimated, key, started):
+    """
+    Yields a streamed response's chunks. Once the stream has been read to the
+    end, records its latency and settles on the usage in its final chunk
+    (chat streams ask for one with stream_options.include_usage).
+    """
+    usage_chunk = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage_chunk = chunk
+        yield chunk
+    LATENCY.record(key, time.monotonic() - started)
+    if usage_chunk is not None:
+        _settle(kwargs, estimated, usage_chunk)
+
+
+async def _asettled_stream(stream, kwargs, estimated, key, started):
+    """_settled_stream for an async stream."""
+    usage_chunk = None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage_chunk = chunk
+        yield chunk
+    LATENCY.record(key, time.monotonic() - started)
+    if usage_chunk is not None:
+        _settle(kwargs, estimated, usage_chunk)
+
+
+def _with_stream_usage(kwargs):
+    if kwargs.get("stream") and "stream_options" not in kwargs:
+        return dict(kwargs, stream_options={"include_usage": True})
+    return kwargs
+
+
+def _hedged(key, call):
+    first = _hedge_executor.submit(call)
+    done, _ = wait([first], timeout=LATENCY.hedge_delay(key))
+    if done:
+        return first.result()
+    pending = {first, _hedge_executor.submit(call)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()  # the slower duplicate finishes in the background
+            error = future.exception()
+    raise error
+
+
+def _deadline_at(deadline):
+    return time.monotonic() + (deadline or OPENAI_DEADLINE)
+
+
+def _latency_key(kind, kwargs, latency_key):
+    return f"{kind}:{kwargs.get('model')}:{latency_key or 'default'}"
+
+
+def _run(create, key, deadline, hedge, priority, kwargs):
+    deadline_at = _deadline_at(deadline)
+    call = lambda: _call_with_retries(create, kwargs, deadline_at, key, priority)
+    if hedge and OPENAI_HEDGING and not kwargs.get("stream"):
+        return _hedged(key, call)
+    return call()
+
+
+def chat_completion(deadline=None, hedge=False, priority=INTERACTIVE, latency_key=None, **kwargs):
+    """client.chat.completions.create with a deadline (seconds), retries and optional hedging."""
+    key = _latency_key("chat", kwargs, latency_key)
+    return _run(get_client().chat.completions.create, key, deadline, hedge, priority, _with_stream_usage(kwargs))
+
+
+def create_embeddings(deadline=None, hedge=False, priority=INTERACTIVE, latency_key=None, **kwargs):
+    """client.embeddings.create with a deadline (seconds), retries and optional hedging."""
+    key = _latency_key("embeddings", kwargs, latency_key)
+    return _run(get_client().embeddings.create, key, deadline, hedge, priority, kwargs)
+
+
+async def _acall_with_retries(create, kwargs, deadline_at, key, priority=INTERACTIVE):
+    estimated = estimate_tokens(kwargs)
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        await RATE_LIMITER.acquire_async(kwargs.get("model"), estimated, priority, deadline_at)
+        started = time.monotonic()
+        try:
+            result = await create(timeout=max(0.1, deadline_at - started), **kwargs)
+        except Exception as e:
+            if not is_retryable(e) or attempt == OPENAI_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, e)
+            if time.monotonic() + delay >= deadline_at:
+                raise
+            print(f"OpenAI {key} failed ({e.__class__.__name__}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        if kwargs.get("stream"):
+            return _asettled_stream(result, kwargs, estimated, key, started)
+        LATENCY.record(key, time.monotonic() - started)
+        _settle(kwargs, estimated, result)
+        return result
+
+
+async def achat_completion(deadline=None, hedge=False, priority=INTERACTIVE, latency_key=None, **kwargs):
+    """Async chat_completion on the AsyncOpenAI client; a hedge's losing request is cancelled."""
+    key = _latency_key("chat", kwargs, latency_key)
+    kwargs = _with_stream_usage(kwargs)
+    deadline_at = _deadline_at(deadline)
+    create = get_async_client().chat.completions.create
+    if not (hedge and OPENAI_HEDGING and not kwargs.get("stream")):
+        return await _acall_with_retries(create, kwargs, deadline_at, key, priority)
+
+    first = asyncio.ensure_future(_acall_with_retries(create, kwargs, deadline_at, key, priority))
+    done, _ = await asyncio.wait({first}, timeout=LATENCY.hedge_delay(key))
+    if done:
+        return first.result()
+    pending = {first, asyncio.ensure_future(_acall_with_retries(create, kwargs, deadline_at, key, priority))}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
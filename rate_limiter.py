@@ -0,0 +1,177 @@
+"""
+Client-side token buckets for OpenAI calls, one pair (requests/min and
+tokens/min) per model. Interactive calls (the reply the student is waiting
+for) may drain a bucket completely; background calls (goal extraction,
+mentor reasons) stop at BACKGROUND_RESERVE of capacity, so under a burst
+the background work slows down first instead of everything failing.
+
+Buckets live in the process by default. Set RATE_LIMIT_STATE_PATH to a
+local file to share them across worker processes (fcntl lock).
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; the shared mode is then disabled
+    fcntl = None
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Per-model limits; set these to the organization's quota.
+MODEL_RATE_LIMITS = {
+    "gpt-4": {"rpm": 500, "tpm": 30000},
+    "gpt-4o": {"rpm": 500, "tpm": 30000},
+    "gpt-3.5-turbo": {"rpm": 500, "tpm": 200000},
+    "text-embedding-ada-002": {"rpm": 3000, "tpm": 1000000},
+}
+DEFAULT_RATE_LIMIT = {"rpm": 500, "tpm": 30000}
+BACKGROUND_RESERVE = 0.25        # share of each bucket only interactive calls may use
+RATE_LIMIT_STATE_PATH = os.environ.get("RATE_LIMIT_STATE_PATH")
+MAX_POLL_SECONDS = 0.25
+CHARS_PER_TOKEN = 4
+
+
+class RateLimitTimeout(Exception):
+    """The call could not get capacity before its deadline."""
+
+
+def estimate_tokens(kwargs):
+    """Rough token count of a chat or embeddings request: prompt chars / 4 plus max_tokens."""
+    chars = 0
+    for message in kwargs.get("messages") or []:
+        content = message.get("content")
+        chars += len(content) if isinstance(content, str) else len(json.dumps(content))
+    inputs = kwargs.get("input")
+    if isinstance(inputs, str):
+        chars += len(inputs)
+    elif inputs:
+        chars += sum(len(text) for text in inputs)
+    return chars // CHARS_PER_TOKEN + 1 + (kwargs.get("max_tokens") or 0)
+
+
+def _limits_for(model):
+    return MODEL_RATE_LIMITS.get(model, DEFAULT_RATE_LIMIT)
+
+
+def _refill(state, limits, now):
+    """Brings a {"requests", "tokens", "updated"} bucket state up to now."""
+    if state is None:
+        return {"requests": float(limits["rpm"]), "tokens": float(limits["tpm"]), "updated": now}
+    elapsed = max(0.0, now - state["updated"])
+    state["requests"] = min(limits["rpm"], state["requests"] + elapsed * limits["rpm"] / 60.0)
+    state["tokens"] = min(limits["tpm"], state["tokens"] + elapsed * limits["tpm"] / 60.0)
+    state["updated"] = now
+    return state
+
+
+def _take(state, limits, tokens, priority):
+    """Takes one request and `tokens` from the bucket; returns 0 or the seconds to wait."""
+    floor = BACKGROUND_RESERVE if priority == BACKGROUND else 0.0
+    # A single call larger than the whole bucket is let through once the bucket is full.
+    tokens = min(tokens, limits["tpm"] * (1 - floor))
+    need_requests = 1 + floor * limits["rpm"] - state["requests"]
+    need_tokens = tokens + floor * limits["tpm"] - state["tokens"]
+    if need_requests <= 0 and need_tokens <= 0:
+        state["requests"] -= 1
+        state["tokens"] -= tokens
+        return 0.0
+    return max(need_requests * 60.0 / limits["rpm"], need_tokens * 60.0 / limits["tpm"])
+
+
+class TokenBucketLimiter:
+    def __init__(self, state_path=None):
+        self.state_path = state_path if fcntl is not None else None
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._stats = {"granted": 0, "waited_seconds": 0.0, "timeouts": 0}
+
+    def _try_acquire(self, model, tokens, priority):
+        limits = _limits_for(model)
+        if self.state_path:
+            return self._try_acquire_shared(model, limits, tokens, priority)
+        with self._lock:
+            state = _refill(self._buckets.get(model), limits, time.monotonic())
+            self._buckets[model] = state
+            return _take(state, limits, tokens, priority)
+
+    def _update_shared(self, model, limits, change):
+        """Runs change(state) on the model's bucket in the shared file under an exclusive lock."""
+        with open(self.state_path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                buckets = json.loads(raw) if raw.strip() else {}
+                state = _refill(buckets.get(model), limits, time.time())
+                result = change(state)
+                buckets[model] = state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(buckets))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return result
+
+    def _try_acquire_shared(self, model, limits, tokens, priority):
+        return self._update_shared(model, limits, lambda state: _take(state, limits, tokens, priority))
+
+    def acquire(self, model, tokens, priority=INTERACTIVE, deadline_at=None):
+        """
+        Blocks until the model's buckets have room for one request of `tokens`.
+        deadline_at is a time.monotonic() value; raises RateLimitTimeout past it.
+        """
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire(model, tokens, priority)
+            if wait == 0:
+                with self._lock:
+                    self._stats["granted"] += 1
+                    self._stats["waited_seconds"] += time.monotonic() - started
+                return
+            if deadline_at is not None and time.monotonic() + min(wait, MAX_POLL_SECONDS) >= deadline_at:
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise RateLimitTimeout(f"No {priority} capacity for {model} before the deadline")
+            time.sleep(min(wait, MAX_POLL_SECONDS) * random.uniform(0.8, 1.2))
+
+    async def acquire_async(self, model, tokens, priority=INTERACTIVE, deadline_at=None):
+        while True:
+            if self.state_path:
+                # The shared file lock can block; keep it off the event loop.
+                wait = await asyncio.to_thread(self._try_acquire, model, tokens, priority)
+            else:
+                wait = self._try_acquire(model, tokens, priority)
+            if wait == 0:
+                return
+            if deadline_at is not None and time.monotonic() + min(wait, MAX_POLL_SECONDS) >= deadline_at:
+                raise RateLimitTimeout(f"No {priority} capacity for {model} before the deadline")
+            await asyncio.sleep(min(wait, MAX_POLL_SECONDS) * random.uniform(0.8, 1.2))
+
+    def refund(self, model, tokens):
+        """Returns over-estimated tokens once the response reports actual usage."""
+        if tokens <= 0:
+            return
+        limits = _limits_for(model)
+        if self.state_path:
+            def give_back(state):
+                state["tokens"] = min(limits["tpm"], state["tokens"] + tokens)
+            self._update_shared(model, limits, give_back)
+            return
+        with self._lock:
+            state = self._buckets.get(model)
+            if state is not None:
+                state["tokens"] = min(limits["tpm"], state["tokens"] + tokens)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+RATE_LIMITER = TokenBucketLimiter(RATE_LIMIT_STATE_PATH)
@@ -0,0 +1,219 @@
+"""
+Response cache for deterministic (temperature 0) chat completions. Call
+sites opt in by calling cached_chat_completion with a cache name instead of
+chat_completion.
+
+Exact tier: keyed by (model, hash of the normalized prompt and parameters).
+Semantic tier (opt-in per call via semantic_text): the call's messages are
+templates with SEMANTIC_SLOT where semantic_text (usually the student's
+message) goes. When the templates are identical, a prior answer is reused if
+the embedding of semantic_text is within SEMANTIC_CACHE_THRESHOLD cosine
+similarity of a cached one. Only short texts without a negation use it
+(semantic_eligible); anything else costs no embeddings call and is cached
+exactly. semantic_cache_benchmark.py checks the threshold on labelled pairs.
+
+Entries expire after their TTL and the least recently used are evicted
+beyond RESPONSE_CACHE_SIZE.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_utils import embed_text
+from openai_client import chat_completion
+
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_SIZE = 2048
+RESPONSE_CACHE_TTL = 3600.0
+# ada-002 similarities are compressed near the top; short replies such as
+# "yes" and "no" can score above 0.9, so the bar is high.
+SEMANTIC_CACHE_THRESHOLD = 0.97
+# Longer messages rarely repeat closely enough to hit, so they skip the embeddings call.
+SEMANTIC_CACHE_MAX_WORDS = 8
+# "yes" and "not yes" embed almost identically; a negation keeps a text out of the semantic tier.
+_NEGATION = re.compile(
+    r"\b(no|not|never|none|nope|nah|neither|nor|without|cannot|cant|dont|doesnt|didnt|isnt|wont|wouldnt)\b|\w+n't\b",
+    re.IGNORECASE,
+)
+# Marks where semantic_text goes in a call's messages; write it into prompts with f"{SEMANTIC_SLOT}".
+SEMANTIC_SLOT = "{semantic_text}"
+
+
+def normalize_prompt(text):
+    return re.sub(r"\s+", " ", str(text)).strip().casefold()
+
+
+def _digest(model, messages, params):
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def semantic_eligible(text):
+    """Whether text may be answered from (and stored in) the semantic tier."""
+    return bool(text) and len(text.split()) <= SEMANTIC_CACHE_MAX_WORDS and not _NEGATION.search(text)
+
+
+def fill_semantic_slot(messages, semantic_text):
+    """The messages with semantic_text put in place of SEMANTIC_SLOT."""
+    return [dict(m, content=m["content"].replace(SEMANTIC_SLOT, semantic_text))
+            if isinstance(m.get("content"), str) else m for m in messages]
+
+
+def cache_keys(kwargs, semantic_text=None):
+    """
+    Returns (exact_key, semantic_bucket) for a call whose messages are still
+    templates. The exact key covers the filled-in prompt; the bucket hashes
+    the templates alone, so only calls differing in semantic_text share it.
+    """
+    model = kwargs.get("model")
+    params = {k: v for k, v in kwargs.items() if k not in ("model", "messages")}
+    templates = kwargs.get("messages", [])
+    filled = fill_semantic_slot(templates, semantic_text) if semantic_text else templates
+    messages = [(m.get("role"), normalize_prompt(m.get("content", ""))) for m in filled]
+    exact_key = _digest(model, messages, params)
+    if not semantic_text:
+        return exact_key, None
+    masked = [(m.get("role"), normalize_prompt(m.get("content", ""))) for m in templates]
+    return exact_key, _digest(model, masked, params)
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU store of completion responses, with per-bucket embeddings."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, response, bucket, vector)
+        self._buckets = {}              # bucket -> set of keys
+        self._stats = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def _drop(self, key):
+        _, _, bucket, _ = self._entries.pop(key)
+        if bucket is not None:
+            keys = self._buckets.get(bucket)
+            keys.discard(key)
+            if not keys:
+                del self._buckets[bucket]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def get_similar(self, bucket, vector, threshold=SEMANTIC_CACHE_THRESHOLD):
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_score = None, threshold
+            for key in list(self._buckets.get(bucket, ())):
+                expires_at, _, _, cached_vector = self._entries[key]
+                if expires_at < now:
+                    self._drop(key)
+                    continue
+                score = float(np.dot(vector, cached_vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self._stats["semantic_hits"] += 1
+            return self._entries[best_key][1]
+
+    def put(self, key, response, ttl=RESPONSE_CACHE_TTL, bucket=None, vector=None):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if vector is None:
+                bucket = None
+            self._entries[key] = (time.monotonic() + ttl, response, bucket, vector)
+            if bucket is not None:
+                self._buckets.setdefault(bucket, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def record_miss(self):
+        with self._lock:
+            self._stats["misses"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+RESPONSE_CACHE = ResponseCache()
+
+
+def _semantic_vector(text):
+    try:
+        vector = np.asarray(embed_text(normalize_prompt(text)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+    except Exception as e:
+        print("Semantic cache embedding failed:", e)
+        return None
+
+
+def json_reply(response):
+    """validate= for call sites that json.loads the reply."""
+    json.loads(response.choices[0].message.content.strip())
+    return True
+
+
+def _valid(validate, response):
+    try:
+        return bool(validate(response))
+    except Exception:
+        return False
+
+
+def cached_chat_completion(cache_name, semantic_text=None, ttl=RESPONSE_CACHE_TTL,
+                           threshold=SEMANTIC_CACHE_THRESHOLD, validate=None, **kwargs):
+    """
+    chat_completion through RESPONSE_CACHE. cache_name separates call sites.
+    Only temperature-0, non-streaming calls are cached; anything else passes
+    straight through. With semantic_text, the messages carry SEMANTIC_SLOT
+    where that text belongs. With validate, a reply is only cached when
+    validate(response) returns True (raising counts as False), so a
+    malformed reply is asked for again next time instead of served again.
+    """
+    templates = kwargs.get("messages", [])
+    if semantic_text is not None:
+        kwargs = dict(kwargs, messages=fill_semantic_slot(templates, semantic_text))
+    if not RESPONSE_CACHE_ENABLED or kwargs.get("temperature", 1) != 0 or kwargs.get("stream"):
+        return chat_completion(**kwargs)
+
+    call_kwargs = {k: v for k, v in kwargs.items() if k not in ("deadline", "hedge", "priority", "latency_key")}
+    exact_key, bucket = cache_keys(dict(call_kwargs, messages=templates), semantic_text)
+    exact_key = f"{cache_name}:{exact_key}"
+    cached = RESPONSE_CACHE.get(exact_key)
+    if cached is not None:
+        return cached
+
+    vector = None
+    if bucket is not None and semantic_eligible(semantic_text):
+        bucket = f"{cache_name}:{bucket}"
+        vector = _semantic_vector(semantic_text)
+        if vector is not None:
+            cached = RESPONSE_CACHE.get_similar(bucket, vector, threshold)
+            if cached is not None:
+                return cached
+
+    RESPONSE_CACHE.record_miss()
+    response = chat_completion(**kwargs)
+    if validate is None or _valid(validate, response):
+        RESPONSE_CACHE.put(exact_key, response, ttl, bucket, vector)
+    return response
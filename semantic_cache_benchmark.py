@@ -0,0 +1,61 @@
+"""
+Checks SEMANTIC_CACHE_THRESHOLD against the labelled pairs in
+data/semantic_cache_pairs.json: each pair is a cached message and an incoming
+one, labelled same when the cached answer is right for the incoming message.
+Reports, per threshold, the share of same-meaning pairs the semantic tier
+would reuse and the wrong reuses among the rest (which must stay at zero).
+Pairs that semantic_eligible() keeps out of the tier, such as negations, are
+counted separately and never embedded.
+
+Usage:
+    python semantic_cache_benchmark.py [--thresholds 0.93,0.95,0.97,0.98]
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from embedding_utils import embed_texts
+from response_cache import SEMANTIC_CACHE_THRESHOLD, normalize_prompt, semantic_eligible
+
+SEMANTIC_CACHE_PAIRS_PATH = os.path.join("data", "semantic_cache_pairs.json")
+
+
+def run(thresholds, verbose):
+    with open(SEMANTIC_CACHE_PAIRS_PATH, "r") as f:
+        pairs = json.load(f)
+
+    eligible = [p for p in pairs if semantic_eligible(p["cached"]) and semantic_eligible(p["incoming"])]
+    excluded = len(pairs) - len(eligible)
+    texts = list(dict.fromkeys(normalize_prompt(t) for p in eligible for t in (p["cached"], p["incoming"])))
+    vectors = np.array(embed_texts(texts), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    row = {text: i for i, text in enumerate(texts)}
+    scores = [float(vectors[row[normalize_prompt(p["cached"])]] @ vectors[row[normalize_prompt(p["incoming"])]])
+              for p in eligible]
+
+    same = [score for p, score in zip(eligible, scores) if p["same"]]
+    different = [score for p, score in zip(eligible, scores) if not p["same"]]
+    print(f"labelled pairs:            {len(pairs)} ({excluded} kept out of the semantic tier)")
+    print(f"same / different:          {len(same)} / {len(different)}")
+    if different:
+        print(f"max different similarity:  {max(different):.4f}")
+    print(f"  {'threshold':<12}{'reused':>10}{'wrong':>10}")
+    for threshold in thresholds:
+        reused = sum(score >= threshold for score in same)
+        wrong = sum(score >= threshold for score in different)
+        marker = "  <- SEMANTIC_CACHE_THRESHOLD" if threshold == SEMANTIC_CACHE_THRESHOLD else ""
+        print(f"  {threshold:<12.3f}{reused / len(same) if same else 0.0:>10.0%}{wrong:>10}{marker}")
+    if verbose:
+        for p, score in sorted(zip(eligible, scores), key=lambda item: -item[1]):
+            print(f"  {score:.4f} {'same' if p['same'] else 'diff'} {p['cached']!r} / {p['incoming']!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the semantic cache threshold on labelled pairs.")
+    parser.add_argument("--thresholds", default=f"0.93,0.95,{SEMANTIC_CACHE_THRESHOLD},0.98",
+                        help="Comma-separated cosine thresholds to report.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List every eligible pair with its similarity.")
+    args = parser.parse_args()
+    run(sorted({float(t) for t in args.thresholds.split(",")}), args.verbose)
@@ -0,0 +1,92 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class StageGraph:
+    """
+    Runs the stages of a chat turn on a thread pool as soon as the stages they
+    depend on have finished, so independent LLM / Firestore calls overlap and
+    wall-clock time follows the critical path. Each stage function receives
+    its dependencies' results as positional arguments, in the order listed.
+
+        graph = StageGraph(executor)
+        graph.add("history", optimize)
+        graph.add("reply", reply, after=("history",))
+        graph.start()
+        graph.result("reply")
+
+    A stage that raises fails every stage depending on it; result() re-raises.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.timings = {}
+        self._stages = {}
+        self._futures = {}
+        self._submitted = set()
+        self._lock = threading.Lock()
+        self._started_at = None
+
+    def add(self, name, fn, after=()):
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        for dependency in after:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'")
+        self._stages[name] = (fn, tuple(after))
+        self._futures[name] = Future()
+        return self
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        with self._lock:
+            ready = [name for name, (_, after) in self._stages.items() if not after]
+            self._submitted.update(ready)
+        for name in ready:
+            self.executor.submit(self._run_stage, name)
+        return self
+
+    def _run_stage(self, name):
+        fn, after = self._stages[name]
+        future = self._futures[name]
+        started = time.perf_counter()
+        error = result = None
+        try:
+            result = fn(*[self._futures[dependency].result() for dependency in after])
+        except BaseException as e:
+            error = e
+        finished = time.perf_counter()
+        # Timings first, so they are complete by the time a waiter sees the result.
+        with self._lock:
+            self.timings[name] = {
+                "start": round(started - self._started_at, 4),
+                "seconds": round(finished - started, 4),
+            }
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        with self._lock:
+            ready = [
+                dependent for dependent, (_, deps) in self._stages.items()
+                if dependent not in self._submitted and name in deps
+                and all(self._futures[d].done() for d in deps)
+            ]
+            self._submitted.update(ready)
+        for dependent in ready:
+            self.executor.submit(self._run_stage, dependent)
+
+    def result(self, name, timeout=None):
+        return self._futures[name].result(timeout=timeout)
+
+    def wait(self, timeout=None):
+        """Waits for every stage and returns {name: result}; re-raises the first failure."""
+        return {name: future.result(timeout=timeout) for name, future in self._futures.items()}
+
+    def summary(self):
+        """One line of per-stage timings, e.g. "history=0.002s reply=1.913s (wall 1.915s)"."""
+        with self._lock:
+            parts = [f"{name}={timing['seconds']:.3f}s" for name, timing in self.timings.items()]
+            wall = max((t["start"] + t["seconds"] for t in self.timings.values()), default=0.0)
+        return f"{' '.join(parts)} (wall {wall:.3f}s)"
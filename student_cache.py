@@ -0,0 +1,111 @@
+"""
+In-process read-through cache of student documents for the read-only
+dashboard endpoints (goals, topics, starters, bio). Every write path
+(save/update_student_data, StudentSession.commit) invalidates the entry,
+so a process never serves its own stale writes; writes from other worker
+processes are bounded by STUDENT_CACHE_TTL. (A Firestore listener would see
+them sooner, but every worker would be billed a read for every student write.)
+
+Chat turns keep reading Firestore directly: they need the latest document.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+STUDENT_CACHE_SIZE = 1024
+STUDENT_CACHE_TTL = 30.0
+
+
+class StudentCache:
+    """
+    LRU + TTL map of (student_id, fields) -> document dict, where fields is
+    the field mask the document was read with (None for the whole document).
+    Every read is tagged with a cache-wide version; invalidation stamps the
+    student with a newer one, so every cached projection of that student goes
+    stale at once and a read that raced the write cannot cache the pre-write
+    document. Stamps are dropped once they are older than the TTL: by then
+    every entry they could outdate has expired, and put() refuses reads that
+    started that long ago.
+    """
+
+    def __init__(self, max_entries=STUDENT_CACHE_SIZE, ttl=STUDENT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()       # (student_id, fields) -> (expires_at, version, data)
+        self._version = 0
+        self._invalidated = OrderedDict()   # student_id -> (version, invalidated_at), oldest first
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _stale(self, student_id, version):
+        stamp = self._invalidated.get(student_id)
+        return stamp is not None and stamp[0] > version
+
+    def get(self, student_id, fields=None):
+        """Returns (data or None, token); pass the token back to put()."""
+        key = (student_id, fields)
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= now and not self._stale(student_id, entry[1]):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[2], (self._version, now)
+            if entry is not None:
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return None, (self._version, now)
+
+    def put(self, student_id, data, token, fields=None):
+        version, read_at = token
+        key = (student_id, fields)
+        with self._lock:
+            now = time.monotonic()
+            if now - read_at > self.ttl or self._stale(student_id, version):
+                return
+            self._entries[key] = (now + self.ttl, version, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, student_id):
+        with self._lock:
+            now = time.monotonic()
+            self._entries.pop((student_id, None), None)
+            self._version += 1
+            self._invalidated[student_id] = (self._version, now)
+            self._invalidated.move_to_end(student_id)
+            while self._invalidated:
+                oldest, (_, invalidated_at) = next(iter(self._invalidated.items()))
+                if now - invalidated_at <= self.ttl:
+                    break
+                del self._invalidated[oldest]
+            self._stats["invalidations"] += 1
+
+    def read_through(self, student_id, load, fields=None):
+        """
+        The cached document, or load(student_id) cached for next time. fields
+        (a tuple) keys a projected read separately. Treat the result as read-only.
+        """
+        data, token = self.get(student_id, fields)
+        if data is None:
+            data = load(student_id)
+            if data is not None:
+                self.put(student_id, data, token, fields)
+        return data
+
+    async def read_through_async(self, student_id, load, fields=None):
+        data, token = self.get(student_id, fields)
+        if data is None:
+            data = await load(student_id)
+            if data is not None:
+                self.put(student_id, data, token, fields)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), invalidated=len(self._invalidated))
+
+
+STUDENT_CACHE = StudentCache()
+
@@ -0,0 +1,217 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import Conflict, FailedPrecondition
+
+from student_cache import STUDENT_CACHE
+
+STUDENTS_COLLECTION = "students"
+MESSAGES_COLLECTION = "messages"
+COMMIT_ATTEMPTS = 5
+COMMIT_BACKOFF = 0.05
+# Commit errors meaning another writer got there first: re-read and replay.
+COMMIT_CONFLICTS = (Conflict, FailedPrecondition)
+
+
+def message_doc_id(seq):
+    """Zero-padded so the messages subcollection also sorts by document id."""
+    return f"{seq:010d}"
+
+
+class StudentSession:
+    """
+    Unit of work for one student document: read once, change in memory,
+    write once. Every change goes through set/update/add_topic/add_goal/
+    append_message/set_conversation so commit() knows what to send; a
+    student that did not exist yet is created with a single create().
+
+        session = StudentSession.load(db, student_id, default=new_student_record)
+        session.add_topic("Talked to Athena about: ...")
+        session.append_message("user", user_message)
+        session.set_conversation(conversation, window=20)
+        session.commit()
+
+    Messages go to the append-only students/<id>/messages subcollection,
+    numbered by the parent's message_count; they are written in the same
+    batch as the parent update, so a turn's write cost does not grow with
+    the length of the history.
+
+    Commits are optimistic: the parent write is conditional on the
+    update_time the session was loaded at. When another turn for the same
+    student committed in between, the session re-reads the document,
+    replays its changes on top (topics and goals are merged, messages are
+    renumbered and appended after the other turn's, plain fields are last
+    writer wins) and tries again. Nothing is locked, so turns for different
+    students never wait on each other.
+
+    The same object works with Firestore's AsyncClient through load_async
+    and commit_async.
+    """
+
+    def __init__(self, db, ref, snapshot, default=None):
+        self.db = db
+        self.ref = ref
+        self._default = default
+        self._ops = []
+        self._messages = []
+        self._changed = set()
+        self.data = {}
+        self._reset(snapshot)
+
+    @classmethod
+    def load(cls, db, student_id, default=None):
+        ref = db.collection(STUDENTS_COLLECTION).document(student_id)
+        return cls(db, ref, ref.get(), default)
+
+    @classmethod
+    async def load_async(cls, db, student_id, default=None):
+        ref = db.collection(STUDENTS_COLLECTION).document(student_id)
+        return cls(db, ref, await ref.get(), default)
+
+    def _reset(self, snapshot):
+        """Takes snapshot as the base document; self.data keeps its identity for callers holding it."""
+        self.exists = snapshot.exists
+        self.update_time = snapshot.update_time if snapshot.exists else None
+        if snapshot.exists:
+            base = snapshot.to_dict()
+        else:
+            base = self._default() if self._default else {}
+        self.data.clear()
+        self.data.update(base)
+
+    def _apply(self, fields, op):
+        """Runs op(data, rebased) now and records it for replay after a conflicting commit."""
+        op(self.data, False)
+        self._ops.append(op)
+        self._changed.update(fields)
+
+    def get(self, field, default=None):
+        return self.data.get(field, default)
+
+    def set(self, field, value):
+        self._apply((field,), lambda data, rebased: data.__setitem__(field, value))
+
+    def set_if(self, field, value, condition):
+        """Sets field only while condition(data) holds; re-checked when replayed after a conflict."""
+        def op(data, rebased):
+            if condition(data):
+                data[field] = value
+        self._apply((field,), op)
+
+    def update(self, fields):
+        for field, value in fields.items():
+            self.set(field, value)
+
+    def add_topic(self, topic_sentence, limit=50):
+        def op(data, rebased):
+            data["topics"] = ([topic_sentence] + data.get("topics", []))[:limit]
+        self._apply(("topics",), op)
+        return self.data["topics"]
+
+    def add_goal(self, goal):
+        if goal in self.data.get("goals", []):
+            return False
+
+        def op(data, rebased):
+            goals = data.get("goals", [])
+            if goal not in goals:
+                data["goals"] = goals + [goal]
+        self._apply(("goals",), op)
+        return True
+
+    def append_message(self, role, content):
+        """Queues one message for the messages subcollection; returns its sequence number."""
+        message = {"role": role, "content": content, "created_at": datetime.now(timezone.utc)}
+
+        def op(data, rebased):
+            message["seq"] = data.get("message_count", 0) + 1
+            data["message_count"] = message["seq"]
+        self._messages.append(message)
+        self._apply(("message_count",), op)
+        return message["seq"]
+
+    def set_conversation(self, conversation, window):
+        """
+        Sets last_conversation to the last `window` messages of conversation.
+        After a conflict it becomes the other turn's window plus the messages
+        this session appended, so neither turn's messages are lost.
+        """
+        recent = conversation[-window:]
+
+        def op(data, rebased):
+            if rebased:
+                appended = [{"role": m["role"], "content": m["content"]} for m in self._messages]
+                data["last_conversation"] = (data.get("last_conversation", []) + appended)[-window:]
+            else:
+                data["last_conversation"] = recent
+        self._apply(("last_conversation",), op)
+
+    def _rebase(self, snapshot):
+        self._reset(snapshot)
+        for op in self._ops:
+            op(self.data, True)
+
+    def changes(self):
+        """The fields to write: everything for a new student, else only what changed."""
+        if not self.exists:
+            return dict(self.data)
+        return {field: self.data[field] for field in self._changed if field in self.data}
+
+    def has_changes(self):
+        return not self.exists or bool(self._changed) or bool(self._messages)
+
+    def _batch(self):
+        batch = self.db.batch()
+        if not self.exists:
+            batch.create(self.ref, self.changes())
+        elif self._changed:
+            batch.update(self.ref, self.changes(), option=self.db.write_option(last_update_time=self.update_time))
+        messages = self.ref.collection(MESSAGES_COLLECTION)
+        for message in self._messages:
+            batch.set(messages.document(message_doc_id(message["seq"])), message)
+        return batch
+
+    def _committed(self, results):
+        # The parent document's write always comes first in the batch.
+        self.update_time = results[0].update_time
+        self.exists = True
+        self._ops = []
+        self._messages = []
+        self._changed.clear()
+        STUDENT_CACHE.invalidate(self.ref.id)
+
+    def commit(self):
+        """
+        Writes the pending changes in one round trip, or one more read and
+        write per conflicting commit; a no-op when nothing changed.
+        """
+        if not self.has_changes():
+            return
+        for attempt in range(COMMIT_ATTEMPTS):
+            try:
+                results = self._batch().commit()
+                break
+            except COMMIT_CONFLICTS:
+                if attempt == COMMIT_ATTEMPTS - 1:
+                    raise
+                print(f"Student {self.ref.id} changed during the turn; merging and retrying the write")
+                time.sleep(random.uniform(0, COMMIT_BACKOFF * (2 ** attempt)))
+                self._rebase(self.ref.get())
+        self._committed(results)
+
+    async def commit_async(self):
+        if not self.has_changes():
+            return
+        for attempt in range(COMMIT_ATTEMPTS):
+            try:
+                results = await self._batch().commit()
+                break
+            except COMMIT_CONFLICTS:
+                if attempt == COMMIT_ATTEMPTS - 1:
+                    raise
+                print(f"Student {self.ref.id} changed during the turn; merging and retrying the write")
+                await asyncio.sleep(random.uniform(0, COMMIT_BACKOFF * (2 ** attempt)))
+                self._rebase(await self.ref.get())
+        self._committed(results)
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from mentor_index import IVFMentorIndex, MentorIndex, QuantizedMentorIndex, ivf_layout, quantize_int8
+
+K = 10
+
+
+@pytest.fixture(scope="module")
+def pool():
+    """Seeded, clustered unit vectors plus queries near random rows, like ann_benchmark.synthetic_pool."""
+    rng = np.random.default_rng(7)
+    n, dim, n_topics = 5000, 256, 40
+    centers = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    matrix = centers[rng.integers(0, n_topics, size=n)] + 0.9 * rng.standard_normal((n, dim), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    picks = rng.integers(0, n, size=50)
+    queries = matrix[picks] + 0.5 * rng.standard_normal((50, dim), dtype=np.float32) / np.sqrt(dim)
+    return np.arange(n), matrix, queries
+
+
+def top_ids(index, queries, **kwargs):
+    return [[mentor_id for mentor_id, _ in index.search(query, k=K, **kwargs)] for query in queries]
+
+
+def recall_at_k(approx, exact):
+    return sum(len(set(a) & set(e)) for a, e in zip(approx, exact)) / sum(len(e) for e in exact)
+
+
+def top1_overlap(approx, exact):
+    return sum(a[0] == e[0] for a, e in zip(approx, exact)) / len(exact)
+
+
+def test_quantized_matches_exact_search(pool):
+    ids, matrix, queries = pool
+    exact = top_ids(MentorIndex(ids, matrix, normalized=True), queries)
+    approx = top_ids(QuantizedMentorIndex(ids, matrix, normalized=True, quantization="int8"), queries)
+    assert recall_at_k(approx, exact) >= 0.98
+    assert top1_overlap(approx, exact) == 1.0
+
+
+def test_quantized_scores_are_exact_after_rerank(pool):
+    ids, matrix, queries = pool
+    exact = dict(MentorIndex(ids, matrix, normalized=True).search(queries[0], k=K))
+    for mentor_id, score in QuantizedMentorIndex(ids, matrix, normalized=True).search(queries[0], k=K):
+        if mentor_id in exact:
+            assert score == pytest.approx(exact[mentor_id], abs=1e-5)
+
+
+def test_ivf_with_quantization_matches_exact_when_probing_every_list(pool):
+    ids, matrix, queries = pool
+    exact = top_ids(MentorIndex(ids, matrix, normalized=True), queries)
+    index = IVFMentorIndex(ids, matrix, normalized=True, quantization="int8")
+    assert index.codes is not None
+    approx = top_ids(index, queries, nprobe=index.nlist)
+    assert recall_at_k(approx, exact) >= 0.98
+    assert top1_overlap(approx, exact) == 1.0
+
+
+def test_ivf_with_quantization_keeps_ivf_recall(pool):
+    ids, matrix, queries = pool
+    plain = IVFMentorIndex(ids, matrix, normalized=True, nprobe=8)
+    quantized = IVFMentorIndex(ids, matrix, normalized=True, nprobe=8, quantization="int8")
+    exact = top_ids(MentorIndex(ids, matrix, normalized=True), queries)
+    assert recall_at_k(top_ids(quantized, queries), exact) >= recall_at_k(top_ids(plain, queries), exact) - 0.02
+
+
+def test_ivf_from_saved_layout_uses_the_matrix_without_copying(pool):
+    ids, matrix, queries = pool
+    order, centroids, list_offsets = ivf_layout(matrix, seed=3)
+    grouped = np.ascontiguousarray(matrix[order])
+    index = IVFMentorIndex(ids[order], grouped, normalized=True, centroids=centroids, list_offsets=list_offsets)
+    assert np.shares_memory(index.matrix, grouped)
+    trained = IVFMentorIndex(ids, matrix, normalized=True, seed=3)
+    assert top_ids(index, queries) == top_ids(trained, queries)
+
+
+def test_ivf_rejects_a_layout_for_other_rows(pool):
+    ids, matrix, _ = pool
+    _, centroids, list_offsets = ivf_layout(matrix)
+    with pytest.raises(ValueError):
+        IVFMentorIndex(ids[:100], matrix[:100], normalized=True, centroids=centroids, list_offsets=list_offsets)
+
+
+def test_saved_codes_are_used_as_given(pool):
+    ids, matrix, queries = pool
+    codes, scales = quantize_int8(matrix)
+    index = QuantizedMentorIndex(ids, matrix, normalized=True, codes=codes, scales=scales)
+    assert np.shares_memory(index.codes, codes)
+    assert top_ids(index, queries) == top_ids(QuantizedMentorIndex(ids, matrix, normalized=True), queries)
+
+    order, centroids, list_offsets = ivf_layout(matrix, seed=3)
+    grouped = np.ascontiguousarray(matrix[order])
+    grouped_codes, grouped_scales = quantize_int8(grouped)
+    ivf = IVFMentorIndex(ids[order], grouped, normalized=True, quantization="int8", centroids=centroids,
+                         list_offsets=list_offsets, codes=grouped_codes, scales=grouped_scales)
+    assert np.shares_memory(ivf.codes, grouped_codes)
+    trained = IVFMentorIndex(ids, matrix, normalized=True, seed=3, quantization="int8")
+    assert top_ids(ivf, queries) == top_ids(trained, queries)
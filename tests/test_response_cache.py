@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+import response_cache
+from response_cache import SEMANTIC_SLOT, cache_keys, cached_chat_completion, semantic_eligible
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Records chat completions and embeddings instead of calling OpenAI."""
+    made = {"chat": [], "embed": []}
+
+    def chat_completion(**kwargs):
+        made["chat"].append(kwargs["messages"][-1]["content"])
+        return f"response {len(made['chat'])}"
+
+    def embed_text(text):
+        made["embed"].append(text)
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(response_cache, "chat_completion", chat_completion)
+    monkeypatch.setattr(response_cache, "embed_text", embed_text)
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE", response_cache.ResponseCache())
+    return made
+
+
+def classify(step, message):
+    return cached_chat_completion(
+        "classify", semantic_text=message, model="gpt-4", temperature=0.0,
+        messages=[{"role": "user", "content": f"Step: {step}\nUser message: '{SEMANTIC_SLOT}'"}],
+    )
+
+
+def test_bucket_masks_only_the_message_slot():
+    def bucket(step, message):
+        return cache_keys({"model": "gpt-4", "messages": [{"role": "user", "content": f"{step} {SEMANTIC_SLOT}"}]}, message)[1]
+    assert bucket("step2", "step2") != bucket("step3", "step3")
+    assert bucket("step2", "yes") == bucket("step2", "sure")
+
+
+def test_prompt_is_sent_with_the_message_filled_in(calls):
+    classify("step1", "roleplay")
+    assert calls["chat"] == ["Step: step1\nUser message: 'roleplay'"]
+
+
+@pytest.mark.parametrize("message", ["not yes", "I don't want roleplay", "no mentor", "nope", "I can't"])
+def test_negations_skip_the_semantic_tier(calls, message):
+    classify("step1", "yes")
+    assert classify("step1", message) == "response 2"
+    assert calls["embed"] == ["yes"]
+
+
+def test_long_messages_skip_the_embeddings_call(calls):
+    classify("step1", "I think I would like to try the roleplay event this year please")
+    assert calls["embed"] == []
+
+
+def test_similar_short_message_reuses_the_answer(calls):
+    assert classify("step1", "yes") == "response 1"
+    assert classify("step1", "yes please") == "response 1"
+    assert len(calls["chat"]) == 1
+
+
+def test_replies_failing_validate_are_not_cached(calls):
+    def call():
+        return cached_chat_completion("parse", model="gpt-4", temperature=0.0, validate=lambda r: r == "response 2",
+                                      messages=[{"role": "user", "content": "Return JSON"}])
+    assert call() == "response 1"
+    assert call() == "response 2"
+    assert call() == "response 2"
+    assert len(calls["chat"]) == 2
+
+
+def test_labelled_pairs_keep_negations_out():
+    path = os.path.join(os.path.dirname(__file__), os.pardir, "data", "semantic_cache_pairs.json")
+    with open(path, "r") as f:
+        pairs = json.load(f)
+    for pair in pairs:
+        if "not" in pair["incoming"].split() or "don't" in pair["incoming"]:
+            assert not semantic_eligible(pair["incoming"])
+    assert semantic_eligible("sounds good")
@@ -0,0 +1,37 @@
+import time
+
+from student_cache import StudentCache
+
+
+def test_read_that_raced_a_write_is_not_cached():
+    cache = StudentCache()
+    _, token = cache.get("amy")
+    cache.invalidate("amy")
+    cache.put("amy", {"goals": ["old"]}, token)
+    assert cache.get("amy")[0] is None
+
+
+def test_invalidation_drops_every_projection():
+    cache = StudentCache()
+    cache.read_through("amy", lambda _: {"goals": []}, fields=("goals",))
+    cache.read_through("amy", lambda _: {"name": "Amy"})
+    cache.invalidate("amy")
+    assert cache.get("amy", ("goals",))[0] is None
+    assert cache.get("amy")[0] is None
+
+
+def test_invalidation_stamps_do_not_outlive_the_ttl():
+    cache = StudentCache(ttl=0.05)
+    for n in range(100):
+        cache.invalidate(f"student-{n}")
+    time.sleep(0.06)
+    cache.invalidate("amy")
+    assert cache.stats()["invalidated"] == 1
+
+
+def test_read_older_than_the_ttl_is_not_cached():
+    cache = StudentCache(ttl=0.05)
+    _, token = cache.get("amy")
+    time.sleep(0.06)
+    cache.put("amy", {"name": "Amy"}, token)
+    assert cache.get("amy")[0] is None
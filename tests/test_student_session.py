@@ -0,0 +1,172 @@
+import copy
+import itertools
+import sys
+import threading
+import time
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+try:
+    import google.api_core.exceptions  # noqa: F401
+except ImportError:
+    # student_session imports its two commit errors from google-cloud-core;
+    # without it, give it an empty module to import them from.
+    stand_in = ModuleType("google.api_core.exceptions")
+    stand_in.Conflict = stand_in.FailedPrecondition = type("GoogleApiError", (Exception,), {})
+    sys.modules.setdefault("google", ModuleType("google"))
+    sys.modules.setdefault("google.api_core", ModuleType("google.api_core"))
+    sys.modules["google.api_core.exceptions"] = stand_in
+
+import student_session
+from student_session import MESSAGES_COLLECTION, STUDENTS_COLLECTION, StudentSession
+
+
+class Conflict(Exception):
+    pass
+
+
+class FailedPrecondition(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def fake_commit_conflicts(monkeypatch):
+    """The fake raises its own conflict errors; the session retries on them like on Firestore's."""
+    monkeypatch.setattr(student_session, "COMMIT_CONFLICTS", (Conflict, FailedPrecondition))
+
+
+class FakeFirestore:
+    """
+    In-memory stand-in for the parts of the Firestore client StudentSession
+    uses: documents with update_time, batched writes, and update preconditions
+    that raise FailedPrecondition the way the real service does.
+    """
+
+    def __init__(self, read_delay=0.005):
+        self.docs = {}
+        self.update_times = {}
+        self.lock = threading.Lock()
+        self.clock = itertools.count(1)
+        self.read_delay = read_delay
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def write_option(self, last_update_time):
+        return last_update_time
+
+    def subcollection(self, path):
+        return {p[-1]: doc for p, doc in self.docs.items() if p[:-1] == path}
+
+
+class FakeCollection:
+    def __init__(self, db, path):
+        self.db, self.path = db, path
+
+    def document(self, doc_id):
+        return FakeDocument(self.db, self.path + (doc_id,))
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db, self.path, self.id = db, path, path[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.db, self.path + (name,))
+
+    def get(self):
+        with self.db.lock:
+            data = copy.deepcopy(self.db.docs.get(self.path))
+            update_time = self.db.update_times.get(self.path)
+        time.sleep(self.db.read_delay)  # widen the window for concurrent turns
+        return SimpleNamespace(exists=data is not None, update_time=update_time, to_dict=lambda: data)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db, self.writes = db, []
+
+    def create(self, ref, data):
+        self.writes.append(("create", ref.path, copy.deepcopy(data), None))
+
+    def update(self, ref, data, option=None):
+        self.writes.append(("update", ref.path, copy.deepcopy(data), option))
+
+    def set(self, ref, data):
+        self.writes.append(("set", ref.path, copy.deepcopy(data), None))
+
+    def commit(self):
+        with self.db.lock:
+            for kind, path, _, last_update_time in self.writes:
+                if kind == "create" and path in self.db.docs:
+                    raise Conflict(f"{path} already exists")
+                if last_update_time is not None and self.db.update_times.get(path) != last_update_time:
+                    raise FailedPrecondition(f"{path} changed")
+            results = []
+            for kind, path, data, _ in self.writes:
+                if kind == "update":
+                    self.db.docs[path].update(data)
+                else:
+                    self.db.docs[path] = data
+                self.db.update_times[path] = next(self.db.clock)
+                results.append(SimpleNamespace(update_time=self.db.update_times[path]))
+            return results
+
+
+def new_student():
+    return {"name": "Amy", "topics": [], "goals": [], "message_count": 0, "last_conversation": []}
+
+
+def run_turn(db, student_id, n):
+    session = StudentSession.load(db, student_id, default=new_student)
+    conversation = list(session.get("last_conversation", []))
+    session.add_topic(f"topic {n}")
+    session.add_goal(f"goal {n}")
+    for role, content in (("user", f"question {n}"), ("assistant", f"answer {n}")):
+        conversation.append({"role": role, "content": content})
+        session.append_message(role, content)
+    session.set_conversation(conversation, window=100)
+    session.commit()
+
+
+def test_concurrent_turns_merge_without_losing_messages():
+    db = FakeFirestore()
+    run_turn(db, "amy", 0)
+    threads = [threading.Thread(target=run_turn, args=(db, "amy", n)) for n in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    student = db.docs[(STUDENTS_COLLECTION, "amy")]
+    messages = db.subcollection((STUDENTS_COLLECTION, "amy", MESSAGES_COLLECTION))
+    seqs = sorted(message["seq"] for message in messages.values())
+    assert seqs == list(range(1, 11))
+    assert student["message_count"] == 10
+    assert sorted(student["topics"]) == sorted(f"topic {n}" for n in range(5))
+    assert sorted(student["goals"]) == sorted(f"goal {n}" for n in range(5))
+    contents = {message["content"] for message in messages.values()}
+    for n in range(5):
+        assert {f"question {n}", f"answer {n}"} <= contents
+        assert {"role": "user", "content": f"question {n}"} in student["last_conversation"]
+
+
+def test_set_if_skips_a_record_for_an_older_turn():
+    db = FakeFirestore(read_delay=0)
+    session = StudentSession.load(db, "amy", default=new_student)
+    session.set("post_turn", {"turn_id": "old", "status": "pending"})
+    session.commit()
+
+    stale = StudentSession.load(db, "amy")
+    newer = StudentSession.load(db, "amy")
+    newer.set("post_turn", {"turn_id": "new", "status": "pending"})
+    newer.commit()
+
+    is_old_turn = lambda data: (data.get("post_turn") or {}).get("turn_id") == "old"
+    stale.set_if("post_turn", {"turn_id": "old", "status": "error"}, is_old_turn)
+    stale.commit()
+    assert db.docs[(STUDENTS_COLLECTION, "amy")]["post_turn"] == {"turn_id": "new", "status": "pending"}
@@ -0,0 +1,149 @@
+import string
+
+COMPLETE_STAGE = "complete"
+
+# Input labels in match precedence order. A step's "on" table is keyed by:
+#   "choice:<value>"  the classifier picked that specific choice
+#   "choice"          the classifier picked any choice
+#   "yes" / "no"      the classifier returned that answer
+#   "answer"          the classifier returned either answer
+# "otherwise" handles everything else. A step with only "otherwise" has a
+# single exit and is routed without classifying the message at all.
+
+
+class Outcome:
+    """A compiled transition: the next stage and the precomputed response template."""
+
+    __slots__ = ("next_stage", "template", "fields", "generate")
+
+    def __init__(self, next_stage, template, generate):
+        self.next_stage = next_stage
+        self.template = template
+        self.generate = generate
+        self.fields = {name for _, name, _, _ in string.Formatter().parse(template) if name}
+
+
+class CompiledStep:
+    __slots__ = ("table", "otherwise", "needs_classification", "choice_first")
+
+    def __init__(self, table, otherwise, choice_first=False):
+        self.table = table
+        self.otherwise = otherwise
+        self.needs_classification = bool(table)
+        self.choice_first = choice_first
+
+    def _match_answer(self, classification):
+        answer = classification.get("answer")
+        if answer in ("yes", "no"):
+            return self.table.get(answer) or self.table.get("answer")
+        return None
+
+    def _match_choice(self, classification, choice_key):
+        choice = classification.get(choice_key)
+        if choice:
+            return self.table.get(f"choice:{str(choice).lower()}") or self.table.get("choice")
+        return None
+
+    def match(self, classification, choice_key):
+        """A yes/no answer wins over a choice unless the step was compiled with prefer: choice."""
+        if self.choice_first:
+            outcome = self._match_choice(classification, choice_key) or self._match_answer(classification)
+        else:
+            outcome = self._match_answer(classification) or self._match_choice(classification, choice_key)
+        return outcome or self.otherwise
+
+
+class WorkflowEngine:
+    """
+    Compiles a workflow config (the *_WORKFLOW dicts in app.py) into a
+    transition table of step x classified input -> (next step, response
+    template), then routes each turn with dict lookups.
+
+    Each step may declare:
+        "on":        {label: transition}
+        "otherwise": transition
+        "prefer":    "choice" to try the choice labels before yes/no when
+                     the classifier returns both (default: answer first)
+    and each transition:
+        "next":      stage to move to (omit to stay)
+        "generate":  text for the LLM to turn into a reply, or "@step.field"
+        "reply":     literal reply returned without an LLM call
+        "prefix":    literal text prepended to the generate/reply text
+    Templates may use {choice} and any field supplied by context_providers.
+    """
+
+    def __init__(self, name, steps, stage_key, start, classifier, choice_key, responder,
+                 context_providers=None, done_message=None):
+        self.name = name
+        self.stage_key = stage_key
+        self.start = start
+        self.classifier = classifier
+        self.choice_key = choice_key
+        self.responder = responder
+        self.context_providers = context_providers or {}
+        self.done_message = done_message or f"{name} workflow processing complete for now."
+        self._raw_steps = steps
+        self.start_outcome = self._compile_transition({"next": start, "generate": f"@{start}.prompt"})
+        self.steps = {
+            step_name: self._compile_step(step)
+            for step_name, step in steps.items()
+            if "on" in step or "otherwise" in step
+        }
+
+    def _resolve(self, text):
+        if not text.startswith("@"):
+            return text
+        step_name, field = text[1:].split(".", 1)
+        return self._raw_steps[step_name][field]
+
+    def _compile_transition(self, spec):
+        next_stage = spec.get("next")
+        if next_stage and next_stage != COMPLETE_STAGE and next_stage not in self._raw_steps:
+            raise ValueError(f"{self.name}: unknown next step '{next_stage}'")
+        generate = "generate" in spec
+        body = self._resolve(spec["generate"] if generate else spec.get("reply", ""))
+        return Outcome(next_stage, spec.get("prefix", "") + body, generate)
+
+    def _compile_step(self, step):
+        table = {label: self._compile_transition(spec) for label, spec in step.get("on", {}).items()}
+        otherwise = self._compile_transition(step.get("otherwise", {"reply": self.done_message}))
+        return CompiledStep(table, otherwise, choice_first=step.get("prefer") == "choice")
+
+    def current_stage(self, workflow_state):
+        return workflow_state.get(self.stage_key, "none")
+
+    def needs_classification(self, workflow_state):
+        step = self.steps.get(self.current_stage(workflow_state))
+        return step is not None and step.needs_classification
+
+    def process(self, student_info, workflow_state, user_message, classification=None):
+        current = self.current_stage(workflow_state)
+        if current == "none":
+            outcome = self.start_outcome
+            classification = {}
+        else:
+            step = self.steps.get(current)
+            if step is None:
+                return self.done_message
+            if step.needs_classification:
+                if classification is None:
+                    classification = self.classifier(current, user_message)
+                outcome = step.match(classification, self.choice_key)
+            else:
+                classification = classification or {}
+                outcome = step.otherwise
+
+        if outcome.next_stage:
+            workflow_state[self.stage_key] = outcome.next_stage
+        return self._render(outcome, student_info, user_message, classification)
+
+    def _render(self, outcome, student_info, user_message, classification):
+        text = outcome.template
+        if outcome.fields:
+            context = {"choice": classification.get(self.choice_key, "")}
+            for field in outcome.fields - context.keys():
+                context[field] = self.context_providers[field](student_info, user_message)
+            text = text.format(**context)
+        if outcome.generate:
+            return self.responder(text, student_info, user_message)
+        return text